@@ -0,0 +1,76 @@
+"""Netflow rewrite of a backup archive: extract to disk and re-tar versus in memory.
+
+Run with ``python -m benchmarks.bench_backup_rewrite``.
+"""
+
+import io
+import os
+import tarfile
+import tempfile
+import time
+
+from benchmarks.generate import generate_config
+from rcc.file_manager import FileManager, read_member, replace_member
+from rcc.parsers.boot import BootParser
+
+MEMBER = "config/config.boot"
+
+
+def make_backup(conf, extra_files=200):
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w:gz") as tar:
+        for name, data in [(MEMBER, conf.encode("utf-8"))] + [
+            (f"config/user-data/file{n}", os.urandom(4096)) for n in range(extra_files)
+        ]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+def on_disk(backup, directory):
+    """The steps the CLI used to take."""
+    filepath = os.path.join(directory, "backup.tar.gz")
+    target_dir = os.path.join(directory, "backup")
+    with open(filepath, "wb") as f:
+        f.write(backup)
+    file_manager = FileManager(filepath, target_dir)
+    file_manager.untar()
+    parser = BootParser(os.path.join(target_dir, MEMBER))
+    parser.set_netflow_server("203.0.113.200")
+    parser.dump()
+    file_manager.tar(filepath, "config")
+    with open(filepath, "rb") as f:
+        return f.read()
+
+
+def in_memory(backup):
+    parser = BootParser.from_data(read_member(backup, MEMBER))
+    parser.set_netflow_server("203.0.113.200")
+    return replace_member(backup, MEMBER, parser.raw_data.encode("utf-8"))
+
+
+def best_time(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'backup KiB':>11} {'on disk ms':>11} {'in memory ms':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        for rules in (100, 1000, 5000):
+            backup = make_backup(generate_config(rules=rules, group_members=rules))
+            disk = best_time(on_disk, backup, directory)
+            memory = best_time(in_memory, backup)
+            print(
+                f"{len(backup) / 1024:>11,.0f} {disk * 1000:>11.1f} "
+                f"{memory * 1000:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Peak memory of backup downloads and uploads: buffered versus streamed.
+
+Serves a backup of each size from a local HTTP server, then downloads it to
+a file and uploads it again, first the way ``UNMSClient`` used to (the whole
+body in ``response.content``, a multipart body built by ``files=``) and then
+through the streaming ``get_backup`` and ``upload_backup``.
+
+Run with ``python -m benchmarks.bench_backup_stream``.
+"""
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rcc.api.unms.client import UNMSClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(os.path.getsize(self.server.backup)))
+        self.end_headers()
+        with open(self.server.backup, "rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def do_PUT(self):
+        remaining = int(self.headers["Content-Length"])
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 1 << 16)))
+        payload = json.dumps({"id": "uploaded"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def buffered(client, path):
+    response = client.get_data("/devices/1/backups/2")
+    with open(path, "wb") as f:
+        f.write(response.content)
+    with open(path, "rb") as f:
+        client.put_data("/devices/1/backups", files={"file": ("backup.tar.gz", f)})
+
+
+def streamed(client, path):
+    client.get_backup(1, 2, filepath=path)
+    client.upload_backup(1, path)
+
+
+def peak(func, *args):
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    client = UNMSClient(f"http://127.0.0.1:{httpd.server_port}", "user", "password")
+    client.token = "token"
+    client.expire_time = datetime.datetime.now() + datetime.timedelta(hours=1)
+    print(f"{'MiB':>5} {'buffered KiB':>13} {'streamed KiB':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        httpd.backup = os.path.join(directory, "served.tar.gz")
+        path = os.path.join(directory, "backup.tar.gz")
+        for mib in (4, 16, 64):
+            with open(httpd.backup, "wb") as f:
+                f.write(os.urandom(mib << 20))
+            print(
+                f"{mib:>5} {peak(buffered, client, path) / 1024:>13,.0f} "
+                f"{peak(streamed, client, path) / 1024:>13,.0f}"
+            )
+    httpd.shutdown()
+    httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
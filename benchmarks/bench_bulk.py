@@ -0,0 +1,55 @@
+"""Throughput of ``parse_many`` by worker count, and the cost of returning trees.
+
+Run with ``python -m benchmarks.bench_bulk [files] [rules]``.
+"""
+
+import marshal
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_diff import best_time
+from benchmarks.generate import generate_config
+from rcc.parsers.boot import BootParser
+from rcc.parsers.bulk import parse_many
+from rcc.parsers.temp_parser import parse_conf
+
+
+def main(files=64, rules=300):
+    cpus = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for n in range(files):
+            path = os.path.join(directory, f"router{n}.boot")
+            with open(path, "w") as f:
+                f.write(generate_config(rules=rules, group_members=rules, seed=n))
+            paths.append(path)
+
+        tree = parse_conf(generate_config(rules=rules, group_members=rules))
+        print("per-tree transfer cost (dump + load):")
+        for name, module in (("pickle", pickle), ("marshal", marshal)):
+            seconds = best_time(lambda: module.loads(module.dumps(tree)))
+            print(f"  {name:7} {seconds * 1000:6.2f} ms")
+
+        start = time.perf_counter()
+        for path in paths:
+            BootParser(path, lazy=False)
+        serial = time.perf_counter() - start
+        print(f"\n{files} configs, {cpus} CPU(s) available")
+        print(f"{'workers':>8} {'seconds':>8} {'configs/s':>10} {'speedup':>8}")
+        print(f"{'serial':>8} {serial:>8.2f} {files / serial:>10.1f} {1:>8.2f}")
+        for workers in sorted({1, 2, cpus, 2 * cpus}):
+            start = time.perf_counter()
+            for result in parse_many(paths, workers=workers):
+                assert result.error is None
+            elapsed = time.perf_counter() - start
+            print(
+                f"{workers:>8} {elapsed:>8.2f} {files / elapsed:>10.1f} "
+                f"{serial / elapsed:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,38 @@
+"""Parse time versus loading the same tree from ``ParseCache``.
+
+Run with ``python -m benchmarks.bench_cache``.
+"""
+
+import os
+import tempfile
+
+from benchmarks.bench_diff import best_time
+from benchmarks.generate import generate_config
+from rcc.parsers.cache import ParseCache, content_key
+from rcc.parsers.temp_parser import parse_conf
+from rcc.parsers.tree import ConfigNode, parse_conf_compact
+
+
+def main():
+    print(
+        f"{'lines':>8} {'entry KiB':>10} {'parse ms':>9} {'hit ms':>7} "
+        f"{'compact parse ms':>17} {'compact hit ms':>15}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ParseCache(directory)
+        for rules in (100, 1000, 5000):
+            conf = generate_config(rules=rules, group_members=rules)
+            cache.put(conf, parse_conf(conf))
+            size = os.path.getsize(cache._path(content_key(conf)))
+            compact_hit = best_time(lambda: ConfigNode.from_dict(cache.get(conf)))
+            print(
+                f"{conf.count(chr(10)):>8} {size / 1024:>10,.0f} "
+                f"{best_time(parse_conf, conf) * 1000:>9.1f} "
+                f"{best_time(cache.get, conf) * 1000:>7.1f} "
+                f"{best_time(parse_conf_compact, conf) * 1000:>17.1f} "
+                f"{compact_hit * 1000:>15.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
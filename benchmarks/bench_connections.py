@@ -0,0 +1,125 @@
+"""TCP connections opened by one full CLI run.
+
+Runs ``rcc.cli.main`` against a local stand-in for UNMS and the public IP
+service that speaks HTTP/1.1 keep-alive, and counts the connections it
+accepts and the requests it serves.
+
+Run with ``python -m benchmarks.bench_connections``.
+"""
+
+import io
+import json
+import os
+import tarfile
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rcc.cli import main as cli_main
+
+CONFIG = b"""system {
+    flow-accounting {
+        netflow {
+            server 192.0.2.10 {
+                port 2055
+            }
+        }
+    }
+}
+"""
+
+
+def make_backup():
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w:gz") as tar:
+        info = tarfile.TarInfo("config/config.boot")
+        info.size = len(CONFIG)
+        tar.addfile(info, io.BytesIO(CONFIG))
+    return out.getvalue()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, body=b"", headers=()):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+        self.server.requests += 1
+        self.send_response(200)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/ip":
+            self._reply(b"203.0.113.7")
+        elif path.endswith("/backups/created"):
+            self._reply(make_backup())
+        else:
+            self._reply({"id": "device"})
+
+    def do_POST(self):
+        self._read_body()
+        if self.path == "/user/login":
+            self._reply({}, [("x-auth-token", "token")])
+        elif self.path.endswith("/backups"):
+            self._reply({"id": "created"})
+        else:
+            self._reply({"result": True})
+
+    def do_DELETE(self):
+        self._reply({"result": True})
+
+    def do_PUT(self):
+        self._read_body()
+        self._reply({"id": "uploaded"})
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.connections = 0
+        self.requests = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+def main():
+    server = CountingServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    os.environ.update(
+        RCC_UNMS_BASE_URL=base_url,
+        RCC_UNMS_USER="user",
+        RCC_UNMS_PASSWORD="password",
+        RCC_IP_BASE_URL=base_url,
+        RCC_IP_ENDPOINT="/ip",
+        RCC_UNMS_CONFIG_DIR="config",
+        RCC_UNMS_CONFIG_REL_FILE="config.boot",
+    )
+    with tempfile.TemporaryDirectory() as backup_dir:
+        cli_main(
+            ["--device-id", "device", "--dns-timeout", "-1", "--backup-dir", backup_dir],
+            standalone_mode=False,
+        )
+    server.shutdown()
+    server.server_close()
+    print(f"{server.requests} requests over {server.connections} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Time to diff two parsed configs, identical or with one changed value.
+
+Run with ``python -m benchmarks.bench_diff``.
+"""
+
+import time
+
+from benchmarks.generate import generate_config
+from rcc.parsers.diff import diff, hash_tree
+from rcc.parsers.temp_parser import parse_conf
+
+
+def best_time(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(
+        f"{'lines':>8} {'hash ms':>8} {'diff ms':>8} {'hashed same ms':>15} "
+        f"{'hashed 1 change ms':>19} {'parse ms':>9}"
+    )
+    for rules in (100, 1000, 5000):
+        conf = generate_config(rules=rules, group_members=rules)
+        old = parse_conf(conf)
+        new = parse_conf(
+            conf.replace('description "rule 7"', 'description "rule seven"')
+        )
+        assert len(diff(old, new)) == 1
+        old_hashed, new_hashed = hash_tree(old), hash_tree(new)
+        print(
+            f"{conf.count(chr(10)):>8} {best_time(hash_tree, old) * 1000:>8.1f} "
+            f"{best_time(diff, old, new) * 1000:>8.1f} "
+            f"{best_time(diff, old_hashed, old_hashed) * 1000:>15.3f} "
+            f"{best_time(diff, old_hashed, new_hashed) * 1000:>19.3f} "
+            f"{best_time(parse_conf, conf) * 1000:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
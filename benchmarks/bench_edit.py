@@ -0,0 +1,48 @@
+"""Cost of many structured edits followed by one ``dump``.
+
+Run with ``python -m benchmarks.bench_edit``.
+"""
+
+import os
+import tempfile
+import time
+
+from benchmarks.generate import generate_config
+from rcc.parsers.boot import BootParser
+
+
+def run(path, edits):
+    parser = BootParser(path)
+    start = time.perf_counter()
+    parser.index
+    indexed = time.perf_counter()
+    for n in range(1, edits + 1):
+        parser.set(f"firewall name WAN_IN rule {n * 10} action", "reject")
+    edited = time.perf_counter()
+    parser.dump()
+    done = time.perf_counter()
+    return indexed - start, edited - indexed, done - edited
+
+
+def main():
+    print(
+        f"{'lines':>8} {'edits':>7} {'index ms':>9} {'edits ms':>9} "
+        f"{'us/edit':>8} {'dump ms':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "config.boot")
+        for rules in (1000, 6000):
+            conf = generate_config(rules=rules, group_members=rules)
+            for edits in (10, 100, rules):
+                with open(path, "w") as f:
+                    f.write(conf)
+                index, edit, dump = run(path, edits)
+                print(
+                    f"{conf.count(chr(10)):>8} {edits:>7} {index * 1000:>9.1f} "
+                    f"{edit * 1000:>9.1f} {edit / edits * 1e6:>8.1f} "
+                    f"{dump * 1000:>8.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
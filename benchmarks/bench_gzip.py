@@ -0,0 +1,40 @@
+"""Backup recompression: ``tarfile``'s gzip versus ``ParallelGzipWriter``.
+
+Rewrites the config member of a generated backup with ``replace_member`` at
+each thread count and compression level. The speedup is bounded by the CPUs
+this runs on, which the first line prints.
+
+Run with ``python -m benchmarks.bench_gzip``.
+"""
+
+import os
+
+from benchmarks.bench_backup_rewrite import MEMBER, make_backup
+from benchmarks.bench_diff import best_time
+from benchmarks.generate import generate_config
+from rcc.file_manager import replace_member
+
+THREADS = (1, 2, 4, 8)
+
+
+def main():
+    conf = generate_config(rules=5000, group_members=5000).encode("utf-8")
+    backup = make_backup(conf.decode("utf-8"), extra_files=2000)
+    print(f"{os.cpu_count()} CPUs, backup {len(backup) / 2 ** 20:.1f} MiB compressed")
+    print(f"{'level':>5} {'threads':>7} {'ms':>8} {'speedup':>8} {'MiB':>6}")
+    for level in (6, 9):
+        serial = None
+        for threads in THREADS:
+            seconds = best_time(
+                replace_member, backup, MEMBER, conf, None, level, threads
+            )
+            size = len(replace_member(backup, MEMBER, conf, None, level, threads))
+            serial = serial or seconds
+            print(
+                f"{level:>5} {threads:>7} {seconds * 1000:>8.1f} "
+                f"{serial / seconds:>7.2f}x {size / 2 ** 20:>6.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Netflow update of a config file: read into a str versus memory-mapped.
+
+Run with ``python -m benchmarks.bench_mmap``. Peak is the Python heap
+measured by tracemalloc; pages of the mapped file are not part of it.
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generate import generate_config
+from rcc.parsers.boot import BootParser
+
+
+def update(path, ip_address, use_mmap):
+    parser = BootParser(path, use_mmap=use_mmap)
+    parser.find_netflow_server()
+    parser.set_netflow_server(ip_address)
+    parser.dump()
+    parser.close()
+
+
+def measure(conf, path, ip_address, use_mmap, repeat=3):
+    best = float("inf")
+    for n in range(repeat + 1):
+        with open(path, "w") as f:
+            f.write(conf)
+        if n == repeat:
+            tracemalloc.start()
+            update(path, ip_address, use_mmap)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            start = time.perf_counter()
+            update(path, ip_address, use_mmap)
+            best = min(best, time.perf_counter() - start)
+    return best, peak
+
+
+def main():
+    print(
+        f"{'MiB':>6} {'new value':>10} {'str ms':>8} {'str KiB':>9} "
+        f"{'mmap ms':>8} {'mmap KiB':>9}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "config.boot")
+        for rules in (1000, 5000, 20000):
+            conf = generate_config(rules=rules, group_members=rules)
+            for case, ip_address in (
+                ("shorter", "10.0.0.1"),
+                ("longer", "203.203.203.203"),
+            ):
+                row = f"{len(conf) / 2 ** 20:>6.1f} {case:>10}"
+                for use_mmap in (False, True):
+                    seconds, peak = measure(conf, path, ip_address, use_mmap)
+                    row += f" {seconds * 1000:>8.1f} {peak / 1024:>9,.0f}"
+                print(row)
+
+
+if __name__ == "__main__":
+    main()
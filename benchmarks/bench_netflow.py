@@ -0,0 +1,78 @@
+"""Netflow server lookup and rewrite: the old backtracking regex vs ``scan_spans``.
+
+Run with ``python -m benchmarks.bench_netflow``.
+"""
+
+import re
+import time
+
+from benchmarks.generate import generate_config
+from rcc.parsers.index import scan_spans
+
+# BootParser.re_netflow_server before the structural lookup replaced it.
+re_netflow_server = re.compile(
+    r"(system[\s*]\{[\n\t\r\s]*flow-accounting[\s*]\{[\n\t\r\s\w\W]*"
+    r"netflow[\s*]\{[\n\t\r\s\w\W]*server[\s*])"
+    r"(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})"
+)
+PATH = ("system", "flow-accounting", "netflow", "server")
+
+
+def regex_find(conf):
+    res = re_netflow_server.search(conf)
+    return res.group(2) if res else None
+
+
+def regex_set(conf, ip_address):
+    return re_netflow_server.sub(r"\g<1>{}".format(ip_address), conf)
+
+
+def scan_find(conf):
+    spans = scan_spans(conf, PATH)
+    if not spans:
+        return None
+    start, end = spans[0]
+    return conf[start:end]
+
+
+def scan_set(conf, ip_address):
+    start, end = scan_spans(conf, PATH)[0]
+    return conf[:start] + ip_address + conf[end:]
+
+
+def best_of(func, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def system_first(conf):
+    """Move the ``system`` block to the top, ahead of all it can backtrack over."""
+    start = conf.index("system {")
+    end = conf.index("\n}\n", start) + 3
+    return conf[start:end] + conf[:start] + conf[end:]
+
+
+def main():
+    print(
+        f"{'lines':>8} {'layout':>12} {'regex ms':>9} {'scan ms':>8} "
+        f"{'regex finds':>15} {'scan finds':>15}"
+    )
+    for rules in (1000, 6000, 12000):
+        conf = generate_config(rules=rules, group_members=rules)
+        for layout, text in (("default", conf), ("system-first", system_first(conf))):
+            regex_time, regex_result = best_of(regex_find, text)
+            regex_time += best_of(regex_set, text, "192.0.2.1")[0]
+            scan_time, scan_result = best_of(scan_find, text)
+            scan_time += best_of(scan_set, text, "192.0.2.1")[0]
+            print(
+                f"{text.count(chr(10)):>8} {layout:>12} {regex_time * 1000:>9.1f} "
+                f"{scan_time * 1000:>8.1f} {regex_result:>15} {scan_result:>15}"
+            )
+
+
+if __name__ == "__main__":
+    main()
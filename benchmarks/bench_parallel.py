@@ -0,0 +1,52 @@
+"""Serial ``parse_conf`` versus ``parse_conf_parallel`` on one large config.
+
+Run with ``python -m benchmarks.bench_parallel``.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.bench_diff import best_time
+from benchmarks.generate import generate_config
+from rcc.parsers.parallel import (
+    _merge,
+    _parse_chunk,
+    parse_conf_parallel,
+    split_sections,
+)
+from rcc.parsers.temp_parser import parse_conf
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({2, cpus})
+    print(f"{cpus} CPU(s) available")
+    print(
+        f"{'MiB':>6} {'serial ms':>10} {'split+merge ms':>15} "
+        + " ".join(f"{f'{w} workers ms':>13} {'pooled ms':>10}" for w in worker_counts)
+    )
+    for rules in (1000, 5000, 20000):
+        conf = generate_config(rules=rules, group_members=rules)
+        expected = parse_conf(conf)
+        chunks = split_sections(conf, 2 * cpus)
+        # Chunk handling without a pool: the overhead the workers must make up.
+        start = time.perf_counter()
+        assert _merge(map(_parse_chunk, split_sections(conf, 2 * cpus))) == expected
+        in_process = time.perf_counter() - start
+        row = (
+            f"{len(conf) / 2 ** 20:>6.1f} {best_time(parse_conf, conf) * 1000:>10.0f} "
+        )
+        row += f"{in_process * 1000:>15.0f}"
+        for workers in worker_counts:
+            assert parse_conf_parallel(conf, workers=workers) == expected
+            cold = best_time(parse_conf_parallel, conf, workers, repeat=1)
+            with ProcessPoolExecutor(workers) as pool:
+                pool.submit(int).result()
+                warm = best_time(parse_conf_parallel, conf, workers, pool)
+            row += f" {cold * 1000:>13.0f} {warm * 1000:>10.0f}"
+        print(row, f"({len(chunks)} chunks)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Latency and failures of GETs against a controller under load.
+
+A local server answers most GETs in 5 ms, but 5% of them take a second and
+another 5% fail with ``503``. The same request sequence is made without a
+retry policy, with retries, and with retries and hedging, and the p50 and
+p99 latency per call and the calls that still failed are reported.
+
+Run with ``python -m benchmarks.bench_retry``.
+"""
+
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rcc.api.http import BaseHttpClient
+from rcc.api.retry import RetryPolicy
+
+CALLS = 400
+SLOW, FAILING = 0.05, 0.05
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        with self.server.lock:
+            roll = self.server.rng.random()
+        status = 503 if roll < FAILING else 200
+        time.sleep(1.0 if FAILING <= roll < FAILING + SLOW else 0.005)
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def run(base_url, server, retry):
+    server.rng = random.Random(0)
+    client = BaseHttpClient(base_url, retry=retry)
+    latencies, failed = [], 0
+    for _ in range(CALLS):
+        start = time.perf_counter()
+        if client.get_data("/device").status_code != 200:
+            failed += 1
+        latencies.append(time.perf_counter() - start)
+    client.close()
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    return p50, p99, sum(latencies), failed
+
+
+def main():
+    logging.getLogger("rcc").setLevel(logging.ERROR)
+    server = Server(("127.0.0.1", 0), Handler)
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    policies = [
+        ("no retries", None),
+        ("retries", RetryPolicy(backoff=0.05)),
+        ("retries + hedging", RetryPolicy(backoff=0.05, hedge=True)),
+    ]
+    for name, retry in policies:
+        p50, p99, total, failed = run(base_url, server, retry)
+        print(
+            f"{name:18} p50 {p50 * 1000:7.1f} ms  p99 {p99 * 1000:7.1f} ms  "
+            f"total {total:6.1f} s  failed {failed}/{CALLS}"
+        )
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Disk use of the backup store against keeping every archive, over many runs.
+
+Each run changes the netflow server in ``config.boot`` and leaves the other
+members alone, as the CLI does. Run with ``python -m benchmarks.bench_store``.
+"""
+
+import tempfile
+import time
+
+from benchmarks.bench_backup_rewrite import MEMBER, make_backup
+from benchmarks.bench_diff import best_time
+from benchmarks.generate import generate_config
+from rcc.file_manager import read_member, replace_member
+from rcc.parsers.boot import BootParser
+from rcc.store import BackupStore
+
+RUNS = 30
+
+
+def with_netflow(backup, n):
+    parser = BootParser.from_data(read_member(backup, MEMBER))
+    parser.set_netflow_server(f"203.0.113.{n % 250 + 1}")
+    return replace_member(backup, MEMBER, parser.raw_data.encode("utf-8"))
+
+
+def main():
+    backup = make_backup(generate_config(rules=1000, group_members=1000))
+    archives = [with_netflow(backup, n) for n in range(RUNS)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = BackupStore(directory)
+        start = time.perf_counter()
+        ids = [store.add("device", archive) for archive in archives]
+        add_ms = (time.perf_counter() - start) / RUNS * 1000
+        archives_kib = sum(map(len, archives)) / 1024
+        print(f"{RUNS} runs of a {len(backup) / 1024:,.0f} KiB backup")
+        print(f"  every archive kept: {archives_kib:>9,.0f} KiB")
+        print(f"  backup store:       {store.disk_usage() / 1024:>9,.0f} KiB")
+        print(f"  add:     {add_ms:>6.1f} ms per backup")
+        print(
+            f"  rebuild: {best_time(store.rebuild, 'device', ids[-1]) * 1000:>6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Compare line classification with the per-pattern regexes against ``tokenize``.
+
+Run with ``python -m benchmarks.bench_tokenizer``.
+"""
+
+import time
+
+from benchmarks.generate import generate_config
+from rcc.parsers import temp_parser
+from rcc.parsers.temp_parser import (
+    ParserException,
+    parse_conf,
+    rx_comment,
+    rx_dict,
+    rx_flag,
+    rx_section,
+    rx_value,
+    update_tree,
+)
+
+
+def legacy_parse_node(config, line, line_num, path=None):
+    """``parse_node`` as it was before the single-pass tokenizer."""
+    if not path:
+        path = []
+
+    line = line.strip()
+    if not line:
+        return config, path
+
+    if rx_section.match(line):
+        val_type = "section"
+        section = rx_section.match(line).groups()[0]
+        path.append({section: val_type})
+        update_tree(config, path, {section: {}}, val_type=val_type)
+
+    elif rx_dict.match(line):
+        val_type = "named_section"
+        section, name = rx_dict.match(line).groups()
+        if section not in [list(p.keys())[0] for p in path]:
+            path.append({section: val_type})
+        path.append({name: val_type})
+        update_tree(config, path, {section: {name: {}}}, val_type=val_type)
+
+    elif rx_value.match(line):
+        key, value = rx_value.match(line).groups()
+        update_tree(config, path, {key: value}, val_type="value")
+
+    elif rx_flag.match(line):
+        flag = rx_flag.match(line).group()
+        update_tree(config, path, {flag: flag}, val_type="flag")
+
+    elif rx_comment.match(line):
+        pass
+
+    elif line == "}" and path:
+        path_types = [list(p.values())[0] for p in path]
+        path.pop()
+        if len(path_types) > 1 and path_types[-2:] in (
+            ["section", "named_section"],
+            ["named_section", "named_section"],
+        ):
+            path.pop()
+
+    else:
+        raise ParserException(f"Parse error in\n {line_num}: {line}\n")
+
+    return config, path
+
+
+def legacy_parse_conf(s):
+    c = {}
+    headers = []
+    for n, line in enumerate(s.split("\n"), start=1):
+        c, headers = legacy_parse_node(c, line, n, headers)
+    return c
+
+
+def legacy_classify(lines):
+    for line in lines:
+        if rx_section.match(line):
+            rx_section.match(line).groups()
+        elif rx_dict.match(line):
+            rx_dict.match(line).groups()
+        elif rx_value.match(line):
+            rx_value.match(line).groups()
+        elif rx_flag.match(line):
+            rx_flag.match(line).group()
+        elif rx_comment.match(line):
+            pass
+
+
+def classify(lines):
+    for line in lines:
+        temp_parser.tokenize(line)
+
+
+def best_of(func, arg, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(title, before_func, after_func, make_arg):
+    print(title)
+    print(
+        f"{'lines':>8} {'before (lines/s)':>18} {'after (lines/s)':>18} {'speedup':>8}"
+    )
+    for rules in (100, 1000, 5000):
+        conf = generate_config(rules=rules, group_members=rules)
+        lines = conf.count("\n")
+        arg = make_arg(conf)
+        before = best_of(before_func, arg)
+        after = best_of(after_func, arg)
+        print(
+            f"{lines:>8} {lines / before:>18,.0f} {lines / after:>18,.0f} "
+            f"{before / after:>7.2f}x"
+        )
+
+
+def main():
+    conf = generate_config(rules=100, group_members=100)
+    assert legacy_parse_conf(conf) == parse_conf(conf)
+    report(
+        "classification only",
+        legacy_classify,
+        classify,
+        lambda conf: [line.strip() for line in conf.split("\n")],
+    )
+    report("parse_conf", legacy_parse_conf, temp_parser.parse_conf, lambda conf: conf)
+
+
+if __name__ == "__main__":
+    main()
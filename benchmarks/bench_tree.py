@@ -0,0 +1,58 @@
+"""Memory and parse time of the dict tree versus the compact ``ConfigNode`` tree.
+
+Run with ``python -m benchmarks.bench_tree``.
+"""
+
+import gc
+import time
+import tracemalloc
+
+from benchmarks.generate import generate_config
+from rcc.parsers.temp_parser import parse_conf
+from rcc.parsers.tree import parse_conf_compact
+
+
+def retained(func, conf):
+    """Return ``(bytes kept alive by the result, seconds to build it)``."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    tree = func(conf)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tree
+    return size, elapsed
+
+
+def best_time(func, conf, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(conf)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(
+        f"{'lines':>8} {'dict KiB':>10} {'compact KiB':>12} {'ratio':>6} "
+        f"{'dict ms':>9} {'compact ms':>11}"
+    )
+    for rules in (100, 1000, 5000):
+        conf = generate_config(rules=rules, group_members=rules)
+        lines = conf.count("\n")
+        dict_size, _ = retained(parse_conf, conf)
+        compact_size, _ = retained(parse_conf_compact, conf)
+        dict_time = best_time(parse_conf, conf)
+        compact_time = best_time(parse_conf_compact, conf)
+        print(
+            f"{lines:>8} {dict_size / 1024:>10,.0f} {compact_size / 1024:>12,.0f} "
+            f"{compact_size / dict_size:>6.2f} {dict_time * 1000:>9,.1f} "
+            f"{compact_time * 1000:>11,.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Scaling of ``update_tree`` with the size of repeated-value lists.
+
+Run with ``python -m benchmarks.bench_update_tree``.
+"""
+
+import time
+
+from rcc.parsers import temp_parser
+from rcc.parsers.temp_parser import build_tree, iter_events
+
+
+def legacy_update_tree(config, path, val, val_type=None):
+    """``update_tree`` before repeated values were accumulated in place."""
+    t = config
+
+    for item in path:
+        if list(item.keys())[0] not in t:
+            try:
+                t[list(item.keys())[0]] = {}
+            except TypeError:
+                break
+
+        t = t.get(list(item.keys())[0])
+
+    if val_type == "flag":
+        t.update(val)
+
+    elif val_type == "value":
+        if t and isinstance(t, dict):
+            if list(t.keys())[0] == list(val.keys())[0]:
+                try:
+                    t.update(
+                        {
+                            list(t.keys())[0]: dict(
+                                [(k, {}) for k in list(t.values()) + list(val.values())]
+                            )
+                        }
+                    )
+                except TypeError:
+                    if isinstance(t[list(t.keys())[0]], str):
+                        t[list(t.keys())[0]] = {t[list(t.keys())[0]]: {}}
+                    t[list(t.keys())[0]].update({list(val.values())[0]: {}})
+            elif list(val.keys())[0] == list(path[-1].keys())[0]:
+                t.update({list(val.values())[0]: {}})
+            elif list(val.keys())[0] in list(t.keys()):
+                try:
+                    t.update(
+                        {
+                            list(val.keys())[0]: {
+                                t[list(val.keys())[0]]: {},
+                                list(val.values())[0]: {},
+                            }
+                        }
+                    )
+                except TypeError:
+                    t[list(val.keys())[0]].update({list(val.values())[0]: {}})
+            else:
+                t.update(val)
+        else:
+            t.update(val)
+
+    return config
+
+
+def _ip(i):
+    return "10.{}.{}.{}".format(i >> 16 & 255, i >> 8 & 255, i & 255)
+
+
+def address_group(n):
+    """``address`` repeated n times after a description."""
+    return (
+        ["firewall {", "    group {", "        address-group BLOCKED {"]
+        + ['            description "Blocked hosts"']
+        + ["            address " + _ip(i) for i in range(n)]
+        + ["        }", "    }", "}"]
+    )
+
+
+def distinct_keys(n):
+    """n different keys in one section, as in long option lists."""
+    return (
+        ["system {"] + ["    option-{} {}".format(i, _ip(i)) for i in range(n)] + ["}"]
+    )
+
+
+def timed(lines, update):
+    original = temp_parser.update_tree
+    temp_parser.update_tree = update
+    try:
+        start = time.perf_counter()
+        tree = build_tree(iter_events(lines))
+        return time.perf_counter() - start, tree
+    finally:
+        temp_parser.update_tree = original
+
+
+def main(legacy_limit=30000):
+    current = temp_parser.update_tree
+    print(
+        f"{'shape':>14} {'entries':>8} {'before ms':>10} {'after ms':>9} "
+        f"{'after us/entry':>15}"
+    )
+    for shape in (address_group, distinct_keys):
+        for n in (100, 1000, 10000, 100000):
+            lines = shape(n)
+            after, tree = timed(lines, current)
+            if n <= legacy_limit:
+                before, legacy_tree = timed(lines, legacy_update_tree)
+                assert tree == legacy_tree
+                before = f"{before * 1000:>10.1f}"
+            else:
+                before = f"{'-':>10}"
+            print(
+                f"{shape.__name__:>14} {n:>8} {before} {after * 1000:>9.1f} "
+                f"{after / n * 1e6:>15.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
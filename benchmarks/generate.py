@@ -0,0 +1,196 @@
+"""Synthetic EdgeOS ``config.boot`` generator used by the benchmarks.
+
+``generate_config`` builds a config in the shape the routers write: a
+``firewall`` with address groups and rule sets, ``interfaces``, an optional
+``service dhcp-server`` with networks and static mappings, and a ``system``
+section with the netflow server. The knobs scale each part independently,
+so a config can be wide (many rules), long (big address groups), deep
+(DHCP static mappings sit five levels down) or all of those. The output
+only depends on the arguments.
+
+Run ``python -m benchmarks.generate --rules 1000 > config.boot`` to write one.
+"""
+
+import argparse
+import random
+
+INDENT = "    "
+
+
+def _block(lines, depth, header, body):
+    lines.append(f"{INDENT * depth}{header} {{")
+    body(depth + 1)
+    lines.append(f"{INDENT * depth}}}")
+
+
+def _ip(rnd):
+    return "{}.{}.{}.{}".format(*(rnd.randint(1, 254) for _ in range(4)))
+
+
+def _mac(rnd):
+    return ":".join(f"{rnd.randint(0, 255):02x}" for _ in range(6))
+
+
+def _ruleset_name(n):
+    return ("WAN_IN", "WAN_LOCAL", "LAN_IN")[n] if n < 3 else f"RULESET_{n}"
+
+
+def generate_config(
+    rules=100,
+    group_members=100,
+    interfaces=4,
+    seed=0,
+    rulesets=1,
+    address_groups=1,
+    dhcp_networks=0,
+    static_mappings=0,
+    comments=0.0,
+):
+    """Return a config with roughly
+    ``rulesets * rules * 8 + address_groups * group_members`` lines, plus
+    ``dhcp_networks * static_mappings * 4`` for the DHCP service.
+
+    ``comments`` is the share of sections, between 0 and 1, that get a
+    ``/* ... */`` comment line before their header.
+    """
+    rnd = random.Random(seed)
+    # Separate stream for the newer knobs, so their defaults leave the
+    # config the same as it was before they existed.
+    extra = random.Random(seed + 1)
+    lines = []
+
+    def block(depth, header, body):
+        if comments and extra.random() < comments:
+            lines.append(f"{INDENT * depth}/* {header.split()[0]} managed by rcc */")
+        _block(lines, depth, header, body)
+
+    def firewall(depth):
+        def group(depth):
+            for g in range(address_groups):
+
+                def address_group(depth):
+                    lines.append(f'{INDENT * depth}description "Blocked hosts"')
+                    for _ in range(group_members):
+                        lines.append(f"{INDENT * depth}address {_ip(rnd)}")
+
+                group_name = "BLOCKED" if g == 0 else f"BLOCKED_{g}"
+                block(depth, f"address-group {group_name}", address_group)
+
+        def name(depth):
+            lines.append(f"{INDENT * depth}default-action drop")
+            for n in range(1, rules + 1):
+
+                def rule(depth):
+                    lines.append(
+                        f"{INDENT * depth}action {rnd.choice(['accept', 'drop'])}"
+                    )
+                    lines.append(f'{INDENT * depth}description "rule {n}"')
+                    block(
+                        depth,
+                        "destination",
+                        lambda d: lines.append(
+                            f"{INDENT * d}port {rnd.randint(1, 65535)}"
+                        ),
+                    )
+                    lines.append(f"{INDENT * depth}log disable")
+                    lines.append(f"{INDENT * depth}protocol tcp")
+
+                block(depth, f"rule {n * 10}", rule)
+
+        lines.append(f"{INDENT * depth}all-ping enable")
+        block(depth, "group", group)
+        for r in range(rulesets):
+            block(depth, f"name {_ruleset_name(r)}", name)
+        lines.append(f"{INDENT * depth}syn-cookies enable")
+
+    def interfaces_(depth):
+        for n in range(interfaces):
+
+            def ethernet(depth):
+                lines.append(f"{INDENT * depth}address 10.{n}.0.1/24")
+                lines.append(f"{INDENT * depth}duplex auto")
+                lines.append(f"{INDENT * depth}speed auto")
+
+            block(depth, f"ethernet eth{n}", ethernet)
+        lines.append(f"{INDENT * depth}loopback lo")
+
+    def service(depth):
+        def dhcp_server(depth):
+            lines.append(f"{INDENT * depth}disabled false")
+            for n in range(dhcp_networks):
+                subnet = f"10.{100 + n // 256}.{n % 256}"
+
+                def shared_network(depth):
+                    lines.append(f"{INDENT * depth}authoritative enable")
+
+                    def subnet_(depth):
+                        lines.append(f"{INDENT * depth}default-router {subnet}.1")
+                        lines.append(f"{INDENT * depth}lease 86400")
+                        for m in range(static_mappings):
+
+                            def mapping(depth):
+                                ip = f"{subnet}.{10 + m % 240}"
+                                lines.append(f"{INDENT * depth}ip-address {ip}")
+                                lines.append(
+                                    f"{INDENT * depth}mac-address {_mac(extra)}"
+                                )
+
+                            block(depth, f"static-mapping host-{n}-{m}", mapping)
+
+                    block(depth, f"subnet {subnet}.0/24", subnet_)
+
+                block(depth, f"shared-network-name LAN{n}", shared_network)
+
+        block(depth, "dhcp-server", dhcp_server)
+        block(depth, "gui", lambda d: lines.append(f"{INDENT * d}https-port 443"))
+
+    def system(depth):
+        def flow_accounting(depth):
+            lines.append(f"{INDENT * depth}interface eth0")
+
+            def netflow(depth):
+                block(
+                    depth,
+                    f"server {_ip(rnd)}",
+                    lambda d: lines.append(f"{INDENT * d}port 2055"),
+                )
+                lines.append(f"{INDENT * depth}version 9")
+
+            block(depth, "netflow", netflow)
+
+        block(depth, "flow-accounting", flow_accounting)
+        lines.append(f"{INDENT * depth}host-name ubnt")
+        lines.append(f"{INDENT * depth}name-server 1.1.1.1")
+        lines.append(f"{INDENT * depth}name-server 8.8.8.8")
+        lines.append(f"{INDENT * depth}time-zone UTC")
+
+    block(0, "firewall", firewall)
+    block(0, "interfaces", interfaces_)
+    if dhcp_networks:
+        block(0, "service", service)
+    block(0, "system", system)
+    lines.append("/* Warning: Do not remove the following line. */")
+    lines.append('/* === vyatta-config-version: "config-management@1" === */')
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    for name, default in (
+        ("rules", 100),
+        ("group-members", 100),
+        ("interfaces", 4),
+        ("seed", 0),
+        ("rulesets", 1),
+        ("address-groups", 1),
+        ("dhcp-networks", 0),
+        ("static-mappings", 0),
+    ):
+        parser.add_argument(f"--{name}", type=int, default=default)
+    parser.add_argument("--comments", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    print(generate_config(**vars(args)), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Parser benchmark suite with machine-readable results.
+
+Times ``parse_conf``, ``parse_conf_compact`` and the ``BootParser`` netflow
+lookup, netflow update and ``dump`` on generated configs of several sizes
+and shapes, and records the peak memory each one allocates.
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json --compare before.json
+
+Results are a JSON object with the environment and one record per
+benchmark and size; ``--compare`` prints the time and memory ratios
+against an earlier results file.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.generate import generate_config
+from rcc.parsers.boot import BootParser
+from rcc.parsers.temp_parser import parse_conf
+from rcc.parsers.tree import parse_conf_compact
+
+SIZES = {
+    "small": dict(rules=50, group_members=50),
+    "medium": dict(rules=1000, group_members=1000, dhcp_networks=4, static_mappings=50),
+    "large": dict(
+        rules=2500,
+        group_members=5000,
+        rulesets=2,
+        address_groups=2,
+        dhcp_networks=16,
+        static_mappings=100,
+        comments=0.05,
+    ),
+}
+
+
+def measure(func, repeat):
+    """Return ``(best seconds, peak bytes)`` of the callable ``func()`` returns."""
+    best = float("inf")
+    for _ in range(repeat):
+        run = func()
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    run = func()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def benchmarks(conf, path):
+    """Yield ``(name, setup)`` pairs; ``setup()`` returns the callable to time."""
+
+    def loaded():
+        return BootParser(path)
+
+    def set_netflow_server():
+        parser = loaded()
+        return lambda: parser.set_netflow_server("203.0.113.99")
+
+    def dump():
+        parser = loaded()
+        parser.set_netflow_server("203.0.113.99")
+        return lambda: parser.dump(path + ".out")
+
+    yield "parse_conf", lambda: lambda: parse_conf(conf)
+    yield "parse_conf_compact", lambda: lambda: parse_conf_compact(conf)
+    yield "boot_load", lambda: lambda: BootParser(path)
+    yield "find_netflow_server", lambda: loaded().find_netflow_server
+    yield "set_netflow_server", set_netflow_server
+    yield "dump", dump
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def run(sizes, repeat, only=None):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            conf = generate_config(**SIZES[size])
+            path = os.path.join(directory, f"{size}.boot")
+            with open(path, "w") as f:
+                f.write(conf)
+            for name, setup in benchmarks(conf, path):
+                if only and name not in only:
+                    continue
+                seconds, peak = measure(setup, repeat)
+                results.append(
+                    {
+                        "benchmark": name,
+                        "size": size,
+                        "lines": conf.count("\n"),
+                        "bytes": len(conf),
+                        "seconds": seconds,
+                        "peak_bytes": peak,
+                    }
+                )
+                print(
+                    f"{name:>20} {size:>7} {seconds * 1000:>10.2f} ms "
+                    f"{peak / 1024:>10,.0f} KiB peak",
+                    file=sys.stderr,
+                )
+    return results
+
+
+def compare(results, baseline):
+    old = {(r["benchmark"], r["size"]): r for r in baseline["results"]}
+    print(f"{'benchmark':>20} {'size':>7} {'time':>8} {'memory':>8}")
+    for r in results:
+        before = old.get((r["benchmark"], r["size"]))
+        if before is None:
+            continue
+        time_ratio = _ratio(r["seconds"], before["seconds"])
+        mem_ratio = _ratio(r["peak_bytes"], before["peak_bytes"])
+        name, size = r["benchmark"], r["size"]
+        print(f"{name:>20} {size:>7} {time_ratio:>7.2f}x {mem_ratio:>7.2f}x")
+
+
+def _ratio(new, old):
+    return new / old if old else float("nan")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the parser benchmark suite.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--only", nargs="+", help="Benchmarks to run, by name")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.only)
+    report = {"environment": environment(), "sizes": SIZES, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
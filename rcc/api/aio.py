@@ -0,0 +1,249 @@
+"""asyncio counterparts of the HTTP clients, built on aiohttp.
+
+``aiohttp`` is an optional dependency, installed with ``pip install
+rcc[async]``; the clients raise ``RCCException`` when it is missing.
+
+Every client owns an ``aiohttp.ClientSession``, or is given one with
+``session=`` so that several clients share its connection pool. The pool
+holds up to ``limit`` connections, so one process can run many device
+operations with ``asyncio.gather`` and no thread per device::
+
+    async with AsyncUNMSClient(url, user, password) as client:
+        await asyncio.gather(*(client.create_backup(d) for d in device_ids))
+
+Requests are recorded in ``metrics`` and logged like those of
+``BaseHttpClient``, and fail with ``HTTPException``.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import time
+from urllib.parse import urlparse
+
+from rcc.api.cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL, ResponseCache, cache_key
+from rcc.api.http import STREAM_CHUNK_SIZE, BaseHttpClient, log_response
+from rcc.api.metrics import Metrics
+from rcc.exceptions import HTTPException, RCCException
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+logger = logging.getLogger(__name__)
+
+# Connections per session pool, across all hosts; aiohttp's own default.
+DEFAULT_LIMIT = 100
+
+
+class AsyncResponse:
+    """A fully read response, with the parts of ``requests.Response`` rcc uses."""
+
+    def __init__(self, status_code, headers, content, url):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+        self.encoding = None
+        for param in headers.get("Content-Type", "").split(";")[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "charset":
+                self.encoding = value.strip('"')
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPException(f"{self.status_code} Error for url: {self.url}")
+
+
+class AsyncBaseHttpClient:
+    def __init__(
+        self,
+        base_url=None,
+        username=None,
+        password=None,
+        timeout=10,
+        session=None,
+        limit=DEFAULT_LIMIT,
+        metrics=None,
+        cache_max_entries=DEFAULT_MAX_ENTRIES,
+        cache_ttls=None,
+    ):
+        if aiohttp is None:
+            raise RCCException("The async clients need aiohttp: pip install rcc[async]")
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.limit = limit
+        self.metrics = Metrics() if metrics is None else metrics
+        self._session = session
+        self._owns_session = session is None
+        self._endpoint_patterns = None
+        self._cache_limit = DEFAULT_TTL
+        self.cache = ResponseCache(cache_max_entries, self._cache_limit)
+        self.cache_ttls = dict(cache_ttls or {})
+
+    def __str__(self):
+        return "[{}: {}]".format(self.__class__.__name__, self.base_url)
+
+    endpoint_template = BaseHttpClient.endpoint_template
+    cache_ttl = BaseHttpClient.cache_ttl
+
+    @property
+    def session(self):
+        """The ``aiohttp.ClientSession``, created on first use inside the event loop."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit),
+                timeout=aiohttp.ClientTimeout(
+                    total=None, sock_connect=self.timeout, sock_read=self.timeout
+                ),
+                trust_env=False,
+            )
+        return self._session
+
+    async def close(self):
+        """Close the session, unless it was passed in and so belongs to the caller."""
+        if self._session is not None and self._owns_session:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    async def auth_headers(self):
+        """Headers that authenticate a request; override to add a token."""
+        return {}
+
+    def _auth(self):
+        if self.username and self.password:
+            return aiohttp.BasicAuth(self.username, self.password)
+        return None
+
+    def record(
+        self,
+        method,
+        endpoint,
+        start,
+        response=None,
+        error=None,
+        bytes_in=None,
+        bytes_out=0,
+    ):
+        if bytes_in is None:
+            bytes_in = 0 if response is None else len(response.content)
+        self.metrics.record(
+            self.__class__.__name__,
+            method,
+            self.endpoint_template(endpoint),
+            time.perf_counter() - start,
+            status=None if response is None else response.status_code,
+            error=None if error is None else error.__class__.__name__,
+            bytes_in=bytes_in,
+            bytes_out=bytes_out,
+        )
+
+    async def _read(self, resp, target_url):
+        content = await resp.read()
+        return AsyncResponse(resp.status, resp.headers, content, target_url)
+
+    async def _request(self, method, endpoint, headers=None, **kwargs):
+        target_url = "{}{}".format(self.base_url, endpoint)
+        start = time.perf_counter()
+        try:
+            headers = {**await self.auth_headers(), **(headers or {})}
+            async with self.session.request(
+                method, target_url, headers=headers, auth=self._auth(), **kwargs
+            ) as resp:
+                response = await self._read(resp, target_url)
+                sent = resp.request_info.headers.get("Content-Length")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.record(method, endpoint, start, error=e)
+            raise HTTPException(e)
+        except HTTPException as e:
+            self.record(method, endpoint, start, error=e)
+            raise
+        self.record(method, endpoint, start, response, bytes_out=int(sent or 0))
+        log_response(response, target_url, log=logger)
+        return response
+
+    async def get_data(self, endpoint, params=None):
+        return await self._request("GET", endpoint, params=params or {})
+
+    async def post_data(self, endpoint, payload=None):
+        return await self._request("POST", endpoint, json=payload or {})
+
+    async def delete_data(self, endpoint):
+        return await self._request("DELETE", endpoint)
+
+    async def put_data(self, endpoint, params=None, data=None, headers=None):
+        return await self._request(
+            "PUT", endpoint, params=params or {}, data=data, headers=headers
+        )
+
+    async def get_stream(
+        self, endpoint, consumer, params=None, chunk_size=STREAM_CHUNK_SIZE
+    ):
+        """GET ``endpoint`` and pass the body to ``consumer`` in chunks.
+
+        ``consumer`` may be a plain function or a coroutine function.
+        """
+        target_url = "{}{}".format(self.base_url, endpoint)
+        start = time.perf_counter()
+        received = 0
+        response = None
+        try:
+            async with self.session.get(
+                target_url,
+                params=params or {},
+                headers=await self.auth_headers(),
+                auth=self._auth(),
+            ) as resp:
+                response = AsyncResponse(resp.status, resp.headers, b"", target_url)
+                log_response(response, target_url, streamed=True, log=logger)
+                response.raise_for_status()
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    received += len(chunk)
+                    result = consumer(chunk)
+                    if inspect.isawaitable(result):
+                        await result
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.record("GET", endpoint, start, response, e, bytes_in=received)
+            raise HTTPException(e)
+        except HTTPException as e:
+            self.record("GET", endpoint, start, response, e, bytes_in=received)
+            raise
+        self.record("GET", endpoint, start, response, bytes_in=received)
+        return response
+
+    async def get_cached(self, endpoint, params=None):
+        """GET ``endpoint`` through the response cache; see ``get_cached``."""
+        key = cache_key(endpoint, params)
+        cached, headers = self.cache.lookup(key)
+        if cached is not None:
+            return cached
+        response = await self._request(
+            "GET",
+            endpoint,
+            params=params if params is not None else {},
+            headers=headers,
+        )
+        return self.cache.update(key, response, self.cache_ttl(endpoint))
+
+    def get_domain(self):
+        parsed_uri = urlparse(self.base_url)
+        return parsed_uri.netloc
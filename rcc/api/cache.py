@@ -0,0 +1,159 @@
+"""Bounded, thread-safe cache for the HTTP clients.
+
+``ResponseCache`` holds up to ``max_entries`` values and drops the least
+recently used one beyond that. Each entry has its own time to live and may
+carry the ``ETag`` and ``Last-Modified`` of the response it came from. An
+expired entry is not served, but it is kept until evicted so that the next
+request for it can be made conditional: a ``304 Not Modified`` answer then
+renews the entry without the body being sent again.
+
+``lookup`` and ``update`` hold that logic for a GET made through the cache,
+so that the sync and async clients only differ in how they send it.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL = 300  # 5 minutes
+
+
+def cache_key(endpoint, params=None):
+    """Return the cache key of a GET of ``endpoint`` with ``params``."""
+    return ("GET", endpoint, tuple(sorted((params or {}).items())))
+
+
+class CacheEntry:
+    __slots__ = ("value", "expires", "etag", "last_modified")
+
+    def __init__(self, value, expires, etag=None, last_modified=None):
+        self.value = value
+        self.expires = expires
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def validators(self):
+        """Return the headers that make a request for this entry conditional."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        default_ttl=DEFAULT_TTL,
+        clock=time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def entry(self, key):
+        """Return the entry for ``key``, fresh or not, or ``None``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def is_fresh(self, entry):
+        return entry.expires > self.clock()
+
+    def get(self, key):
+        """Return the value for ``key`` if it has not expired, otherwise ``None``."""
+        entry = self.entry(key)
+        if entry is None or not self.is_fresh(entry):
+            return None
+        return entry.value
+
+    def set(self, key, value, ttl=None, etag=None, last_modified=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = CacheEntry(value, self.clock() + ttl, etag, last_modified)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def refresh(self, key, ttl=None, etag=None, last_modified=None):
+        """Renew ``key`` once the server confirmed it is unchanged; return its entry."""
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.expires = self.clock() + ttl
+            entry.etag = etag or entry.etag
+            entry.last_modified = last_modified or entry.last_modified
+            self._entries.move_to_end(key)
+            return entry
+
+    def lookup(self, key):
+        """Return ``(value, headers)`` before a GET for ``key``.
+
+        ``value`` is the cached response if it is still fresh, and then no
+        request is needed. Otherwise it is ``None`` and ``headers`` are the
+        validators to make the request conditional with, if there are any.
+        """
+        entry = self.entry(key)
+        if entry is None:
+            return None, None
+        if self.is_fresh(entry):
+            return entry.value, None
+        return None, entry.validators() or None
+
+    def update(self, key, response, ttl=None):
+        """Return the response to use after a GET for ``key`` got ``response``.
+
+        A ``304`` renews the cached response and returns it. A ``200`` is
+        stored and returned; anything else is returned as it is.
+        """
+        headers = response.headers
+        if response.status_code == 304:
+            entry = self.refresh(
+                key, ttl, headers.get("ETag"), headers.get("Last-Modified")
+            )
+            if entry is not None:
+                logger.debug(f"{key[1]} not modified, using the cached response")
+                return entry.value
+        elif response.status_code == 200:
+            self.set(
+                key, response, ttl, headers.get("ETag"), headers.get("Last-Modified")
+            )
+        return response
+
+    def pop(self, key):
+        with self._lock:
+            return self._entries.pop(key).value
+
+    def clean(self):
+        """Remove every expired entry, validators or not."""
+        now = self.clock()
+        with self._lock:
+            for key in [
+                key for key, entry in self._entries.items() if entry.expires <= now
+            ]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
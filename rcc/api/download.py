@@ -0,0 +1,328 @@
+"""Resumable downloads with HTTP range requests.
+
+A download is written to ``<filepath>.part`` and renamed into place once
+complete. Next to it, ``<filepath>.part.json`` records the validator of the
+response the part came from: its ``ETag``, ``Last-Modified`` and length.
+When the connection drops, the download resumes from the end of the part
+file with a ``Range`` request, up to ``attempts`` times, and a part left
+behind by an earlier run is resumed the same way.
+
+``If-Range`` makes the server send the whole body again if the validator no
+longer matches, and a partial response is checked against the stored
+validator too, so a backup that changed in the meantime is downloaded from
+the start instead of being spliced onto the old one.
+
+With ``parts`` above one, a body of at least ``PARALLEL_MIN_BYTES`` is
+fetched as that many ranges on as many threads. Each range is retried on
+its own, but a parallel download that still fails is not kept for resuming.
+
+If the client has a ``RetryPolicy``, it decides when to resume instead of
+``attempts``: how often, after what backoff, and until which deadline, and
+a retryable status such as ``503`` is resumed as well. The requests
+themselves are then made without the client's own retries, so the two do
+not multiply.
+"""
+
+import itertools
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from rcc.exceptions import HTTPException
+
+logger = logging.getLogger(__name__)
+
+ATTEMPTS = 5
+
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".json"
+
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+# Errors after which the same request may succeed from where it stopped.
+RETRYABLE = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+)
+
+rx_content_range = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class IncompleteDownload(requests.exceptions.ConnectionError):
+    """The body ended before the length the server announced."""
+
+
+class ChangedDownload(HTTPException):
+    """The resource changed while it was being downloaded."""
+
+
+def _content_range(response):
+    """Return ``(start, total)`` from a 206 response; ``total`` may be ``None``."""
+    m = rx_content_range.match(response.headers.get("Content-Range", ""))
+    if m is None:
+        raise HTTPException(
+            f"Bad Content-Range: {response.headers.get('Content-Range')}"
+        )
+    total = m.group(3)
+    return int(m.group(1)), None if total == "*" else int(total)
+
+
+def validator(response):
+    """Return what identifies the representation ``response`` is part of."""
+    if response.status_code == 206:
+        length = _content_range(response)[1]
+    else:
+        length = response.headers.get("Content-Length")
+        length = None if length is None else int(length)
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "length": length,
+    }
+
+
+def matches(state, response):
+    """Whether ``response`` belongs to the representation ``state`` describes."""
+    current = validator(response)
+    return all(
+        state[key] is None or current[key] is None or state[key] == current[key]
+        for key in ("etag", "last_modified", "length")
+    )
+
+
+def range_headers(start, state, end=None):
+    headers = {
+        # A decoded body would not match the byte offsets in the part file.
+        "Accept-Encoding": "identity",
+        "Range": f"bytes={start}-{'' if end is None else end}",
+    }
+    # Weak ETags cannot be used with If-Range; the date is the next best.
+    if state["etag"] and not state["etag"].startswith("W/"):
+        headers["If-Range"] = state["etag"]
+    elif state["last_modified"]:
+        headers["If-Range"] = state["last_modified"]
+    return headers
+
+
+def load_state(part):
+    try:
+        with open(part + STATE_SUFFIX) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(part) or not isinstance(state, dict):
+        return None
+    return state
+
+
+def save_state(part, state):
+    with open(part + STATE_SUFFIX, "w") as f:
+        json.dump(state, f)
+
+
+def discard(part):
+    for path in (part, part + STATE_SUFFIX):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _retrier(client, endpoint, attempts):
+    """Return ``retry(attempt, error)``, which says whether to make another
+    attempt after attempt number ``attempt`` failed with ``error``, and waits
+    for the client's ``RetryPolicy`` first if it has one."""
+    policy = getattr(client, "retry", None)
+    if policy is None:
+        return lambda attempt, error: (
+            attempt < attempts and isinstance(error, RETRYABLE)
+        )
+    started = policy.clock()
+
+    def retry(attempt, error):
+        response = getattr(error, "response", None)
+        if response is not None:
+            delay = policy.next_delay("GET", attempt - 1, started, response=response)
+        else:
+            delay = policy.next_delay("GET", attempt - 1, started, error=error)
+        if delay is None:
+            return False
+        client.metrics.record_retry(
+            client.__class__.__name__, "GET", client.endpoint_template(endpoint)
+        )
+        policy.sleep(delay)
+        return True
+
+    return retry
+
+
+def _write(response, path, mode, chunk_size):
+    with open(path, mode) as f:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            f.write(chunk)
+
+
+def _fetch(client, endpoint, params, part, chunk_size):
+    """Bring ``part`` up to date with one request."""
+    state = load_state(part)
+    # Without any validator a changed body cannot be told apart, so start over.
+    offset = os.path.getsize(part) if state and any(state.values()) else 0
+    if state and state["length"] is not None and offset >= state["length"]:
+        return state
+    headers = (
+        range_headers(offset, state) if offset else {"Accept-Encoding": "identity"}
+    )
+    with client.open_stream(endpoint, params, headers, retry=False) as response:
+        if response.status_code == 416:
+            raise ChangedDownload(f"{endpoint} is shorter than {part}")
+        if response.status_code == 206:
+            start, _ = _content_range(response)
+            if start != offset or not matches(state, response):
+                raise ChangedDownload(f"{endpoint} changed since {part} was started")
+            logger.info(f"Resuming {endpoint} at byte {offset}")
+            _write(response, part, "ab", chunk_size)
+        else:
+            response.raise_for_status()
+            if offset:
+                logger.info(
+                    f"Restarting {endpoint}: the partial download is out of date"
+                )
+            state = validator(response)
+            save_state(part, state)
+            _write(response, part, "wb", chunk_size)
+    size = os.path.getsize(part)
+    if state["length"] is not None and size < state["length"]:
+        raise IncompleteDownload(f"Got {size} of {state['length']} bytes of {endpoint}")
+    return state
+
+
+def _fetch_range(
+    client, endpoint, params, path, start, end, state, chunk_size, attempts
+):
+    """Write bytes ``start`` to ``end`` inclusive into ``path``.
+
+    A failed request is retried from where it stopped.
+    """
+    pos = start
+    retry = _retrier(client, endpoint, attempts)
+    for attempt in itertools.count(1):
+        try:
+            with client.open_stream(
+                endpoint, params, range_headers(pos, state, end), retry=False
+            ) as response:
+                if response.status_code != 206:
+                    response.raise_for_status()
+                    raise ChangedDownload(f"{endpoint} changed during the download")
+                if _content_range(response)[0] != pos or not matches(state, response):
+                    raise ChangedDownload(f"{endpoint} changed during the download")
+                with open(path, "r+b") as f:
+                    f.seek(pos)
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        # A server may send more than the range; drop the excess.
+                        pos += f.write(chunk[: max(0, end + 1 - pos)])
+                        if pos > end:
+                            break
+            if pos > end:
+                return
+            raise IncompleteDownload(
+                f"Range {start}-{end} of {endpoint} ended at {pos}"
+            )
+        except (*RETRYABLE, requests.exceptions.HTTPError) as e:
+            if not retry(attempt, e):
+                raise
+            logger.warning(
+                f"Range {start}-{end} of {endpoint} failed at byte {pos}, retrying: {e}"
+            )
+
+
+def _fetch_parallel(client, endpoint, params, part, parts, chunk_size, attempts):
+    """Download ``part`` as ``parts`` ranges; ``False`` if that is not worth it."""
+    with client.open_stream(
+        endpoint,
+        params,
+        {"Accept-Encoding": "identity", "Range": "bytes=0-0"},
+        retry=False,
+    ) as response:
+        if response.status_code != 206:
+            return False
+        state = validator(response)
+    length = state["length"]
+    if length is None or length < PARALLEL_MIN_BYTES:
+        return False
+    with open(part, "wb") as f:
+        f.truncate(length)
+    size = -(-length // parts)
+    ranges = [
+        (start, min(start + size, length) - 1) for start in range(0, length, size)
+    ]
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [
+                pool.submit(
+                    _fetch_range,
+                    client,
+                    endpoint,
+                    params,
+                    part,
+                    start,
+                    end,
+                    state,
+                    chunk_size,
+                    attempts,
+                )
+                for start, end in ranges
+            ]
+            for future in futures:
+                future.result()
+    except BaseException:
+        # The file has holes where ranges are missing, so it cannot be resumed.
+        discard(part)
+        raise
+    save_state(part, state)
+    return True
+
+
+def _finish(part, filepath):
+    os.replace(part, filepath)
+    discard(part)
+    return filepath
+
+
+def download(
+    client,
+    endpoint,
+    filepath,
+    params=None,
+    chunk_size=64 * 1024,
+    attempts=ATTEMPTS,
+    parts=1,
+):
+    """Download ``endpoint`` to ``filepath``; see the module docstring."""
+    filepath = os.fspath(filepath)
+    part = filepath + PART_SUFFIX
+    if load_state(part) is None:
+        discard(part)
+        if parts > 1 and _fetch_parallel(
+            client, endpoint, params, part, parts, chunk_size, attempts
+        ):
+            return _finish(part, filepath)
+    retry = _retrier(client, endpoint, attempts)
+    for attempt in itertools.count(1):
+        try:
+            _fetch(client, endpoint, params, part, chunk_size)
+            break
+        except ChangedDownload:
+            logger.info(f"Restarting {endpoint}: it changed during the download")
+            discard(part)
+            if attempt >= attempts:
+                raise
+        except (*RETRYABLE, requests.exceptions.HTTPError) as e:
+            if not retry(attempt, e):
+                raise
+            logger.warning(f"Download of {endpoint} interrupted, resuming: {e}")
+    return _finish(part, filepath)
@@ -1,15 +1,95 @@
+import re
 import time
+import concurrent.futures
 import logging
 import threading
+import weakref
 import requests
 import certifi
+from contextlib import contextmanager
 from urllib.parse import urlparse
 
+from rcc.api import download
+from rcc.api.cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL, ResponseCache, cache_key
+from rcc.api.metrics import Metrics
+from rcc.api.retry import INTERRUPTS, replayable
 from rcc.exceptions import HTTPException
 
 
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Connections kept open per host; requests' own default.
+DEFAULT_POOL_MAXSIZE = 10
+
+# Longest body logged at DEBUG; the rest is summarized by its size.
+BODY_PREVIEW_BYTES = 2048
+
+TEXT_CONTENT_TYPES = (
+    "text/",
+    "application/json",
+    "application/xml",
+    "application/x-www-form-urlencoded",
+)
+
+
+def is_text(content_type):
+    content_type = content_type.split(";")[0].strip().lower()
+    return content_type.startswith(TEXT_CONTENT_TYPES) or content_type.endswith(
+        ("+json", "+xml")
+    )
+
+
+def describe_body(response, streamed=False, limit=BODY_PREVIEW_BYTES):
+    """Return a preview of ``response``'s body for the debug log.
+
+    Text bodies are cut to ``limit`` bytes and decoded without charset
+    detection. Binary bodies, and streamed ones that are yet to be read,
+    are only described by their size and content type.
+    """
+    content_type = response.headers.get("Content-Type", "")
+    if streamed:
+        size = response.headers.get("Content-Length", "unknown")
+        return f"<streamed, {size} bytes of {content_type or 'unknown type'}>"
+    content = response.content or b""
+    if not is_text(content_type):
+        return f"<{len(content)} bytes of {content_type or 'unknown type'}>"
+    preview = content[:limit].decode(response.encoding or "utf-8", errors="replace")
+    if len(content) > limit:
+        preview += f"... <{len(content)} bytes>"
+    return preview
+
+
+def _bytes_in(response):
+    if response is None:
+        return 0
+    try:
+        return response.raw.tell()
+    except Exception:
+        content = response._content
+        return len(content or b"") if isinstance(content, bytes) else 0
+
+
+def _bytes_out(response):
+    request = getattr(response, "request", None)
+    if request is None or request.body is None:
+        return 0
+    if isinstance(request.body, (bytes, str)):
+        return len(request.body)
+    return int(request.headers.get("Content-Length") or 0)
+
+
+def log_response(response, target_url, streamed=False, log=logger):
+    """Log ``response`` at DEBUG; does no work at all unless DEBUG is enabled."""
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    log.debug(
+        f"Response[{response.status_code}] for {target_url}:\n"
+        f"Headers:{response.headers}\n"
+        f"Content:\n{describe_body(response, streamed)}"
+    )
+
 
 class BaseHttpClient:
     requests = requests
@@ -23,6 +103,11 @@ class BaseHttpClient:
         timeout=10,
         verify=True,
         use_ssl3=False,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        metrics=None,
+        cache_max_entries=DEFAULT_MAX_ENTRIES,
+        cache_ttls=None,
+        retry=None,
     ):
         self.base_url = base_url
         self.username = username
@@ -30,9 +115,20 @@ class BaseHttpClient:
         self.timeout = timeout
         self.verify = verify
         self.use_ssl3 = use_ssl3
-        self.threaded_session = {}
-        self._cache_limit = 300  # 5 minutes
-        self._cache = {}
+        self.pool_maxsize = pool_maxsize
+        self.metrics = Metrics() if metrics is None else metrics
+        # A RetryPolicy; without one every request is made once.
+        self.retry = retry
+        self._endpoint_patterns = None
+        self._adapter = None
+        self._executor = None
+        self._local = threading.local()
+        self._sessions = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._cache_limit = DEFAULT_TTL
+        self.cache = ResponseCache(cache_max_entries, self._cache_limit)
+        # Seconds to cache GETs for, by endpoint template; 0 revalidates every time.
+        self.cache_ttls = dict(cache_ttls or {})
 
     def __str__(self):
         return "[{}: {}]".format(self.__class__.__name__, self.base_url)
@@ -43,137 +139,385 @@ class BaseHttpClient:
         s = self.requests.Session()
         s.trust_env = False
         # s.verify = self.certifi.where() if self.verify else False
-        s.mount(self.base_url, self._get_adapter())
+        s.mount(self.base_url, self.adapter)
         if self.username and self.password:
             s.auth = (self.username, self.password)
         return s
 
     def _get_adapter(self):
         """Use logic to determine what Adaptor is required."""
-        return self.requests.adapters.HTTPAdapter()
+        return self.requests.adapters.HTTPAdapter(pool_maxsize=self.pool_maxsize)
+
+    @property
+    def adapter(self):
+        """The adapter shared by every session of this client.
+
+        Its connection pool keeps up to ``pool_maxsize`` connections to
+        ``base_url`` alive between requests and across threads.
+        """
+        with self._lock:
+            if self._adapter is None:
+                self._adapter = self._get_adapter()
+            return self._adapter
+
+    @property
+    def executor(self):
+        """Threads for hedged requests, created on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.pool_maxsize, thread_name_prefix="rcc-hedge"
+                )
+            return self._executor
+
+    def thread_session(self, name="session", factory=None):
+        """Return this thread's session ``name``, made by ``factory`` on first use.
+
+        Sessions are not safe to share between threads, so each thread gets
+        its own; they all use the one pooled ``adapter``.
+        """
+        session = getattr(self._local, name, None)
+        if session is None:
+            session = (factory or self.get_session)()
+            setattr(self._local, name, session)
+            with self._lock:
+                self._sessions.add(session)
+        return session
+
+    def close(self):
+        """Close every session and pooled connection; later requests open new ones."""
+        with self._lock:
+            sessions = list(self._sessions)
+            adapter = self._adapter
+            executor = self._executor
+            self._sessions = weakref.WeakSet()
+            self._local = threading.local()
+            self._adapter = None
+            self._executor = None
+        if executor is not None:
+            # Hedged requests that lost are left to finish on their own.
+            executor.shutdown(wait=False)
+        for session in sessions:
+            session.close()
+        if adapter is not None:
+            adapter.close()
 
     def __enter__(self):
         """For use as a context statement. You can simply say:
         with self as session:
             session.get(...)
 
-        This will open and provide a session to use for requests,
-        then close it when complete, using __exit__."""
-        self.threaded_session[threading.currentThread().ident] = self.get_session()
-        return self.threaded_session[threading.currentThread().ident]
+        This provides this thread's long-lived session, which stays open
+        after the block so that its connections are reused; see ``close``."""
+        return self.thread_session()
 
     def __exit__(self, *exc):
         """Used to close context statement."""
-        self.threaded_session[threading.currentThread().ident].close()
-        self.threaded_session[threading.currentThread().ident] = None
         return False
 
-    def get_data(self, endpoint, params=None) -> requests.Response:
-        response = self._get_data_for_request(endpoint, params)
-        return response
+    def endpoint_template(self, endpoint):
+        """Return the ``*_endpoint`` template ``endpoint`` was formatted from.
 
-    def _get_data_for_request(self, endpoint, params=None):
+        Metrics are keyed by template so that ids do not make a new series
+        each; an endpoint matching no template is returned as it is.
+        """
+        if self._endpoint_patterns is None:
+            templates = {
+                value
+                for name, value in vars(self).items()
+                if name.endswith("_endpoint") and isinstance(value, str)
+            }
+            patterns = []
+            for template in templates:
+                literals = re.split(r"\{[^}]*\}", template)
+                pattern = re.compile("[^/]+".join(map(re.escape, literals)))
+                patterns.append((-len("".join(literals)), template, pattern))
+            # Most literal text first, so "/backups/{id}/apply" beats "/backups/{id}".
+            self._endpoint_patterns = [(t, p) for _, t, p in sorted(patterns)]
+        for template, pattern in self._endpoint_patterns:
+            if pattern.fullmatch(endpoint):
+                return template
+        return endpoint
+
+    def cache_ttl(self, endpoint):
+        """Return the TTL ``cache_ttls`` gives the template of ``endpoint``."""
+        return self.cache_ttls.get(self.endpoint_template(endpoint), self._cache_limit)
+
+    def record(self, method, endpoint, start, response=None, error=None):
+        """Record a request to ``endpoint`` begun at ``perf_counter()`` ``start``."""
+        self.metrics.record(
+            self.__class__.__name__,
+            method,
+            self.endpoint_template(endpoint),
+            time.perf_counter() - start,
+            status=None if response is None else response.status_code,
+            error=None if error is None else error.__class__.__name__,
+            bytes_in=_bytes_in(response),
+            bytes_out=_bytes_out(response),
+        )
+
+    def _send(self, method, endpoint, target_url, kwargs):
+        """Make one attempt at a request and record it; errors are not wrapped."""
         response = None
+        start = time.perf_counter()
         try:
-            target_url = "{}{}".format(self.base_url, endpoint)
             with self as session:
-                response = session.get(
-                    target_url,
-                    timeout=self.timeout,
-                    params=params if params is not None else {},
-                )
-                logger.debug(
-                    f"Response[{response.status_code}] for {target_url}:\nHeaders:{response.headers}\nContent:\n{response.text}"
+                response = session.request(
+                    method, target_url, timeout=self.timeout, **kwargs
                 )
-        except requests.exceptions.ConnectionError as e:
-            raise HTTPException(e)
+                log_response(response, target_url)
         except Exception as e:
-            raise HTTPException(e)
+            self.record(method, endpoint, start, error=e)
+            raise
+        self.record(method, endpoint, start, response)
         return response
 
-    def post_data(self, endpoint, payload=None) -> requests.Response:
-        response = self._post_data_for_request(endpoint, payload)
+    def _hedged_send(self, method, endpoint, target_url, kwargs):
+        """Make one attempt at a request, sent twice if the first copy is slow.
+
+        See ``rcc.api.retry``. The first successful answer is returned; if
+        both copies fail, the first one's error is raised.
+        """
+        template = self.endpoint_template(endpoint)
+        stats = self.metrics.get(method, template, client=self.__class__.__name__)
+        delay = self.retry.hedge_delay(method, stats)
+        if delay is None:
+            return self._send(method, endpoint, target_url, kwargs)
+        first = self.executor.submit(self._send, method, endpoint, target_url, kwargs)
+        if concurrent.futures.wait([first], timeout=delay).done:
+            return first.result()
+        logger.debug(f"No response from {endpoint} after {delay}s, sending it again")
+        self.metrics.record_hedge(self.__class__.__name__, method, template)
+        second = self.executor.submit(self._send, method, endpoint, target_url, kwargs)
+        pending = {first, second}
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        return first.result()
+
+    def _retrying(
+        self, method, endpoint, kwargs, attempt, discard=None, use_policy=True
+    ):
+        """Call ``attempt()`` until it succeeds or ``retry`` gives up.
+
+        ``discard`` is called with a response that is about to be retried.
+        Returns the last response or raises the last error, unwrapped. An
+        interrupt (see ``rcc.api.retry.INTERRUPTS``) is raised straight away.
+        """
+        policy = self.retry if use_policy and replayable(kwargs) else None
+        started = policy.clock() if policy else None
+        retry = 0
+        while True:
+            response = error = None
+            try:
+                response = attempt()
+            except INTERRUPTS:
+                raise
+            except Exception as e:
+                error = e
+            if policy is None:
+                break
+            delay = policy.next_delay(method, retry, started, response, error)
+            if delay is None:
+                break
+            if discard is not None and response is not None:
+                discard(response)
+            logger.warning(
+                f"{method} {endpoint} failed with {error or response.status_code}, "
+                f"retrying in {delay:.2f}s"
+            )
+            self.metrics.record_retry(
+                self.__class__.__name__, method, self.endpoint_template(endpoint)
+            )
+            policy.sleep(delay)
+            retry += 1
+        if error is not None:
+            raise error
         return response
 
-    def _post_data_for_request(self, endpoint, payload=None):
-        response = None
+    def _request(self, method, endpoint, **kwargs):
+        """Make a request, retrying it as ``retry`` allows.
+
+        Raises ``HTTPException`` for the last error; a response with an
+        error status is returned as it is once retries are exhausted. An
+        interrupt such as ``signal_timeout``'s ``TimeoutError`` is not wrapped.
+        """
+        target_url = "{}{}".format(self.base_url, endpoint)
+        send = self._hedged_send if self.retry else self._send
         try:
-            target_url = "{}{}".format(self.base_url, endpoint)
-            with self as session:
-                response = session.post(
-                    target_url,
-                    timeout=self.timeout,
-                    json=payload or {},
-                )
-                logger.debug(
-                    f"Response[{response.status_code}] for {target_url}:\nHeaders:{response.headers}\nContent:\n{response.text}"
-                )
-        except requests.exceptions.ConnectionError as e:
-            raise HTTPException(e)
+            return self._retrying(
+                method,
+                endpoint,
+                kwargs,
+                lambda: send(method, endpoint, target_url, kwargs),
+            )
+        except INTERRUPTS:
+            raise
         except Exception as e:
-            raise HTTPException(e)
-        return response
+            raise HTTPException(e) from e
 
-    def delete_data(self, endpoint):
-        response = self._delete_for_request(endpoint)
+    def get_data(self, endpoint, params=None) -> requests.Response:
+        response = self._get_data_for_request(endpoint, params)
         return response
 
-    def _delete_for_request(self, endpoint):
+    def _get_data_for_request(self, endpoint, params=None):
+        return self._request(
+            "GET", endpoint, params=params if params is not None else {}
+        )
+
+    @contextmanager
+    def open_stream(self, endpoint, params=None, headers=None, retry=True):
+        """Context manager giving the streamed response to a GET of ``endpoint``.
+
+        The body is left unread for the caller; requests exceptions are not
+        wrapped, so callers can tell a dropped connection from other errors.
+        Opening the response is retried as ``retry`` allows, since nothing
+        has been read yet; a body that breaks off later is not. Pass
+        ``retry=False`` for a single attempt when the caller retries itself.
+        """
+        target_url = "{}{}".format(self.base_url, endpoint)
+        kwargs = {"params": params if params is not None else {}, "headers": headers}
+        starts = []
+
+        def attempt():
+            starts.append(time.perf_counter())
+            try:
+                with self as session:
+                    response = session.get(
+                        target_url, timeout=self.timeout, stream=True, **kwargs
+                    )
+            except Exception as e:
+                self.record("GET", endpoint, starts[-1], error=e)
+                raise
+            log_response(response, target_url, streamed=True)
+            return response
+
+        def discard(response):
+            self.record("GET", endpoint, starts[-1], response)
+            response.close()
+
+        response = self._retrying("GET", endpoint, kwargs, attempt, discard, retry)
+        try:
+            with response:
+                yield response
+        except Exception as e:
+            self.record("GET", endpoint, starts[-1], response, error=e)
+            raise
+        self.record("GET", endpoint, starts[-1], response)
+
+    def get_stream(self, endpoint, consumer, params=None, chunk_size=STREAM_CHUNK_SIZE):
+        """GET ``endpoint`` and pass the body to ``consumer`` in chunks.
+
+        The body is never held in memory as a whole. Returns the response,
+        whose content has been consumed; raises ``HTTPException`` if the
+        status is not a success.
+        """
         response = None
         try:
-            target_url = "{}{}".format(self.base_url, endpoint)
-            with self as session:
-                response = session.delete(
-                    target_url, timeout=self.timeout
-                )
-                logger.debug(
-                    f"Response[{response.status_code}] for {target_url}:\nHeaders:{response.headers}\nContent:\n{response.text}"
-                )
+            with self.open_stream(endpoint, params) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    consumer(chunk)
         except requests.exceptions.ConnectionError as e:
             raise HTTPException(e)
+        except INTERRUPTS:
+            raise
         except Exception as e:
             raise HTTPException(e)
         return response
 
-    def put_data(self, endpoint, params=None, files=None):
-        response = self._put_for_request(endpoint, params=params, files=files)
-        return response
+    def download_file(
+        self,
+        endpoint,
+        filepath,
+        params=None,
+        chunk_size=STREAM_CHUNK_SIZE,
+        attempts=download.ATTEMPTS,
+        parts=1,
+    ):
+        """Download ``endpoint`` to ``filepath``, resuming after dropped connections.
 
-    def _put_for_request(self, endpoint, params=None, files=None):
-        response = None
+        See ``rcc.api.download``. Returns ``filepath``; raises
+        ``HTTPException`` when the download cannot be completed.
+        """
         try:
-            target_url = "{}{}".format(self.base_url, endpoint)
-            with self as session:
-                response = session.put(
-                    target_url,
-                    timeout=self.timeout,
-                    files=files,
-                    params=params or {},
-                )
-                logger.debug(
-                    f"Response[{response.status_code}] for {target_url}:\nHeaders:{response.headers}\nContent:\n{response.text}"
-                )
-        except requests.exceptions.ConnectionError as e:
-            raise HTTPException(e)
+            download.download(
+                self, endpoint, filepath, params, chunk_size, attempts, parts
+            )
+        except (HTTPException, *INTERRUPTS):
+            raise
         except Exception as e:
             raise HTTPException(e)
+        return filepath
+
+    def post_data(self, endpoint, payload=None) -> requests.Response:
+        response = self._post_data_for_request(endpoint, payload)
         return response
 
+    def _post_data_for_request(self, endpoint, payload=None):
+        return self._request("POST", endpoint, json=payload or {})
+
+    def delete_data(self, endpoint):
+        response = self._delete_for_request(endpoint)
+        return response
+
+    def _delete_for_request(self, endpoint):
+        return self._request("DELETE", endpoint)
+
+    def put_data(self, endpoint, params=None, files=None, data=None, headers=None):
+        response = self._put_for_request(
+            endpoint, params=params, files=files, data=data, headers=headers
+        )
+        return response
+
+    def _put_for_request(
+        self, endpoint, params=None, files=None, data=None, headers=None
+    ):
+        return self._request(
+            "PUT",
+            endpoint,
+            params=params or {},
+            files=files,
+            data=data,
+            headers=headers,
+        )
+
+    def get_cached(self, endpoint, params=None):
+        """GET ``endpoint`` through the response cache.
+
+        A fresh cached response is returned without a request. Otherwise the
+        request carries the validators of the cached response, if any, and
+        a ``304`` answer renews and returns the cached one. Only ``200``
+        responses are stored, for the TTL ``cache_ttls`` gives the endpoint's
+        template.
+        """
+        key = cache_key(endpoint, params)
+        cached, headers = self.cache.lookup(key)
+        if cached is not None:
+            return cached
+        response = self._request(
+            "GET",
+            endpoint,
+            params=params if params is not None else {},
+            headers=headers,
+        )
+        return self.cache.update(key, response, self.cache_ttl(endpoint))
+
     def get_cache(self, key):
-        if key in self._cache and self._cache[key]["expires"] > time.time():
-            return self._cache[key]["obj"]
-        return None
+        return self.cache.get(key)
 
     def set_cache(self, key, obj):
-        self._cache[key] = {"obj": obj, "expires": time.time() + self._cache_limit}
+        self.cache.set(key, obj, self._cache_limit)
 
     def clean_cache(self, key=None):
         if key is not None:
-            self._cache.pop(key)
+            self.cache.pop(key)
         else:
-            for key in list(self._cache):
-                if self._cache[key]["expires"] <= time.time():
-                    self._cache.pop(key)
+            self.cache.clean()
 
     def get_domain(self):
         parsed_uri = urlparse(self.base_url)
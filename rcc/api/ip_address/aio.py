@@ -0,0 +1,13 @@
+from rcc.api.aio import AsyncBaseHttpClient
+from rcc.api.ip_address.client import IP_ADDRESS_TTL
+
+
+class AsyncPublicIPAddress(AsyncBaseHttpClient):
+    def __init__(self, base_url, ip_address_endpoint, **kwargs):
+        self.ip_address_endpoint = ip_address_endpoint
+        super().__init__(base_url=base_url, **kwargs)
+        self.cache_ttls.setdefault(self.ip_address_endpoint, IP_ADDRESS_TTL)
+
+    async def get_public_ip_address(self):
+        response = await self.get_cached(self.ip_address_endpoint)
+        return response.text
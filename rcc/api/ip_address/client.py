@@ -3,13 +3,18 @@ import socket
 from rcc.api.http import BaseHttpClient
 
 
+# Long enough to cover one run, short enough to notice a new address.
+IP_ADDRESS_TTL = 60
+
+
 class PublicIPAddress(BaseHttpClient):
     def __init__(self, base_url, ip_address_endpoint, **kwargs):
         self.ip_address_endpoint = ip_address_endpoint
         super().__init__(base_url=base_url, **kwargs)
+        self.cache_ttls.setdefault(self.ip_address_endpoint, IP_ADDRESS_TTL)
 
     def get_public_ip_address(self):
-        return self.get_data(self.ip_address_endpoint).text
+        return self.get_cached(self.ip_address_endpoint).text
 
     def dns_lookup(self, hostname=None, ip_address=None):
         assert bool(hostname) != bool(ip_address), "Must pass either a hostname or ip_address"
@@ -0,0 +1,304 @@
+"""Request metrics for the HTTP clients, by endpoint template.
+
+Every request a ``BaseHttpClient`` makes is recorded under its client class,
+method and endpoint template, such as ``/devices/{device_id}/backups``, so a
+run's numbers do not split by device or backup id. For each one the
+``Metrics`` registry counts requests, responses by status and errors by
+exception class, counts retries and hedged requests, adds up bytes sent and
+received, and keeps a latency histogram.
+
+Results can be read in-process with ``get`` and ``snapshot``, or written
+with ``write`` as JSON or in the Prometheus text format, e.g. for the
+node-exporter textfile collector.
+"""
+
+import bisect
+import json
+import threading
+from collections import Counter
+
+from rcc.file_manager import atomic_write
+
+# Seconds; suits anything from a device poll to a large backup transfer.
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+PROMETHEUS_PREFIX = "rcc_http"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # one count per bucket plus one for +Inf; not cumulative
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Return ``(upper bound, observations <= bound)`` pairs, up to infinity."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Estimate the ``q`` quantile.
+
+        As Prometheus' ``histogram_quantile`` does, the observations in the
+        bucket the quantile falls in are taken to be spread evenly over it.
+        A quantile beyond the last bucket is infinite.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, below = 0.0, 0
+        for bound, total in self.cumulative():
+            if total >= rank and total > below:
+                if bound == float("inf"):
+                    break
+                return lower + (bound - lower) * (rank - below) / (total - below)
+            lower, below = bound, total
+        return float("inf")
+
+
+class EndpointStats:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.requests = 0
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.retries = 0
+        self.hedges = 0
+        self.latency = Histogram(buckets)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "statuses": {
+                str(status): count for status, count in sorted(self.statuses.items())
+            },
+            "errors": dict(sorted(self.errors.items())),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "latency": {
+                "count": self.latency.count,
+                "sum": self.latency.sum,
+                "buckets": [[_bound(b), n] for b, n in self.latency.cumulative()],
+            },
+        }
+
+
+def _bound(value):
+    return "+Inf" if value == float("inf") else value
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return (
+        "{"
+        + ",".join(f'{name}="{_label(value)}"' for name, value in labels.items())
+        + "}"
+    )
+
+
+class Metrics:
+    """Thread-safe ``EndpointStats`` keyed by ``(client, method, endpoint)``."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get_or_add(self, key):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = EndpointStats(self.buckets)
+        return stats
+
+    def record(
+        self,
+        client,
+        method,
+        endpoint,
+        seconds,
+        status=None,
+        error=None,
+        bytes_in=0,
+        bytes_out=0,
+    ):
+        with self._lock:
+            stats = self._get_or_add((client, method, endpoint))
+            stats.requests += 1
+            if status is not None:
+                stats.statuses[status] += 1
+            if error is not None:
+                stats.errors[error] += 1
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            stats.latency.observe(seconds)
+
+    def record_retry(self, client, method, endpoint):
+        """Count a request to ``endpoint`` that is about to be retried."""
+        with self._lock:
+            self._get_or_add((client, method, endpoint)).retries += 1
+
+    def record_hedge(self, client, method, endpoint):
+        """Count a request to ``endpoint`` that is about to be sent a second time."""
+        with self._lock:
+            self._get_or_add((client, method, endpoint)).hedges += 1
+
+    def get(self, method, endpoint, client=None):
+        """Return the stats for ``endpoint``, summed over clients unless ``client``."""
+        with self._lock:
+            matching = [
+                stats
+                for (c, m, e), stats in self._stats.items()
+                if m == method and e == endpoint and client in (None, c)
+            ]
+        if len(matching) == 1:
+            return matching[0]
+        total = EndpointStats(self.buckets)
+        for stats in matching:
+            total.requests += stats.requests
+            total.statuses.update(stats.statuses)
+            total.errors.update(stats.errors)
+            total.bytes_in += stats.bytes_in
+            total.bytes_out += stats.bytes_out
+            total.retries += stats.retries
+            total.hedges += stats.hedges
+            total.latency.counts = [
+                a + b for a, b in zip(total.latency.counts, stats.latency.counts)
+            ]
+            total.latency.sum += stats.latency.sum
+            total.latency.count += stats.latency.count
+        return total
+
+    def snapshot(self):
+        """Return every endpoint's stats as plain dicts."""
+        with self._lock:
+            return [
+                {
+                    "client": client,
+                    "method": method,
+                    "endpoint": endpoint,
+                    **stats.as_dict(),
+                }
+                for (client, method, endpoint), stats in sorted(self._stats.items())
+            ]
+
+    def to_json(self):
+        return json.dumps({"endpoints": self.snapshot()}, indent=2)
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{prefix}_{name}{suffix}{_labels(**labels)} {value}")
+
+        with self._lock:
+            items = sorted(self._stats.items())
+        base = [
+            (dict(client=c, method=m, endpoint=e), stats) for (c, m, e), stats in items
+        ]
+        metric(
+            "requests_total",
+            "counter",
+            "Requests made, by endpoint template.",
+            [("", labels, s.requests) for labels, s in base],
+        )
+        metric(
+            "responses_total",
+            "counter",
+            "Responses received, by status code.",
+            [
+                ("", dict(labels, status=status), n)
+                for labels, s in base
+                for status, n in sorted(s.statuses.items())
+            ],
+        )
+        metric(
+            "errors_total",
+            "counter",
+            "Requests that raised, by exception class.",
+            [
+                ("", dict(labels, error=error), n)
+                for labels, s in base
+                for error, n in sorted(s.errors.items())
+            ],
+        )
+        metric(
+            "received_bytes_total",
+            "counter",
+            "Response body bytes received.",
+            [("", labels, s.bytes_in) for labels, s in base],
+        )
+        metric(
+            "sent_bytes_total",
+            "counter",
+            "Request body bytes sent.",
+            [("", labels, s.bytes_out) for labels, s in base],
+        )
+        metric(
+            "retries_total",
+            "counter",
+            "Requests retried after an error or a retryable status.",
+            [("", labels, s.retries) for labels, s in base],
+        )
+        metric(
+            "hedged_requests_total",
+            "counter",
+            "Requests sent a second time for being slower than usual.",
+            [("", labels, s.hedges) for labels, s in base],
+        )
+        samples = []
+        for labels, s in base:
+            for bound, total in s.latency.cumulative():
+                samples.append(("_bucket", dict(labels, le=_bound(bound)), total))
+            samples.append(("_sum", labels, s.latency.sum))
+            samples.append(("_count", labels, s.latency.count))
+        metric(
+            "request_duration_seconds",
+            "histogram",
+            "Request latency, including the body transfer.",
+            samples,
+        )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to ``path``: JSON for ``.json``, else Prometheus text.
+
+        The file is replaced atomically, as the textfile collector expects.
+        """
+        data = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with atomic_write(path, "w", permissions=0o644) as f:
+            f.write(data)
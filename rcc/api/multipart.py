@@ -0,0 +1,113 @@
+"""Streaming ``multipart/form-data`` bodies for uploads.
+
+``requests`` builds a multipart body from ``files=`` in memory, so uploading
+a backup holds the whole archive, plus a copy, until the request is sent.
+``MultipartEncoder`` produces the same bytes on demand from ``read`` calls
+instead, reading each file in chunks as the body is sent.
+"""
+
+import io
+import os
+import binascii
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _to_bytes(value):
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+def _stream_size(f):
+    """Bytes left in ``f`` from its current position, or ``None`` if unknown."""
+    try:
+        return os.fstat(f.fileno()).st_size - f.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+    try:
+        pos = f.tell()
+        end = f.seek(0, io.SEEK_END)
+        f.seek(pos)
+        return end - pos
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+class MultipartEncoder:
+    """A file-like multipart body that ``requests`` can stream.
+
+    ``fields`` maps names to plain values (str or bytes) or to file tuples
+    ``(filename, data)`` or ``(filename, data, content_type)``, as with the
+    ``files`` argument of ``requests``. File data may be bytes or a binary
+    stream. ``len`` is the body size when every stream's size can be found,
+    otherwise ``None`` and the body is sent with chunked encoding.
+    """
+
+    def __init__(self, fields, boundary=None, chunk_size=CHUNK_SIZE):
+        self.boundary = boundary or binascii.hexlify(os.urandom(16)).decode("ascii")
+        self.chunk_size = chunk_size
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self._parts = []
+        for name, value in fields.items():
+            if isinstance(value, tuple):
+                filename, data = value[0], value[1]
+                content_type = value[2] if len(value) > 2 else None
+                header = (
+                    f'Content-Disposition: form-data; name="{name}"; '
+                    f'filename="{filename}"\r\n'
+                )
+                if content_type:
+                    header += f"Content-Type: {content_type}\r\n"
+            else:
+                data = value
+                header = f'Content-Disposition: form-data; name="{name}"\r\n'
+            data = _to_bytes(data)
+            if isinstance(data, (bytes, bytearray)):
+                data = io.BytesIO(data)
+            self._parts.append(
+                (f"--{self.boundary}\r\n{header}\r\n".encode("utf-8"), data, b"\r\n")
+            )
+        self._end = f"--{self.boundary}--\r\n".encode("utf-8")
+        self.len = self._length()
+        self._chunks = self._iter_chunks()
+        self._buffer = b""
+
+    def _length(self):
+        total = len(self._end)
+        for head, data, tail in self._parts:
+            size = _stream_size(data)
+            if size is None:
+                return None
+            total += len(head) + size + len(tail)
+        return total
+
+    def _iter_chunks(self):
+        for head, data, tail in self._parts:
+            yield head
+            while True:
+                chunk = data.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            yield tail
+        yield self._end
+
+    def read(self, size=-1):
+        """Return up to ``size`` bytes of the body, or the rest if ``size`` < 0."""
+        buffer = self._buffer
+        while size < 0 or len(buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            buffer += chunk
+        if size < 0:
+            self._buffer = b""
+            return buffer
+        self._buffer = buffer[size:]
+        return buffer[:size]
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,157 @@
+"""Retries and hedged requests for the HTTP clients.
+
+A ``RetryPolicy`` given to a ``BaseHttpClient`` repeats a request that
+failed with a connection error or timeout, or was answered with one of
+``statuses`` (5xx and 429 by default). Only idempotent methods are retried,
+and only when the request body can be sent again. Retry ``n`` waits a
+random time up to ``backoff * 2**n`` seconds, capped at ``max_backoff``
+("full jitter", so that clients retrying together spread out), or as long
+as a ``Retry-After`` header asks if that is longer. A retry whose wait
+would end more than ``deadline`` seconds after the first attempt began is
+not made; the last response or error is then returned or raised. Neither
+is one that would outlast a pending ``SIGALRM``, such as the one
+``rcc.utils.signal_timeout`` sets for a polling loop, and the
+``TimeoutError`` it raises is passed on as it is.
+
+With ``hedge`` enabled a GET that has not been answered after the
+endpoint's ``hedge_quantile`` latency, as recorded in the client's
+metrics, is sent a second time and the first answer used. This trims the
+tail that a slow controller adds to a run, at the cost of a few extra
+requests. Hedging waits for ``hedge_min_samples`` requests to the
+endpoint, so that the latency estimate means something.
+"""
+
+import email.utils
+import random
+import signal
+import time
+
+from rcc.api.download import RETRYABLE
+
+DEFAULT_ATTEMPTS = 4
+DEFAULT_BACKOFF = 0.5  # seconds
+DEFAULT_MAX_BACKOFF = 30.0  # seconds
+DEFAULT_DEADLINE = 120.0  # seconds
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Raised to interrupt a request from outside, e.g. by ``signal_timeout``'s
+# SIGALRM handler; never retried or wrapped.
+INTERRUPTS = (TimeoutError, InterruptedError)
+
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+
+
+def retry_after(response, now=None):
+    """Return the seconds the ``Retry-After`` header asks to wait, or ``None``."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, when.timestamp() - now)
+
+
+def alarm_time_left():
+    """Return the seconds until a pending ``SIGALRM``, or ``None`` if none is."""
+    if not hasattr(signal, "getitimer"):
+        return None
+    return signal.getitimer(signal.ITIMER_REAL)[0] or None
+
+
+def replayable(kwargs):
+    """Whether a request made with ``kwargs`` can be sent again unchanged.
+
+    Streams and multipart encoders are consumed by the first attempt.
+    """
+    data = kwargs.get("data")
+    return kwargs.get("files") is None and (
+        data is None or isinstance(data, (bytes, str, dict, list, tuple))
+    )
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        attempts=DEFAULT_ATTEMPTS,
+        backoff=DEFAULT_BACKOFF,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        deadline=DEFAULT_DEADLINE,
+        statuses=RETRY_STATUSES,
+        methods=IDEMPOTENT_METHODS,
+        hedge=False,
+        hedge_quantile=HEDGE_QUANTILE,
+        hedge_min_samples=HEDGE_MIN_SAMPLES,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        rng=None,
+        time_left=alarm_time_left,
+    ):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(m.upper() for m in methods)
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.clock = clock
+        self.sleep = sleep
+        self.time_left = time_left
+        self.rng = rng or random.Random()
+
+    def __repr__(self):
+        return (
+            f"RetryPolicy(attempts={self.attempts}, backoff={self.backoff}, "
+            f"deadline={self.deadline}, hedge={self.hedge})"
+        )
+
+    def should_retry(self, method, response=None, error=None):
+        if method.upper() not in self.methods:
+            return False
+        if error is not None:
+            return isinstance(error, RETRYABLE)
+        return response is not None and response.status_code in self.statuses
+
+    def backoff_delay(self, retry):
+        """Return a random wait before retry number ``retry``, counting from 0."""
+        return self.rng.uniform(0, min(self.max_backoff, self.backoff * 2**retry))
+
+    def next_delay(self, method, retry, started, response=None, error=None):
+        """Return the seconds to wait before retry ``retry``, or ``None`` to stop.
+
+        ``started`` is the ``clock()`` time of the first attempt. A retry
+        must also begin before ``time_left()`` runs out, if it returns a time.
+        """
+        if retry + 1 >= self.attempts or not self.should_retry(method, response, error):
+            return None
+        delay = self.backoff_delay(retry)
+        if response is not None:
+            delay = max(delay, retry_after(response) or 0.0)
+        if self.clock() - started + delay > self.deadline:
+            return None
+        left = self.time_left()
+        if left is not None and delay >= left:
+            return None
+        return delay
+
+    def hedge_delay(self, method, stats):
+        """Return the seconds after which to hedge a request, or ``None`` not to.
+
+        ``stats`` is the endpoint's ``EndpointStats``.
+        """
+        if not self.hedge or method.upper() != "GET":
+            return None
+        if stats is None or stats.latency.count < self.hedge_min_samples:
+            return None
+        delay = stats.latency.quantile(self.hedge_quantile)
+        return None if delay == float("inf") else delay
@@ -0,0 +1,191 @@
+import asyncio
+import datetime
+import logging
+import os
+import time
+
+from rcc.api.aio import AsyncBaseHttpClient, aiohttp
+from rcc.api.http import STREAM_CHUNK_SIZE, log_response
+from rcc.api.unms.client import (
+    DEFAULT_ENDPOINTS,
+    DEFAULT_SESSION_TIMEOUT,
+    DEFAULT_TOKEN_HEADER,
+    DEVICE_CACHE_TTL,
+    token_expire_time,
+)
+from rcc.exceptions import UNMSHTTPException
+from rcc.file_manager import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncUNMSClient(AsyncBaseHttpClient):
+    """``UNMSClient`` for asyncio; the methods are the same, as coroutines.
+
+    All requests share one token: the first one to find it missing or
+    expired logs in while the others wait for it.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        username,
+        password,
+        session_timeout=None,
+        token_header=None,
+        **kwargs,
+    ):
+        endpoints = {
+            name: kwargs.pop(name, None) or default
+            for name, default in DEFAULT_ENDPOINTS.items()
+        }
+        vars(self).update(endpoints)
+        self.token_header = token_header or DEFAULT_TOKEN_HEADER
+        self.session_timeout = session_timeout or DEFAULT_SESSION_TIMEOUT
+
+        self.token = self.expire_time = None
+        self._token_lock = None
+
+        super().__init__(
+            base_url=base_url, username=username, password=password, **kwargs
+        )
+        self.cache_ttls.setdefault(self.get_device_endpoint, DEVICE_CACHE_TTL)
+
+    def _auth(self):
+        return None
+
+    async def auth_headers(self):
+        if not (self.username and self.password):
+            return {}
+        await self.check_token()
+        return {self.token_header: self.token}
+
+    def token_expired(self):
+        if self.expire_time is None or self.expire_time < datetime.datetime.now():
+            return True
+        return False
+
+    async def check_token(self):
+        if not self.token_expired():
+            return
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if self.token_expired():
+                await self.set_token()
+
+    async def set_token(self):
+        self.token, self.expire_time = await self.get_token()
+
+    async def get_token(self):
+        token_url = f"{self.base_url}/{self.login_endpoint.lstrip('/')}"
+        start = time.perf_counter()
+        try:
+            async with self.session.post(
+                token_url,
+                data={
+                    "password": self.password,
+                    "username": self.username,
+                    "sessionTimeout": str(self.session_timeout),
+                },
+            ) as resp:
+                response = await self._read(resp, token_url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            self.record("POST", self.login_endpoint, start, error=exc)
+            raise UNMSHTTPException from exc
+        self.record("POST", self.login_endpoint, start, response)
+        log_response(response, token_url, log=logger)
+        if response.status_code != 200:
+            raise UNMSHTTPException("Received non-okay response while getting token")
+        try:
+            token = response.headers[self.token_header]
+        except KeyError as exc:
+            logger.exception("Error while getting authentication token")
+            raise UNMSHTTPException from exc
+        return token, token_expire_time(self.session_timeout)
+
+    async def create_backup(self, device_id):
+        endpoint = self.create_backup_endpoint.format(device_id=device_id)
+        response = await self.post_data(endpoint)
+        response_body = response.json()
+        return response_body["id"]
+
+    async def delete_backup(self, device_id, backup_id):
+        endpoint = self.delete_backup_endpoint.format(
+            device_id=device_id, backup_id=backup_id
+        )
+        response = await self.delete_data(endpoint)
+        return response.json()["result"]
+
+    async def get_backup(
+        self,
+        device_id,
+        backup_id,
+        filepath=None,
+        replace_umns_key=False,
+        consumer=None,
+        chunk_size=STREAM_CHUNK_SIZE,
+    ):
+        """Download a backup in chunks.
+
+        With ``filepath`` the archive is written there, replacing the file
+        only once it is complete, and the path returned. With ``consumer``,
+        a function or coroutine function, each chunk is passed to it.
+        Otherwise the archive is returned as bytes.
+        """
+        endpoint = self.get_backup_endpoint.format(
+            device_id=device_id, backup_id=backup_id
+        )
+        params = {"replaceUnmsKey": str(replace_umns_key).lower()}
+        if filepath:
+            with atomic_write(filepath) as f:
+                await self.get_stream(
+                    endpoint, f.write, params=params, chunk_size=chunk_size
+                )
+            return filepath
+        if consumer is not None:
+            await self.get_stream(
+                endpoint, consumer, params=params, chunk_size=chunk_size
+            )
+            return None
+        chunks = []
+        await self.get_stream(
+            endpoint, chunks.append, params=params, chunk_size=chunk_size
+        )
+        return b"".join(chunks)
+
+    async def upload_backup(self, device_id, backup, filename=None):
+        """Upload ``backup`` as ``UNMSClient.upload_backup`` does."""
+        endpoint = self.upload_backup_endpoint.format(device_id=device_id)
+        if isinstance(backup, (str, os.PathLike)):
+            with open(backup, "rb") as f:
+                response = await self._put_backup(
+                    endpoint, filename or os.path.basename(backup), f
+                )
+        else:
+            response = await self._put_backup(
+                endpoint, filename or "backup.tar.gz", backup
+            )
+        return response.json()["id"]
+
+    async def _put_backup(self, endpoint, filename, data):
+        body = aiohttp.FormData()
+        body.add_field("file", data, filename=filename)
+        return await self.put_data(endpoint, data=body)
+
+    async def apply_backup(self, device_id, backup_id):
+        endpoint = self.apply_backup_endpoint.format(
+            device_id=device_id, backup_id=backup_id
+        )
+        response = await self.post_data(endpoint)
+        return response.json()
+
+    async def reboot_device(self, device_id):
+        endpoint = self.reboot_device_endpoint.format(device_id=device_id)
+        response = await self.post_data(endpoint)
+        return response.json()
+
+    async def get_device(self, device_id):
+        endpoint = self.get_device_endpoint.format(device_id=device_id)
+        response = await self.get_cached(endpoint)
+        return response
@@ -1,14 +1,38 @@
 import os
+import time
 import logging
 import requests
 import datetime
 
-from rcc.api.http import BaseHttpClient
+from rcc.api.http import STREAM_CHUNK_SIZE, BaseHttpClient, log_response
+from rcc.api.multipart import MultipartEncoder
 from rcc.api.unms import auth
 from rcc.exceptions import UNMSHTTPException
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_ENDPOINTS = {
+    "login_endpoint": "/user/login",
+    "users_endpoint": "/users",
+    "get_device_endpoint": "/devices/{device_id}",
+    "create_backup_endpoint": "/devices/{device_id}/backups",
+    "upload_backup_endpoint": "/devices/{device_id}/backups",
+    "delete_backup_endpoint": "/devices/{device_id}/backups/{backup_id}",
+    "get_backup_endpoint": "/devices/{device_id}/backups/{backup_id}",
+    "apply_backup_endpoint": "/devices/{device_id}/backups/{backup_id}/apply",
+    "reboot_device_endpoint": "/devices/{device_id}/restart",
+}
+DEFAULT_TOKEN_HEADER = "x-auth-token"
+DEFAULT_SESSION_TIMEOUT = 3_600_000  # milliseconds
+# Device state is polled, so always ask, but let UNMS answer 304.
+DEVICE_CACHE_TTL = 0
+
+
+def token_expire_time(session_timeout):
+    """When to renew a token from a login with ``session_timeout`` milliseconds."""
+    session_timeout_sec = session_timeout / 1000 / 60
+    return datetime.datetime.now() + datetime.timedelta(seconds=session_timeout_sec / 2)
+
 
 class UNMSClient(BaseHttpClient):
     def __init__(
@@ -30,40 +54,45 @@ class UNMSClient(BaseHttpClient):
         **kwargs,
     ):
 
-        self.login_endpoint = login_endpoint or "/user/login"
-        self.users_endpoint = users_endpoint or "/users"
-        self.get_device_endpoint = get_device_endpoint or "/devices/{device_id}"
+        self.login_endpoint = login_endpoint or DEFAULT_ENDPOINTS["login_endpoint"]
+        self.users_endpoint = users_endpoint or DEFAULT_ENDPOINTS["users_endpoint"]
+        self.get_device_endpoint = (
+            get_device_endpoint or DEFAULT_ENDPOINTS["get_device_endpoint"]
+        )
         self.create_backup_endpoint = (
-            create_backup_endpoint or "/devices/{device_id}/backups"
+            create_backup_endpoint or DEFAULT_ENDPOINTS["create_backup_endpoint"]
         )
         self.upload_backup_endpoint = (
-            upload_backup_endpoint or "/devices/{device_id}/backups"
+            upload_backup_endpoint or DEFAULT_ENDPOINTS["upload_backup_endpoint"]
         )
         self.delete_backup_endpoint = (
-            delete_backup_endpoint or "/devices/{device_id}/backups/{backup_id}"
+            delete_backup_endpoint or DEFAULT_ENDPOINTS["delete_backup_endpoint"]
         )
         self.get_backup_endpoint = (
-            get_backup_endpoint or "/devices/{device_id}/backups/{backup_id}"
+            get_backup_endpoint or DEFAULT_ENDPOINTS["get_backup_endpoint"]
         )
         self.apply_backup_endpoint = (
-            apply_backup_endpoint or "/devices/{device_id}/backups/{backup_id}/apply"
+            apply_backup_endpoint or DEFAULT_ENDPOINTS["apply_backup_endpoint"]
+        )
+        self.reboot_device_endpoint = (
+            reboot_device_endpoint or DEFAULT_ENDPOINTS["reboot_device_endpoint"]
         )
-        self.reboot_device_endpoint = reboot_device_endpoint or "/devices/{device_id}/restart"
-        self.token_header = token_header or "x-auth-token"
-        self.session_timeout = session_timeout or 3_600_000
+        self.token_header = token_header or DEFAULT_TOKEN_HEADER
+        self.session_timeout = session_timeout or DEFAULT_SESSION_TIMEOUT
 
         self.token = self.expire_time = None
 
         super().__init__(
             base_url=base_url, username=username, password=password, **kwargs
         )
+        self.cache_ttls.setdefault(self.get_device_endpoint, DEVICE_CACHE_TTL)
 
     def get_session(self, use_auth=True):
         """Configure a requests session to use."""
         assert self.base_url is not None
         s = self.requests.Session()
         s.trust_env = False
-        s.mount(self.base_url, self._get_adapter())
+        s.mount(self.base_url, self.adapter)
         if use_auth:
             s.auth = self.get_auth()
         return s
@@ -77,22 +106,23 @@ class UNMSClient(BaseHttpClient):
     def get_token(self):
         token_url = f"{self.base_url}/{self.login_endpoint.lstrip('/')}"
         try:
-            sess = self.get_session(use_auth=False)
-            response = self.get_auth_token(sess, token_url)
-            logger.debug(
-                f"Response[{response.status_code}] for {token_url}:\nHeaders:{response.headers}\nContent:\n{response.text}"
+            sess = self.thread_session(
+                "login_session", lambda: self.get_session(use_auth=False)
             )
+            start = time.perf_counter()
+            try:
+                response = self.get_auth_token(sess, token_url)
+            except Exception as exc:
+                self.record("POST", self.login_endpoint, start, error=exc)
+                raise
+            self.record("POST", self.login_endpoint, start, response)
+            log_response(response, token_url, log=logger)
             if response.status_code != 200:
                 raise UNMSHTTPException(
                     "Received non-okay response while getting token"
                 )
             token = response.headers[self.token_header]
-            sess.close()
-            session_timeout_sec = self.session_timeout / 1000 / 60
-            expire_time = datetime.datetime.now() + datetime.timedelta(
-                seconds=session_timeout_sec / 2
-            )
-            return token, expire_time
+            return token, token_expire_time(self.session_timeout)
 
         except requests.exceptions.ConnectionError as exc:
             raise UNMSHTTPException from exc
@@ -136,25 +166,61 @@ class UNMSClient(BaseHttpClient):
         response = self.delete_data(endpoint)
         return response.json()["result"]
 
-    def get_backup(self, device_id, backup_id, filepath=None, replace_umns_key=False):
+    def get_backup(
+        self,
+        device_id,
+        backup_id,
+        filepath=None,
+        replace_umns_key=False,
+        consumer=None,
+        chunk_size=STREAM_CHUNK_SIZE,
+        parts=1,
+    ):
+        """Download a backup in chunks.
+
+        With ``filepath`` the archive is written there and the path returned;
+        the download resumes after a dropped connection, and ``parts`` above
+        one fetches a large backup as that many parallel ranges. With
+        ``consumer`` each chunk is passed to it. Otherwise the archive is
+        returned as bytes.
+        """
         endpoint = self.get_backup_endpoint.format(
             device_id=device_id, backup_id=backup_id
         )
-        response = self.get_data(
-            endpoint, params={"replaceUnmsKey": str(replace_umns_key).lower()}
-        )
+        params = {"replaceUnmsKey": str(replace_umns_key).lower()}
         if filepath:
-            with open(filepath, "wb") as f:
-                f.write(response.content)
-            return filepath
-        return response.content
-
-    def upload_backup(self, device_id, filepath):
+            return self.download_file(
+                endpoint, filepath, params=params, chunk_size=chunk_size, parts=parts
+            )
+        if consumer is not None:
+            self.get_stream(endpoint, consumer, params=params, chunk_size=chunk_size)
+            return None
+        chunks = []
+        self.get_stream(endpoint, chunks.append, params=params, chunk_size=chunk_size)
+        return b"".join(chunks)
+
+    def upload_backup(self, device_id, backup, filename=None):
+        """Upload ``backup``: a file path, the archive as bytes, or a binary stream.
+
+        The multipart body is streamed, so a file or stream is read in chunks
+        as it is sent. A file opened from a path is closed before returning.
+        """
         endpoint = self.upload_backup_endpoint.format(device_id=device_id)
-        files = {"file": (os.path.basename(filepath), open(filepath, "rb"))}
-        response = self.put_data(endpoint, files=files)
+        if isinstance(backup, (str, os.PathLike)):
+            with open(backup, "rb") as f:
+                response = self._put_backup(
+                    endpoint, filename or os.path.basename(backup), f
+                )
+        else:
+            response = self._put_backup(endpoint, filename or "backup.tar.gz", backup)
         return response.json()["id"]
 
+    def _put_backup(self, endpoint, filename, data):
+        body = MultipartEncoder({"file": (filename, data)})
+        return self.put_data(
+            endpoint, data=body, headers={"Content-Type": body.content_type}
+        )
+
     def apply_backup(self, device_id, backup_id):
         endpoint = self.apply_backup_endpoint.format(
             device_id=device_id, backup_id=backup_id
@@ -169,7 +235,7 @@ class UNMSClient(BaseHttpClient):
 
     def get_device(self, device_id):
         endpoint = self.get_device_endpoint.format(device_id=device_id)
-        response = self.get_data(endpoint)
+        response = self.get_cached(endpoint)
         return response
 
 
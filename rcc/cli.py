@@ -3,43 +3,138 @@
 """Console script for rcc."""
 import os
 import sys
+import json
 import time
+import tempfile
 import click
 import logging
+from datetime import datetime, timezone
 
 from rcc.settings.logging_settings import configure_logger
 from rcc.api.unms.client import UNMSClient
 from rcc.api.ip_address.client import PublicIPAddress
-from rcc.file_manager import FileManager
+from rcc.api.metrics import Metrics
+from rcc.api.retry import DEFAULT_ATTEMPTS, DEFAULT_DEADLINE, RetryPolicy
+from rcc.file_manager import read_member, replace_member
 from rcc.parsers.boot import BootParser
+from rcc.parsers.bulk import DEFAULT_MEMBER, parse_many
+from rcc.store import BackupStore, Retention
 from rcc.utils import do_until, check_dns, check_unms
 
 
 logger = logging.getLogger(__name__)
 
 
-@click.command()
+@click.group(invoke_without_command=True)
 @click.option("--device-id", envvar="RCC_DEVICE_ID")
 @click.option("-w", "--dns-timeout", default=300, show_default="300s (5 minutes)")
 @click.option("-u", "--unms-timeout", default=60, show_default="60s (1 minute)")
 @click.option(
     "-v", "--verbose", count=True, help="Increase logging by adding more v's."
 )
-def main(device_id, dns_timeout, unms_timeout, verbose):
+@click.option(
+    "--store",
+    "store_dir",
+    envvar="RCC_BACKUP_STORE",
+    type=click.Path(file_okay=False),
+    help="Keep every downloaded and uploaded backup in this backup store.",
+)
+@click.option(
+    "--backup-dir",
+    envvar="RCC_UNMS_BACKUP_DIR",
+    type=click.Path(file_okay=False),
+    default=os.path.join(tempfile.gettempdir(), "rcc"),
+    show_default=True,
+    help="Directory to download and rewrite the backup in. A download that "
+    "breaks off is resumed from here by the next run.",
+)
+@click.option(
+    "--backup-file",
+    envvar="RCC_UNMS_BACKUP_FILEPATH",
+    type=click.Path(dir_okay=False),
+    help="Download the backup to this file instead of into --backup-dir.",
+)
+@click.option(
+    "--gzip-threads",
+    envvar="RCC_GZIP_THREADS",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Threads to recompress the backup with; 0 for one per CPU.",
+)
+@click.option(
+    "--metrics-file",
+    envvar="RCC_METRICS_FILE",
+    type=click.Path(dir_okay=False),
+    help="Write request metrics here on exit: JSON for *.json, else Prometheus text.",
+)
+@click.option(
+    "--retries",
+    envvar="RCC_RETRIES",
+    type=click.IntRange(min=0),
+    default=DEFAULT_ATTEMPTS - 1,
+    show_default=True,
+    help="Retries of an idempotent request after a connection error, 5xx or 429.",
+)
+@click.option(
+    "--retry-deadline",
+    envvar="RCC_RETRY_DEADLINE",
+    type=float,
+    default=DEFAULT_DEADLINE,
+    show_default="120s (2 minutes)",
+    help="Seconds after a request's first attempt to stop retrying it.",
+)
+@click.option(
+    "--hedge/--no-hedge",
+    envvar="RCC_HEDGE",
+    default=False,
+    show_default=True,
+    help="Send a GET again when it is slower than the endpoint's 95th percentile.",
+)
+@click.pass_context
+def main(
+    ctx,
+    device_id,
+    dns_timeout,
+    unms_timeout,
+    verbose,
+    store_dir,
+    backup_dir,
+    backup_file,
+    gzip_threads,
+    metrics_file,
+    retries,
+    retry_deadline,
+    hedge,
+):
     """Console script for rcc."""
 
     configure_logger(verbose)
+    ctx.obj = {"store_dir": store_dir}
+    if ctx.invoked_subcommand is not None:
+        return 0
+    store = BackupStore(store_dir) if store_dir else None
 
     # Login to UNMS
+    metrics = Metrics()
+    if metrics_file:
+        ctx.call_on_close(lambda: metrics.write(metrics_file))
+    retry = RetryPolicy(attempts=retries + 1, deadline=retry_deadline, hedge=hedge)
     client = UNMSClient(
         base_url=os.environ["RCC_UNMS_BASE_URL"],
         username=os.environ["RCC_UNMS_USER"],
         password=os.environ["RCC_UNMS_PASSWORD"],
+        metrics=metrics,
+        retry=retry,
     )
     ip_client = PublicIPAddress(
         base_url=os.environ["RCC_IP_BASE_URL"],
         ip_address_endpoint=os.environ["RCC_IP_ENDPOINT"],
+        metrics=metrics,
+        retry=retry,
     )
+    ctx.call_on_close(client.close)
+    ctx.call_on_close(ip_client.close)
 
     public_ip_address = ip_client.get_public_ip_address()
 
@@ -69,38 +164,58 @@ def main(device_id, dns_timeout, unms_timeout, verbose):
     backup_id = client.create_backup(device_id)
     logger.info(f"Created new backup {backup_id}")
 
-    # Download and unarchive new backup, delete remote backup
-    filepath = os.environ["RCC_UNMS_BACKUP_FILEPATH"]
-    target_dir = os.environ["RCC_UNMS_BACKUP_DIR"]
-    client.get_backup(device_id, backup_id, filepath)
-    logger.info(f"Downloaded backup to {filepath}")
+    # Download new backup, resuming if the connection drops, then delete the
+    # remote backup. The files stay until the changed backup is uploaded, so
+    # a failed run can be picked up where it stopped.
+    backup_path = backup_file or os.path.join(backup_dir, "backup.tar.gz")
+    workdir = os.path.dirname(os.path.abspath(backup_path))
+    os.makedirs(workdir, exist_ok=True)
+    changed_path = os.path.join(workdir, f"changed-{os.path.basename(backup_path)}")
+    backup_path = client.get_backup(device_id, backup_id, filepath=backup_path)
+    logger.info(
+        f"Downloaded backup {backup_id} ({os.path.getsize(backup_path)} bytes)"
+    )
+    if store:
+        stored_id = store.add(device_id, backup_path, label=f"downloaded {backup_id}")
+        logger.info(f"Stored backup as {stored_id}")
     client.delete_backup(device_id, backup_id)
     logger.info(f"Deleted remote backup {backup_id}")
-    file_manager = FileManager(filepath, target_dir)
-    file_manager.untar()
 
     logger.info(f"Current public IP address is {public_ip_address}")
 
     # Replace netflow IP with new IP address
-    config_dir = os.environ["RCC_UNMS_CONFIG_DIR"]
     config_rel_filepath = os.path.join(
-        config_dir, os.environ["RCC_UNMS_CONFIG_REL_FILE"]
+        os.environ["RCC_UNMS_CONFIG_DIR"], os.environ["RCC_UNMS_CONFIG_REL_FILE"]
     )
-    parser = BootParser(filepath=os.path.join(target_dir, config_rel_filepath))
+    with open(backup_path, "rb") as f:
+        parser = BootParser.from_data(read_member(f, config_rel_filepath))
     current_ip_address = parser.find_netflow_server()
     logger.info(f"Router is configured with Netflow IP address {current_ip_address}")
     if current_ip_address == public_ip_address:
         logger.info(f"IP addresses match, nothing to do")
+        os.remove(backup_path)
         return 0
     parser.set_netflow_server(public_ip_address)
-    parser.dump()
 
-    # Archive file again
-    file_manager.tar(filepath, config_dir)
+    # Rewrite the config member of the archive to a new file, copying
+    # everything else
+    with open(backup_path, "rb") as f, open(changed_path, "wb") as dest:
+        replace_member(
+            f,
+            config_rel_filepath,
+            parser.raw_data.encode("utf-8"),
+            dest=dest,
+            threads=gzip_threads or None,
+        )
 
-    # Upload to UNMS
-    backup_id = client.upload_backup(device_id, filepath)
+    # Upload to UNMS, streaming the file
+    backup_id = client.upload_backup(device_id, changed_path)
     logger.info(f"Uploaded changed backup as {backup_id}")
+    if store:
+        stored_id = store.add(device_id, changed_path, label=f"uploaded {backup_id}")
+        logger.info(f"Stored changed backup as {stored_id}")
+    os.remove(backup_path)
+    os.remove(changed_path)
 
     # Apply backup to router
     resp = client.apply_backup(device_id, backup_id)
@@ -119,5 +234,79 @@ def main(device_id, dns_timeout, unms_timeout, verbose):
     return 0
 
 
+@main.command()
+@click.argument("sources", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("-j", "--workers", type=int, help="Worker processes [default: CPU count]")
+@click.option("--chunksize", type=int, help="Sources handed to a worker at a time")
+@click.option(
+    "--member",
+    default=DEFAULT_MEMBER,
+    show_default=True,
+    help="Config file name in tar backups",
+)
+@click.option("--json", "as_json", is_flag=True, help="Print each tree as a JSON line")
+def parse(sources, workers, chunksize, member, as_json):
+    """Parse config files or tar.gz backups in parallel."""
+    failed = 0
+    start = time.perf_counter()
+    results = parse_many(sources, workers=workers, chunksize=chunksize, member=member)
+    for result in results:
+        if result.error:
+            failed += 1
+            logger.error(f"{result.source}: {result.error}")
+        elif as_json:
+            click.echo(json.dumps({"source": result.source, "tree": result.tree}))
+        else:
+            click.echo(f"{result.source}: {len(result.tree)} top-level sections")
+    elapsed = time.perf_counter() - start
+    parsed = len(sources) - failed
+    logger.info(f"Parsed {parsed}/{len(sources)} configs in {elapsed:.2f}s")
+    if failed:
+        sys.exit(1)
+
+
+@main.group("store")
+@click.pass_context
+def store_group(ctx):
+    """Inspect and prune the local backup store."""
+    ctx.obj = BackupStore(ctx.obj["store_dir"])
+
+
+@store_group.command("list")
+@click.argument("device_id", required=False)
+@click.pass_obj
+def store_list(store, device_id):
+    """List stored backups, oldest first."""
+    for m in store.manifests(device_id):
+        created = datetime.fromtimestamp(m["created"], timezone.utc)
+        created = created.isoformat(timespec="seconds")
+        click.echo(f"{m['device']} {m['id']} {created} {m['label'] or ''}".rstrip())
+
+
+@store_group.command("rebuild")
+@click.argument("device_id")
+@click.argument("backup_id")
+@click.argument("output", type=click.File("wb"))
+@click.pass_obj
+def store_rebuild(store, device_id, backup_id, output):
+    """Write a stored backup out as a tar.gz archive."""
+    store.rebuild(device_id, backup_id, dest=output)
+
+
+@store_group.command("prune")
+@click.argument("device_id", required=False)
+@click.option("--keep-last", default=Retention().keep_last, show_default=True)
+@click.option("--keep-daily", default=Retention().keep_daily, show_default=True)
+@click.option("--keep-weekly", default=Retention().keep_weekly, show_default=True)
+@click.option("--keep-monthly", default=Retention().keep_monthly, show_default=True)
+@click.pass_obj
+def store_prune(store, device_id, keep_last, keep_daily, keep_weekly, keep_monthly):
+    """Drop backups outside the retention policy and free unused objects."""
+    retention = Retention(keep_last, keep_daily, keep_weekly, keep_monthly)
+    removed = store.prune(retention, device_id)
+    count, freed = store.gc()
+    logger.info(f"Removed {len(removed)} backups and {count} objects ({freed} bytes)")
+
+
 if __name__ == "__main__":
     sys.exit(main())  # pragma: no cover
@@ -1,6 +1,124 @@
+import copy
+import gzip
+import io
 import os
 import shutil
 import tarfile
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# tarfile's own default
+DEFAULT_COMPRESSLEVEL = 9
+GZIP_BLOCK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def atomic_write(path, mode="wb", permissions=None):
+    """Open a temporary file that replaces ``path`` when the block exits.
+
+    The file is created next to ``path``, so the replace is atomic and
+    readers see the old contents or the new, never part of them. If the
+    block raises, the temporary file is removed and ``path`` is untouched.
+    ``permissions`` are set before the replace; otherwise the file keeps
+    ``mkstemp``'s, readable by the owner only.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        if permissions is not None:
+            os.chmod(tmp_path, permissions)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _compress_block(block, compresslevel=DEFAULT_COMPRESSLEVEL):
+    """Return ``block`` as one gzip member with a zero mtime, so the same data
+    always compresses to the same bytes."""
+    # gzip.compress only takes ``mtime`` from Python 3.8 on.
+    out = io.BytesIO()
+    with gzip.GzipFile(
+        fileobj=out, mode="wb", compresslevel=compresslevel, mtime=0
+    ) as gz:
+        gz.write(block)
+    return out.getvalue()
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """Write-only stream that gzips ``block_size`` blocks on a thread pool.
+
+    Each block becomes one gzip member and the members are written in order,
+    which is a valid gzip stream for ``gzip``, ``tar`` and ``tarfile``. zlib
+    releases the GIL while compressing, so blocks compress in parallel. The
+    output is a little larger than a single member's, since every block
+    starts without the previous one as its dictionary. Closing the writer
+    does not close ``fileobj``.
+    """
+
+    def __init__(
+        self,
+        fileobj,
+        compresslevel=DEFAULT_COMPRESSLEVEL,
+        block_size=GZIP_BLOCK_SIZE,
+        threads=None,
+    ):
+        self.fileobj = fileobj
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self.threads = threads or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.threads)
+        self._pending = deque()
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[: self.block_size]))
+            del self._buffer[: self.block_size]
+        return len(data)
+
+    def _submit(self, block):
+        # Bounds memory to a few blocks per thread however much is written.
+        while len(self._pending) >= self.threads * 2:
+            self.fileobj.write(self._pending.popleft().result())
+        self._pending.append(
+            self._executor.submit(_compress_block, block, self.compresslevel)
+        )
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer or not self._pending:
+                # An empty stream still needs one member to be valid gzip.
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self.fileobj.write(self._pending.popleft().result())
+        finally:
+            self._executor.shutdown()
+            super().close()
+
+
+def open_gzip_writer(
+    fileobj, compresslevel=DEFAULT_COMPRESSLEVEL, threads=1, block_size=GZIP_BLOCK_SIZE
+):
+    """Return a writable gzip stream over ``fileobj``, parallel if ``threads`` isn't 1.
+
+    ``threads=None`` uses one thread per CPU.
+    """
+    if threads == 1:
+        return gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=compresslevel)
+    return ParallelGzipWriter(fileobj, compresslevel, block_size, threads)
 
 
 class FileManager:
@@ -13,10 +131,29 @@ class FileManager:
         with tarfile.open(self.tar_filepath) as tar:
             tar.extractall(path=self.dest_dir)
 
-    def tar(self, filepath, rel_path):
+    def tar(
+        self,
+        filepath,
+        rel_path,
+        compresslevel=DEFAULT_COMPRESSLEVEL,
+        threads=1,
+        block_size=GZIP_BLOCK_SIZE,
+    ):
+        """Write ``rel_path`` under ``dest_dir`` to the tar.gz ``filepath``.
+
+        With ``threads`` other than 1 the archive is compressed in blocks on
+        that many threads (``None`` for one per CPU); see ``ParallelGzipWriter``.
+        """
         path = os.path.join(self.dest_dir, rel_path)
-        with tarfile.open(filepath, "w:gz") as tar:
-            tar.add(path, arcname=os.path.basename(path))
+        if threads == 1:
+            with tarfile.open(filepath, "w:gz", compresslevel=compresslevel) as tar:
+                tar.add(path, arcname=os.path.basename(path))
+        else:
+            with open(filepath, "wb") as f, ParallelGzipWriter(
+                f, compresslevel, block_size, threads
+            ) as gz:
+                with tarfile.open(fileobj=gz, mode="w|") as tar:
+                    tar.add(path, arcname=os.path.basename(path))
         self.remove(self.dest_dir)
 
     def remove(self, path):
@@ -25,3 +162,62 @@ class FileManager:
                 shutil.rmtree(path)
             else:
                 os.remove(path)
+
+
+def open_source(source):
+    """Open a tar archive from bytes or a binary stream, reading it once in order."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return tarfile.open(fileobj=source, mode="r|*")
+
+
+def _member_name(name):
+    return os.path.normpath(name).lstrip("/")
+
+
+def read_member(source, name):
+    """Return the contents of member ``name`` of the tar archive ``source``.
+
+    ``source`` is the archive as bytes or a binary stream, compressed or not.
+    """
+    name = _member_name(name)
+    with open_source(source) as tar:
+        for info in tar:
+            if info.isfile() and _member_name(info.name) == name:
+                return tar.extractfile(info).read()
+    raise KeyError(f"No member {name} in archive")
+
+
+def replace_member(
+    source,
+    name,
+    data,
+    dest=None,
+    compresslevel=DEFAULT_COMPRESSLEVEL,
+    threads=1,
+    block_size=GZIP_BLOCK_SIZE,
+):
+    """Copy the tar archive ``source`` with the contents of member ``name`` replaced.
+
+    Every other member is copied through unchanged, in order, without being
+    extracted. The result is gzip-compressed and returned as bytes, or
+    written to the binary stream ``dest`` if one is given. ``threads`` other
+    than 1 compresses it on a thread pool, as in ``FileManager.tar``.
+    """
+    name = _member_name(name)
+    out = io.BytesIO() if dest is None else dest
+    found = False
+    with open_source(source) as src, open_gzip_writer(
+        out, compresslevel, threads, block_size
+    ) as gz, tarfile.open(fileobj=gz, mode="w|") as tar:
+        for info in src:
+            if info.isfile() and _member_name(info.name) == name:
+                info = copy.copy(info)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+                found = True
+            else:
+                tar.addfile(info, src.extractfile(info) if info.isfile() else None)
+    if not found:
+        raise KeyError(f"No member {name} in archive")
+    return out.getvalue() if dest is None else dest
@@ -1,42 +1,424 @@
+import mmap
 import os
-import re
 import stat
+
+from rcc.file_manager import atomic_write
+from rcc.parsers.edit import INDENT, PatchSet, format_line, validate_value
+from rcc.parsers.index import ConfigIndex, compile_query, scan_spans, split_path
+from rcc.parsers.parallel import parse_conf_auto
+from rcc.parsers.stream import parse_indexed
 from rcc.parsers.temp_parser import parse_conf
+from rcc.parsers.tree import ConfigNode, parse_conf_compact
+
+# Size of the pieces copied when a mapped config is rewritten.
+COPY_CHUNK = 1024 * 1024
 
 
 class BootParser:
-    re_netflow_server = re.compile(
-        r"(system[\s*]\{[\n\t\r\s]*flow-accounting[\s*]\{[\n\t\r\s\w\W]*netflow[\s*]\{[\n\t\r\s\w\W]*server[\s*])(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})"
-    )
+    netflow_server_path = ("system", "flow-accounting", "netflow", "server")
+
+    def __init__(
+        self,
+        filepath,
+        compact=False,
+        lazy=True,
+        cache=None,
+        use_mmap=False,
+        workers=None,
+    ):
+        """Load the config at ``filepath``.
+
+        With ``lazy`` (the default) ``conf_obj`` is only parsed when it is first
+        accessed. Pass ``lazy=False`` to parse on load. Either way an edit only
+        drops ``conf_obj``, which is parsed again when next read. ``cache`` is an
+        optional ``ParseCache`` to reuse the parse of an unchanged config.
+        ``workers`` above one parses a config of at least
+        ``PARALLEL_MIN_BYTES`` in that many processes; by default, and for
+        smaller configs, it is parsed in this process.
+
+        With ``use_mmap`` the file is memory-mapped instead of read. The
+        netflow server is then found and changed in the mapped bytes, and
+        ``dump`` writes the change in place, or rewrites the file in one
+        streaming pass if the new value does not fit. Anything else that needs
+        the text (``raw_data``, ``conf_obj``, ``index`` and the edit methods)
+        reads it into memory and closes the map. Parsing on load would do that
+        straight away, so ``use_mmap`` needs ``lazy``.
+        """
+        if use_mmap and not lazy:
+            raise ValueError("use_mmap=True cannot be combined with lazy=False")
+        self._setup(filepath, compact, lazy, cache, workers)
+        if use_mmap:
+            self._map = self.map_file(self.filepath)
+        if self._map is None:
+            self.raw_data = self.load_file(self.filepath)
+            if not lazy:
+                self._conf_obj = self._parse()
 
-    def __init__(self, filepath):
+    def _setup(self, filepath, compact, lazy, cache, workers=None):
         self.filepath = filepath
-        self.raw_data = self.load_file(self.filepath)
-        self.conf_obj = self.parse_conf(self.raw_data)
+        self.compact = compact
+        self.lazy = lazy
+        self.cache = cache
+        self.workers = workers
+        self._conf_obj = None
+        self._index = None
+        self._patches = self._raw_data = None
+        self._map = None
+        # start -> (end, value) for netflow changes to the mapped file
+        self._map_edits = {}
+
+    @classmethod
+    def from_data(cls, data, compact=False, lazy=True, cache=None, workers=None):
+        """Create a parser for config text that is not in a file of its own,
+        such as a member read from a backup archive. ``data`` may be bytes.
+
+        ``dump`` then needs an explicit path.
+        """
+        parser = cls.__new__(cls)
+        parser._setup(None, compact, lazy, cache, workers)
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode("utf-8")
+        parser.raw_data = data
+        if not lazy:
+            parser._conf_obj = parser._parse()
+        return parser
+
+    @property
+    def raw_data(self):
+        """The config text, with pending ``set``/``add``/``delete`` edits applied."""
+        patches = self._loaded()
+        if self._raw_data is None:
+            self._raw_data = patches.apply()
+        return self._raw_data
+
+    @raw_data.setter
+    def raw_data(self, raw_data):
+        self._patches = PatchSet(raw_data)
+        self._raw_data = raw_data
+        self._conf_obj = self._index = None
+
+    @property
+    def conf_obj(self):
+        if self._conf_obj is None:
+            self._conf_obj = self._parse()
+        return self._conf_obj
+
+    @property
+    def index(self):
+        """``ConfigIndex`` of ``raw_data``, built on first access like ``conf_obj``.
+
+        Edits keep it up to date; line numbers refer to the text as loaded.
+        Until then it is built in the same pass as ``conf_obj``, whichever of
+        the two is read first.
+        """
+        if self._index is None:
+            if self._conf_obj is None and self._shares_pass():
+                self._conf_obj = self._parse()
+            else:
+                self._index = ConfigIndex.from_string(self._loaded().text)
+        return self._index
+
+    def query(self, pattern):
+        """Yield ``(path, IndexEntry)`` for every match of ``pattern``, e.g.
+        ``"firewall name * rule * action"``."""
+        return compile_query(pattern).match(self.index)
 
     def load_file(self, filepath):
         with open(filepath, "r") as c:
             return c.read()
 
+    def map_file(self, filepath):
+        """Return a read-only ``mmap`` of ``filepath``, or ``None`` if it is empty."""
+        with open(filepath, "rb") as c:
+            if os.fstat(c.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(c.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """Unmap the config file if it is mapped.
+
+        Netflow changes that were not dumped yet are kept in memory; without
+        any, the file is read again if the text is needed later.
+        """
+        if self._map is None:
+            return
+        if self._map_edits:
+            self._materialize()
+        else:
+            self._map.close()
+            self._map = None
+            self._patches = self._raw_data = None
+
+    def _loaded(self):
+        """Make sure the text is in memory and return its ``PatchSet``."""
+        if self._map is not None:
+            self._materialize()
+        elif self._patches is None:
+            self.raw_data = self.load_file(self.filepath)
+        return self._patches
+
+    def _materialize(self):
+        """Switch from the mapped file to an in-memory copy of its text."""
+        mapped, self._map = self._map, None
+        edits = sorted(
+            (start, end, value) for start, (end, value) in self._map_edits.items()
+        )
+        self._map_edits = {}
+        pieces = []
+        pos = 0
+        for start, end, value in edits:
+            pieces.append(mapped[pos:start])
+            pieces.append(value.encode("utf-8"))
+            pos = end
+        pieces.append(mapped[pos:])
+        mapped.close()
+        self.raw_data = b"".join(pieces).decode("utf-8")
+
+    def _shares_pass(self):
+        """Whether ``conf_obj`` and ``index`` can be built in one pass.
+
+        That needs the unedited text, which the index refers to, and a parse in
+        this process that the cache cannot answer instead.
+        """
+        return (
+            self._index is None
+            and self.cache is None
+            and not (self.workers and self.workers > 1)
+            and not len(self._loaded())
+            and bool(self._patches.text)
+        )
+
+    def _parse(self):
+        """Parse ``conf_obj``, building ``index`` in the same pass if it can."""
+        if not self._shares_pass():
+            return self.parse_conf(self.raw_data)
+        tree, self._index = parse_indexed(
+            self._patches.text.split("\n"), compact=self.compact
+        )
+        return tree
+
     def parse_conf(self, raw_data):
-        return parse_conf(raw_data)
+        if self.cache is not None:
+            tree = self.cache.get(raw_data)
+            if tree is not None:
+                return ConfigNode.from_dict(tree) if self.compact else tree
+        if self.compact:
+            tree = parse_conf_compact(raw_data)
+        elif self.workers and self.workers > 1:
+            tree = parse_conf_auto(raw_data, workers=self.workers)
+        else:
+            tree = parse_conf(raw_data)
+        if self.cache is not None:
+            self.cache.put(raw_data, tree.to_dict() if self.compact else tree)
+        return tree
+
+    def _netflow_server_span(self):
+        data = self._map if self._map is not None else self.raw_data
+        spans = scan_spans(data, self.netflow_server_path)
+        return spans[0] if spans else None
 
     def find_netflow_server(self):
-        res = re.search(self.re_netflow_server, self.raw_data)
-        if res:
-            return res.group(2)
-        return None
+        span = self._netflow_server_span()
+        if not span:
+            return None
+        start, end = span
+        if self._map is not None:
+            edit = self._map_edits.get(start)
+            if edit is not None:
+                return edit[1]
+            return self._map[start:end].decode("utf-8")
+        return self.raw_data[start:end]
 
     def set_netflow_server(self, ip_address):
-        if ip_address != self.find_netflow_server():
-            self.raw_data = re.sub(
-                self.re_netflow_server, r"\g<1>{}".format(ip_address), self.raw_data
+        validate_value(ip_address)
+        span = self._netflow_server_span()
+        if not span or ip_address == self.find_netflow_server():
+            return
+        start, end = span
+        if self._map is not None:
+            self._map_edits[start] = (end, ip_address)
+        else:
+            self.raw_data = self.raw_data[:start] + ip_address + self.raw_data[end:]
+
+    def _edited(self):
+        # Both are rebuilt from the patches when next read, so a run of edits
+        # costs no parse until conf_obj is wanted.
+        self._raw_data = self._conf_obj = None
+
+    def _write_entry(self, path, entry, value):
+        """Patch the line of ``entry`` to hold ``value`` instead."""
+        patch = self._patches.get(entry)
+        named = entry.end_line is not None
+        if entry.line_num is None:
+            start, end, _, text, _ = patch
+            indent = text[: len(text) - len(text.lstrip())]
+            self._patches.put(
+                entry, start, end, indent + format_line(path[-1], value) + "\n"
+            )
+        else:
+            start, end = self._patches.content_span(entry.line_num)
+            quoted = '"' in self._patches.text[start:end]
+            self._patches.put(
+                entry,
+                start,
+                end,
+                format_line(path[-1], value, quoted=quoted, named=named),
             )
-            self.conf_obj = self.parse_conf(self.raw_data)
+
+    def _delete_entry(self, path, entry):
+        if entry.line_num is None:
+            self._patches.discard(entry)
+        else:
+            start = self._patches.line_span(entry.line_num)[0]
+            end = self._patches.line_span(entry.end_line or entry.line_num)[1]
+            self._patches.put(entry, start, end, "")
+        if entry.end_line is not None:
+            for removed in self.index.remove_prefix(path + (entry.value,)):
+                self._patches.discard(removed)
+        self.index.remove(path, entry)
+
+    def set(self, path, value=None):
+        """Set the value at ``path``, e.g. ``set("system host-name", "gw")``.
+
+        A missing value is added; if the key has several values, the first is
+        changed and the rest are deleted. ``value=None`` writes a flag. Setting
+        a named section such as ``system flow-accounting netflow server``
+        renames it and keeps its contents.
+        """
+        path = split_path(path)
+        entries = self.index.entries.get(path)
+        if not entries:
+            return self.add(path, value)
+        first = entries[0]
+        for entry in entries[1:]:
+            self._delete_entry(path, entry)
+        if first.end_line is not None:
+            if value is None:
+                raise ValueError(
+                    "A named section needs a name: {}".format(" ".join(path))
+                )
+            if value != first.value:
+                self.index.move_prefix(path + (first.value,), path + (value,))
+        self._write_entry(path, first, value)
+        first.value = path[-1] if value is None else value
+        self._edited()
+
+    def add(self, path, value=None):
+        """Add another value at ``path`` (or a flag with ``value=None``).
+
+        The new line goes after the existing values of the same key, or at the
+        end of the enclosing section, which must already exist.
+        """
+        path = split_path(path)
+        index = self.index
+        section = index.sections.get(path[:-1])
+        if section is None:
+            raise KeyError("No section {!r} to add to".format(" ".join(path[:-1])))
+        siblings = index.entries.get(path)
+        if siblings:
+            last = siblings[-1]
+            if last.line_num is None:
+                start, _, _, text, _ = self._patches.get(last)
+                indent = text[: len(text) - len(text.lstrip())]
+            else:
+                start = self._patches.line_span(last.end_line or last.line_num)[1]
+                indent = self._patches.indent(last.line_num)
+        else:
+            start = self._patches.line_span(section.end_line)[0]
+            indent = self._patches.indent(section.line_num) + INDENT
+        entry = index.add(path, path[-1] if value is None else value, None)
+        self._patches.put(
+            entry, start, start, indent + format_line(path[-1], value) + "\n"
+        )
+        self._edited()
+
+    def delete(self, path):
+        """Delete every value at ``path``, or the whole section it names."""
+        path = split_path(path)
+        index = self.index
+        entries = index.entries.get(path)
+        if entries:
+            for entry in list(entries):
+                self._delete_entry(path, entry)
+        elif path in index.sections:
+            named = index.entries.get(path[:-1], ())
+            for entry in named:
+                if entry.value == path[-1] and entry.end_line is not None:
+                    self._delete_entry(path[:-1], entry)
+                    break
+            else:
+                section = index.sections[path]
+                start = self._patches.line_span(section.line_num)[0]
+                end = self._patches.line_span(section.end_line)[1]
+                for removed in index.remove_prefix(path):
+                    self._patches.discard(removed)
+                self._patches.put(section, start, end, "")
+        else:
+            raise KeyError(" ".join(path))
+        self._edited()
 
     def dump(self, path=None):
         path = path or self.filepath
+        if path is None:
+            raise ValueError("No path to dump to")
         if os.path.exists(path):
             os.chmod(path, stat.S_IWUSR | stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
-        with open(path or self.filepath, "w") as c:
+        if self._map is not None:
+            return self._dump_mapped(path)
+        with open(path, "w") as c:
             c.write(self.raw_data)
+
+    def _fit(self, start, end, value):
+        """Return ``(start, end, data)`` writing ``value`` over ``start:end`` at
+        the same length, padded with whitespace, or ``None`` if it cannot be."""
+        mapped = self._map
+        data = value.encode("utf-8")
+        pad = end - start - len(data)
+        if pad == 0:
+            return start, end, data
+        if pad < 0:
+            return None
+        line_end = mapped.find(b"\n", end)
+        if line_end < 0:
+            line_end = len(mapped)
+        if mapped[end:line_end].strip():
+            # A named section like `server 192.0.2.10 {`: the `{` must follow
+            # the name after one space, and the indentation is the config's
+            # own, so a shorter name means rewriting the file.
+            return None
+        # A value line: trailing spaces are ignored.
+        return start, end, data + b" " * pad
+
+    def _dump_mapped(self, path):
+        same_file = os.path.abspath(path) == os.path.abspath(self.filepath)
+        edits = sorted(
+            (start, end, value) for start, (end, value) in self._map_edits.items()
+        )
+        if same_file:
+            patches = [self._fit(start, end, value) for start, end, value in edits]
+            if None not in patches:
+                if patches:
+                    with open(path, "r+b") as c:
+                        for start, _, data in patches:
+                            c.seek(start)
+                            c.write(data)
+                self._map_edits = {}
+                return
+        mapped = self._map
+        with atomic_write(
+            path, permissions=stat.S_IWUSR | stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+        ) as c:
+            pos = 0
+            for start, end, value in edits + [(len(mapped), len(mapped), "")]:
+                while pos < start:
+                    chunk_end = min(start, pos + COPY_CHUNK)
+                    c.write(mapped[pos:chunk_end])
+                    pos = chunk_end
+                c.write(value.encode("utf-8"))
+                pos = end
+        if same_file:
+            mapped.close()
+            self._map = self.map_file(path)
+            self._map_edits = {}
+            if self._map is None:
+                self.raw_data = self.load_file(path)
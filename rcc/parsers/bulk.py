@@ -0,0 +1,77 @@
+"""Parse many configs at once across a pool of processes.
+
+Sources are ``config.boot`` files or ``.tar.gz`` backups that contain one.
+Workers send each tree back as ``marshal`` bytes, which are quicker to
+produce and load than a pickle of the nested dicts, so returning large trees
+eats less of the time gained by parsing in parallel. Sources are handed out
+in chunks so that small configs do not cost one round trip each.
+"""
+
+import marshal
+import os
+import tarfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from rcc.parsers.temp_parser import ParserException, parse_conf
+
+DEFAULT_MEMBER = "config.boot"
+
+BulkResult = namedtuple("BulkResult", "source tree error")
+
+
+def is_archive(source):
+    return source.endswith((".tar.gz", ".tgz", ".tar"))
+
+
+def read_config(source, member=DEFAULT_MEMBER):
+    """Return the config text of a config file or of ``member`` in a tar backup."""
+    if not is_archive(source):
+        with open(source, "r") as f:
+            return f.read()
+    with tarfile.open(source) as tar:
+        for info in tar:
+            if info.isfile() and os.path.basename(info.name) == member:
+                return tar.extractfile(info).read().decode("utf-8")
+    raise FileNotFoundError(f"No {member} in {source}")
+
+
+def _parse_source(source, member=DEFAULT_MEMBER):
+    """Worker side: return ``(source, marshalled tree, error)``."""
+    try:
+        tree = parse_conf(read_config(source, member))
+    except (OSError, tarfile.TarError, UnicodeDecodeError, ParserException) as e:
+        return source, None, f"{e.__class__.__name__}: {e}".strip()
+    return source, marshal.dumps(tree), None
+
+
+def _result(item):
+    source, data, error = item
+    return BulkResult(source, None if data is None else marshal.loads(data), error)
+
+
+def default_chunksize(count, workers):
+    # About four chunks per worker balances uneven sizes against dispatch cost.
+    return max(1, count // (workers * 4))
+
+
+def parse_many(sources, workers=None, chunksize=None, member=DEFAULT_MEMBER):
+    """Yield a ``BulkResult`` for every source, in order.
+
+    ``workers`` defaults to the number of CPUs; with one worker the sources
+    are parsed in this process. A source that cannot be read or parsed gives
+    a result with ``tree=None`` and the reason in ``error``.
+    """
+    sources = list(sources)
+    workers = min(workers or os.cpu_count() or 1, len(sources) or 1)
+    parse = partial(_parse_source, member=member)
+    if workers == 1:
+        for source in sources:
+            yield _result(parse(source))
+        return
+    if chunksize is None:
+        chunksize = default_chunksize(len(sources), workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for item in pool.map(parse, sources, chunksize=chunksize):
+            yield _result(item)
@@ -0,0 +1,137 @@
+"""On-disk cache of parsed configs, keyed by a hash of the config text.
+
+Entries are ``parse_conf`` dicts serialized with ``marshal``, which loads
+them much faster than the config can be parsed again. ``marshal`` data is
+only readable by the Python version that wrote it, so every file starts with
+a header naming that version, and a file with a different or damaged header
+counts as a miss. The cache is kept under ``max_bytes`` by evicting the
+least recently used files; a hit updates the file's mtime.
+"""
+
+import hashlib
+import logging
+import marshal
+import os
+import sys
+
+from rcc.file_manager import atomic_write
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RCCP"
+FORMAT_VERSION = 1
+HEADER = MAGIC + bytes([FORMAT_VERSION, marshal.version, *sys.version_info[:2]])
+HEADER_SIZE = len(HEADER)
+SUFFIX = ".tree"
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def default_cache_dir():
+    return os.environ.get("RCC_PARSE_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "rcc",
+        "parsed",
+    )
+
+
+def content_key(raw_data):
+    if isinstance(raw_data, str):
+        raw_data = raw_data.encode("utf-8")
+    return hashlib.sha256(raw_data).hexdigest()
+
+
+class ParseCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, raw_data):
+        """Return the cached tree for ``raw_data`` or ``None``."""
+        path = self._path(content_key(raw_data))
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if not data.startswith(HEADER):
+            self._discard(path, "written by another version")
+            return None
+        try:
+            tree = marshal.loads(memoryview(data)[HEADER_SIZE:])
+        except (EOFError, ValueError, TypeError):
+            self._discard(path, "corrupt")
+            return None
+        if not isinstance(tree, dict):
+            self._discard(path, "corrupt")
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return tree
+
+    def put(self, raw_data, tree):
+        """Store ``tree`` as the parse of ``raw_data``; failures are only logged."""
+        path = self._path(content_key(raw_data))
+        try:
+            data = HEADER + marshal.dumps(tree)
+        except ValueError:
+            logger.warning("Cannot cache parsed config: tree is not serializable")
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with atomic_write(path) as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning(f"Cannot write parse cache {path}: {e}")
+            return
+        self.evict()
+
+    def load(self, raw_data, parse):
+        """Return the cached tree for ``raw_data``, or parse and cache it."""
+        tree = self.get(raw_data)
+        if tree is None:
+            tree = parse(raw_data)
+            self.put(raw_data, tree)
+        return tree
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits ``max_bytes``."""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(SUFFIX):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+        except OSError:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._discard(path)
+            total -= size
+
+    def clear(self):
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(SUFFIX):
+                        self._discard(entry.path)
+        except OSError:
+            pass
+
+    def _discard(self, path, reason=None):
+        if reason:
+            logger.debug(f"Dropping parse cache entry {path}: {reason}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
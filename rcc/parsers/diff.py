@@ -0,0 +1,135 @@
+"""Structural diff of two parsed configs.
+
+Every subtree gets a digest over its sorted keys and its children's digests,
+so ``diff`` only descends into sections whose digests differ. Identical
+sections cost one comparison however large they are. Key order does not
+count as a change, which matches how EdgeOS treats it.
+
+Both ``parse_conf`` dicts and compact ``ConfigNode`` trees can be diffed,
+against each other as well. Digests do not depend on the Python process, so a
+``HashedTree`` can be kept and compared with later backups.
+"""
+
+from collections import namedtuple
+from collections.abc import Mapping
+from hashlib import blake2b
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+DIGEST_SIZE = 16
+
+
+class Change(namedtuple("Change", "kind path old new")):
+    """One difference: ``old`` is ``None`` if added, ``new`` is ``None`` if removed."""
+
+    __slots__ = ()
+
+    def __str__(self):
+        path = " ".join(self.path)
+        if self.kind == ADDED:
+            return "+ {} {}".format(path, _describe(self.new))
+        if self.kind == REMOVED:
+            return "- {} {}".format(path, _describe(self.old))
+        return "~ {} {} -> {}".format(path, _describe(self.old), _describe(self.new))
+
+
+def _describe(value):
+    if isinstance(value, Mapping):
+        return "{...}" if value else "{}"
+    return repr(value)
+
+
+class HashedTree:
+    """A config section with the digest of every subsection.
+
+    Plain values are kept as they are in ``children``; only sections, empty
+    ones included, get their own ``HashedTree``.
+    """
+
+    __slots__ = ("digest", "value", "children")
+
+    def __init__(self, digest, value, children):
+        self.digest = digest
+        # The original dict or ``ConfigNode``.
+        self.value = value
+        # key -> HashedTree for sections, the value itself otherwise.
+        self.children = children
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.digest.hex())
+
+
+_EMPTY_DIGEST = blake2b(b"s", digest_size=DIGEST_SIZE).digest()
+
+
+def hash_tree(tree):
+    """Return a ``HashedTree`` for the section ``tree``."""
+    children = {}
+    for key, value in tree.items():
+        if isinstance(value, Mapping):
+            children[key] = (
+                hash_tree(value) if value else HashedTree(_EMPTY_DIGEST, value, {})
+            )
+        else:
+            children[key] = value
+    h = blake2b(b"s", digest_size=DIGEST_SIZE)
+    update = h.update
+    for key in sorted(children):
+        child = children[key]
+        encoded = key.encode("utf-8")
+        update(len(encoded).to_bytes(4, "little"))
+        update(encoded)
+        if isinstance(child, HashedTree):
+            update(child.digest)
+        elif child is None:
+            update(b"n")
+        else:
+            encoded = str(child).encode("utf-8")
+            update(b"v" + len(encoded).to_bytes(4, "little"))
+            update(encoded)
+    return HashedTree(h.digest(), tree, children)
+
+
+def diff(old, new):
+    """Return the ``Change`` list that turns ``old`` into ``new``.
+
+    ``old`` and ``new`` are parsed trees or ``HashedTree`` objects. Paths are
+    tuples of keys in tree order; a removed or added section is reported once,
+    at its own path, with the whole subtree as its value.
+    """
+    if not isinstance(old, HashedTree):
+        old = hash_tree(old)
+    if not isinstance(new, HashedTree):
+        new = hash_tree(new)
+    changes = []
+    _diff(old, new, (), changes)
+    return changes
+
+
+def _diff(old, new, path, changes):
+    if old.digest == new.digest:
+        return
+    old_children = old.children
+    new_children = new.children
+    for key, child in old_children.items():
+        if key not in new_children:
+            changes.append(Change(REMOVED, path + (key,), _value(child), None))
+            continue
+        other = new_children[key]
+        if isinstance(child, HashedTree) and isinstance(other, HashedTree):
+            _diff(child, other, path + (key,), changes)
+        elif (
+            isinstance(child, HashedTree)
+            or isinstance(other, HashedTree)
+            or child != other
+        ):
+            changes.append(Change(CHANGED, path + (key,), _value(child), _value(other)))
+    for key, child in new_children.items():
+        if key not in old_children:
+            changes.append(Change(ADDED, path + (key,), None, _value(child)))
+
+
+def _value(child):
+    return child.value if isinstance(child, HashedTree) else child
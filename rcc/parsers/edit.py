@@ -0,0 +1,116 @@
+"""Pending text patches for structured edits of a loaded config.
+
+Edits never rewrite the config text directly. Each one records which span of
+the original text it replaces and with what, and ``PatchSet.apply`` produces
+the edited text in a single pass. Everything outside the patched spans,
+including comments, ordering and indentation, is copied through unchanged.
+"""
+
+import re
+from bisect import bisect_right
+
+INDENT = "    "
+
+rx_bare_value = re.compile(r'^[^\s"{}]+$')
+
+
+def validate_value(value):
+    """Raise ``ValueError`` if ``value`` cannot be written into a config line."""
+    if '"' in value or "\n" in value:
+        raise ValueError(
+            "Config values cannot contain quotes or newlines: {!r}".format(value)
+        )
+
+
+def format_value(value, quoted=False):
+    """Render ``value`` the way EdgeOS writes it, quoting it when needed."""
+    validate_value(value)
+    if quoted or not rx_bare_value.match(value):
+        return '"{}"'.format(value)
+    return value
+
+
+def format_line(key, value=None, quoted=False, named=False):
+    line = key if value is None else "{} {}".format(key, format_value(value, quoted))
+    return line + " {" if named else line
+
+
+class PatchSet:
+    """Patches against ``text``, keyed by the object that owns each one.
+
+    Every owner (usually an ``IndexEntry``) has at most one patch, so editing
+    the same value twice replaces the earlier patch instead of stacking them.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._patches = {}
+        self._seq = 0
+        self._line_starts = None
+
+    def __len__(self):
+        return len(self._patches)
+
+    @property
+    def line_starts(self):
+        if self._line_starts is None:
+            starts = [0]
+            find = self.text.find
+            pos = find("\n")
+            while pos >= 0:
+                starts.append(pos + 1)
+                pos = find("\n", pos + 1)
+            self._line_starts = starts
+        return self._line_starts
+
+    def line_span(self, line_num):
+        """Return ``(start, end)`` of a 1-based line, including its newline."""
+        starts = self.line_starts
+        start = starts[line_num - 1]
+        end = starts[line_num] if line_num < len(starts) else len(self.text)
+        return start, end
+
+    def line_number(self, offset):
+        return bisect_right(self.line_starts, offset)
+
+    def content_span(self, line_num):
+        """Return the span of a line without its indentation and line ending."""
+        start, end = self.line_span(line_num)
+        text = self.text
+        while start < end and text[start] in " \t":
+            start += 1
+        while end > start and text[end - 1] in " \t\r\n":
+            end -= 1
+        return start, end
+
+    def indent(self, line_num):
+        start = self.line_span(line_num)[0]
+        end = self.content_span(line_num)[0]
+        return self.text[start:end]
+
+    def put(self, owner, start, end, replacement):
+        self._seq += 1
+        self._patches[id(owner)] = (start, end, self._seq, replacement, owner)
+
+    def get(self, owner):
+        return self._patches.get(id(owner))
+
+    def discard(self, owner):
+        self._patches.pop(id(owner), None)
+
+    def apply(self):
+        """Return the text with every pending patch applied, in one pass."""
+        if not self._patches:
+            return self.text
+        text = self.text
+        pieces = []
+        pos = 0
+        for start, end, _, replacement, _ in sorted(self._patches.values()):
+            if start < pos:
+                # Contained in an earlier patch, e.g. a value inside a deleted section.
+                continue
+            pieces.append(text[pos:start])
+            pieces.append(replacement)
+            pos = end
+        pieces.append(text[pos:])
+        return "".join(pieces)
@@ -0,0 +1,392 @@
+"""Flat path index and wildcard queries over parsed configs.
+
+``ConfigIndex`` maps every full config path to the values found there and the
+lines they came from, e.g.::
+
+    ("system", "flow-accounting", "netflow", "server") -> [IndexEntry("192.0.2.10", 12)]
+
+Paths follow the config text: a named section ``server 192.0.2.10 {`` is both
+an entry under ``(..., "server")`` and the prefix of everything inside it.
+Exact lookups are a single dict access; ``Query`` objects expand wildcards
+through a map of each prefix's children, so they only visit matching branches.
+"""
+
+import re
+from fnmatch import fnmatchcase
+from functools import lru_cache
+
+from rcc.parsers.temp_parser import (
+    FLAG,
+    LEAVE,
+    NAMED_SECTION,
+    SECTION,
+    VALUE,
+    ParserException,
+    iter_events,
+    u,
+)
+
+rx_path_separator = re.compile(r"[\s>]+")
+
+
+def split_path(path):
+    """Split ``"system > flow-accounting"`` or ``"system flow-accounting"``."""
+    if isinstance(path, str):
+        return tuple(p for p in rx_path_separator.split(path) if p)
+    return tuple(path)
+
+
+class IndexEntry:
+    __slots__ = ("value", "line_num", "end_line")
+
+    def __init__(self, value, line_num, end_line=None):
+        self.value = value
+        self.line_num = line_num
+        # Line of the closing brace, for sections and named sections.
+        self.end_line = end_line
+
+    def __repr__(self):
+        return "{}({!r}, {!r})".format(
+            self.__class__.__name__, self.value, self.line_num
+        )
+
+
+class ConfigIndex:
+    def __init__(self):
+        # path -> [IndexEntry] for values, flags and named sections
+        self.entries = {}
+        # path -> IndexEntry spanning the section's opening and closing lines
+        self.sections = {}
+        # prefix -> {child: None}, an ordered set of the next path segments
+        self.children = {}
+
+    @classmethod
+    def from_events(cls, events):
+        builder = IndexBuilder(cls())
+        for event in events:
+            builder.feed(event)
+        return builder.index
+
+    @classmethod
+    def from_string(cls, s):
+        return cls.from_events(iter_events(u(s).split("\n")))
+
+    def _add_child(self, prefix, name):
+        children = self.children.get(prefix)
+        if children is None:
+            children = self.children[prefix] = {}
+        children[name] = None
+
+    def add(self, path, value, line_num, end_line=None):
+        entry = IndexEntry(value, line_num, end_line)
+        entries = self.entries.get(path)
+        if entries is None:
+            self.entries[path] = [entry]
+            self._add_child(path[:-1], path[-1])
+        else:
+            entries.append(entry)
+        return entry
+
+    def add_section(self, path, line_num):
+        entry = self.sections.get(path)
+        if entry is None:
+            entry = self.sections[path] = IndexEntry(None, line_num)
+            self._add_child(path[:-1], path[-1])
+        return entry
+
+    def _discard_child(self, path):
+        if path in self.entries or path in self.sections or self.children.get(path):
+            return
+        self.children.pop(path, None)
+        siblings = self.children.get(path[:-1])
+        if siblings is not None:
+            siblings.pop(path[-1], None)
+
+    def remove(self, path, entry):
+        """Remove ``entry`` itself from ``path``.
+
+        Entries are matched by identity: two added with the same value are
+        still different lines of the config.
+        """
+        entries = self.entries[path]
+        for i, other in enumerate(entries):
+            if other is entry:
+                del entries[i]
+                break
+        else:
+            raise ValueError("{!r} is not at {!r}".format(entry, path))
+        if not entries:
+            del self.entries[path]
+            self._discard_child(path)
+
+    def subtree(self, prefix):
+        """Return every path at or below ``prefix``, parents before children."""
+        paths = [prefix]
+        i = 0
+        while i < len(paths):
+            paths.extend(
+                paths[i] + (child,) for child in self.children.get(paths[i], ())
+            )
+            i += 1
+        return paths
+
+    def remove_prefix(self, prefix):
+        """Remove ``prefix`` and everything below it; return the removed entries."""
+        removed = []
+        for path in reversed(self.subtree(prefix)):
+            removed.extend(self.entries.pop(path, ()))
+            section = self.sections.pop(path, None)
+            if section is not None:
+                removed.append(section)
+            self.children.pop(path, None)
+        self._discard_child(prefix)
+        return removed
+
+    def move_prefix(self, old, new):
+        """Re-key ``old`` and everything below it to start with ``new`` instead."""
+        cut = len(old)
+        for path in self.subtree(old):
+            moved = new + path[cut:]
+            if path in self.entries:
+                self.entries.setdefault(moved, []).extend(self.entries.pop(path))
+            if path in self.sections:
+                self.sections[moved] = self.sections.pop(path)
+            if path in self.children:
+                self.children.setdefault(moved, {}).update(self.children.pop(path))
+        self._add_child(new[:-1], new[-1])
+        self._discard_child(old)
+
+    def __contains__(self, path):
+        path = split_path(path)
+        return path in self.entries or path in self.sections
+
+    def entry(self, path):
+        """Return the first ``IndexEntry`` at ``path`` or ``None``."""
+        entries = self.entries.get(split_path(path))
+        return entries[0] if entries else None
+
+    def get(self, path, default=None):
+        entry = self.entry(path)
+        return default if entry is None else entry.value
+
+    def get_all(self, path):
+        return [e.value for e in self.entries.get(split_path(path), ())]
+
+    def query(self, query):
+        """Yield ``(path, IndexEntry)`` for every match of ``query``."""
+        if not isinstance(query, Query):
+            query = compile_query(query)
+        return query.match(self)
+
+
+class IndexBuilder:
+    """Feeds events into a ``ConfigIndex``, tracking the literal section nesting."""
+
+    def __init__(self, index=None):
+        self.index = index if index is not None else ConfigIndex()
+        self.prefix = ()
+        # (prefix before the section, section entry, named section entry)
+        self.stack = []
+
+    def feed(self, event):
+        kind, key, value, line_num = event
+        index = self.index
+        prefix = self.prefix
+        if kind == VALUE or kind == FLAG:
+            index.add(prefix + (key,), value, line_num)
+        elif kind == SECTION:
+            self.stack.append(
+                (prefix, index.add_section(prefix + (key,), line_num), None)
+            )
+            self.prefix = prefix + (key,)
+        elif kind == NAMED_SECTION:
+            named = index.add(prefix + (key,), value, line_num)
+            section = index.add_section(prefix + (key, value), line_num)
+            self.stack.append((prefix, section, named))
+            self.prefix = prefix + (key, value)
+        elif kind == LEAVE:
+            if not self.stack:
+                raise ParserException(
+                    "Parse error in\n {line_num}: {line}\n".format(
+                        line_num=line_num, line="}"
+                    )
+                )
+            self.prefix, section, named = self.stack.pop()
+            section.end_line = line_num
+            if named is not None:
+                named.end_line = line_num
+
+
+class Query:
+    """A compiled path pattern such as ``firewall name * rule * action``.
+
+    ``*`` matches any single segment; other segments may use ``fnmatch``
+    wildcards (``eth*``). A compiled query can be reused across indexes.
+    """
+
+    __slots__ = ("pattern", "segments", "_exact")
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.segments = split_path(pattern)
+        self._exact = not any(_is_wildcard(s) for s in self.segments)
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.pattern)
+
+    def paths(self, index):
+        """Yield every existing path that matches, values or sections."""
+        if self._exact:
+            if self.segments in index.entries or self.segments in index.sections:
+                yield self.segments
+            return
+        prefixes = [()]
+        for segment in self.segments:
+            matched = []
+            for prefix in prefixes:
+                children = index.children.get(prefix)
+                if not children:
+                    continue
+                if segment == "*":
+                    matched.extend(prefix + (child,) for child in children)
+                elif _is_wildcard(segment):
+                    matched.extend(
+                        prefix + (child,)
+                        for child in children
+                        if fnmatchcase(child, segment)
+                    )
+                elif segment in children:
+                    matched.append(prefix + (segment,))
+            prefixes = matched
+            if not prefixes:
+                return
+        yield from prefixes
+
+    def match(self, index):
+        """Yield ``(path, IndexEntry)`` for every value found at a matching path."""
+        for path in self.paths(index):
+            for entry in index.entries.get(path, ()):
+                yield path, entry
+
+    def values(self, index):
+        return [entry.value for _, entry in self.match(index)]
+
+    def first(self, index, default=None):
+        for _, entry in self.match(index):
+            return entry.value
+        return default
+
+
+rx_brace = re.compile(r"(?:(\})|\{)[ \t\r]*(?:\n|\Z)")
+rx_brace_bytes = re.compile(rx_brace.pattern.encode("ascii"))
+
+
+@lru_cache(maxsize=64)
+def _leaf_pattern(leaf, binary):
+    pattern = r"^[ \t]*(" + re.escape(leaf) + r')(?: "?([^"\r\n]*?)"?)?[ \t\r]*$'
+    if binary:
+        return re.compile(pattern.encode("utf-8"), re.M)
+    return re.compile(pattern, re.M)
+
+
+def scan_spans(text, path):
+    """Return the ``(start, end)`` spans of the values at ``path`` in ``text``.
+
+    This is a structural scan for when only a few paths are needed. It jumps
+    between lines ending in ``{`` or ``}``, only looks at section headers while
+    they are still on ``path``, and then searches the matching section for the
+    value lines. That is one linear pass with no backtracking. ``text`` can be
+    a ``str``, ``bytes`` or another buffer such as an ``mmap``. A named section
+    ``server 192.0.2.10 {`` counts as a value of ``server``.
+    """
+    path = split_path(path)
+    parent, leaf = path[:-1], path[-1]
+    binary = not isinstance(text, str)
+    leaf_rx = _leaf_pattern(leaf, binary)
+    if binary:
+        parent = tuple(p.encode("utf-8") for p in parent)
+        leaf = leaf.encode("utf-8")
+        newline = b"\n"
+        rx = rx_brace_bytes
+    else:
+        newline = "\n"
+        rx = rx_brace
+    target = len(parent)
+    matched = 0  # segments of ``parent`` the open sections match
+    off_path = 0  # sections entered since leaving ``parent``
+    stack = []
+    spans = []
+    body_start = 0 if target == 0 else None
+    children = []  # spans of sections directly inside ``parent``
+    child_start = None
+
+    for m in rx.finditer(text):
+        if m.lastindex:
+            if off_path:
+                off_path -= 1
+                if off_path == 0 and matched == target:
+                    children.append((child_start, m.end()))
+            elif stack:
+                if matched == target:
+                    spans.extend(
+                        _leaf_spans(text, leaf_rx, body_start, m.start(), children)
+                    )
+                    children = []
+                matched -= stack.pop()
+        else:
+            if off_path:
+                off_path += 1
+                continue
+            start = m.start()
+            line_start = text.rfind(newline, 0, start) + 1
+            header = tuple(text[line_start:start].split())
+            if matched == target:
+                if len(header) == 2 and header[0] == leaf:
+                    key_end = text.find(header[0], line_start) + len(header[0])
+                    name_start = text.find(header[1], key_end)
+                    spans.append(
+                        _unquote(text, name_start, name_start + len(header[1]))
+                    )
+                off_path = 1
+                child_start = line_start
+            elif parent[matched:][: len(header)] == header:
+                stack.append(len(header))
+                matched += len(header)
+                if matched == target:
+                    body_start = m.end()
+            else:
+                off_path = 1
+
+    if target == 0:
+        spans.extend(_leaf_spans(text, leaf_rx, 0, len(text), children))
+    spans.sort()
+    return spans
+
+
+def _leaf_spans(text, leaf_rx, start, end, children):
+    """Spans of ``leaf`` value lines in ``text[start:end]`` outside ``children``."""
+    spans = []
+    child = iter(children)
+    current = next(child, None)
+    for m in leaf_rx.finditer(text, start, end):
+        while current is not None and current[1] <= m.start():
+            current = next(child, None)
+        if current is None or m.start() < current[0]:
+            spans.append(m.span(2) if m.start(2) >= 0 else m.span(1))
+    return spans
+
+
+def _unquote(text, start, end):
+    quote = b'"'[0] if not isinstance(text, str) else '"'
+    if end - start >= 2 and text[start] == quote and text[end - 1] == quote:
+        return start + 1, end - 1
+    return start, end
+
+
+def _is_wildcard(segment):
+    return "*" in segment or "?" in segment or "[" in segment
+
+
+@lru_cache(maxsize=256)
+def compile_query(pattern):
+    return Query(pattern)
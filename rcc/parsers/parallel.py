@@ -0,0 +1,235 @@
+"""Parse one large config in parallel, a group of sections per worker.
+
+A pre-scan over the lines that open or close a section finds the sections
+and their sizes. The text is cut between sections into about two chunks per
+worker. A section too large for one chunk, such as a ``firewall`` with
+thousands of rules, is cut between its own subsections. Each chunk is then
+parsed together with the header lines of the sections it sits in, the
+chunks are parsed in a process pool, and their trees are joined in order.
+
+The result is always exactly what ``parse_conf`` returns. A worker reports
+a chunk that leaves its enclosing sections, and the join rejects chunks that
+share keys or whose ``update_tree`` result would have depended on an earlier
+chunk. In those cases, and if a chunk fails to parse, the config is parsed
+serially instead, so errors are the same too.
+"""
+
+import marshal
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from rcc.parsers.index import rx_brace
+from rcc.parsers.temp_parser import (
+    NAMED_SECTION,
+    VALUE,
+    apply_event,
+    iter_events,
+    parse_conf,
+    u,
+)
+
+# Below this size the pool costs more than it saves.
+PARALLEL_MIN_BYTES = 2 * 1024 * 1024
+
+CHUNKS_PER_WORKER = 2
+
+
+def _sections(text):
+    """Return the section tree of ``text``.
+
+    Each section is ``[start, body_start, body_end, end, children]``.
+
+    The root spans the whole text. Returns ``None`` if the braces do not balance.
+    """
+    root = [0, 0, len(text), len(text), []]
+    stack = [root]
+    for m in rx_brace.finditer(text):
+        if m.lastindex:
+            if len(stack) == 1:
+                return None
+            node = stack.pop()
+            node[2] = text.rfind("\n", 0, m.start()) + 1
+            node[3] = m.end()
+        else:
+            node = [text.rfind("\n", 0, m.start()) + 1, m.end(), None, None, []]
+            stack[-1][4].append(node)
+            stack.append(node)
+    if len(stack) != 1:
+        return None
+    return root
+
+
+def _units(text, node, headers, target, units):
+    """Append ``(headers, start, end)`` ranges that cover the body of ``node``."""
+    pos = node[1]
+    for child in node[4]:
+        start, body_start, _, end, grandchildren = child
+        if end - start > target and grandchildren:
+            if start > pos:
+                units.append((headers, pos, start))
+            header = text[start:body_start].strip()
+            _units(text, child, headers + (header,), target, units)
+        else:
+            units.append((headers, pos, end))
+        pos = end
+    if node[2] > pos:
+        units.append((headers, pos, node[2]))
+
+
+def split_sections(text, parts):
+    """Return up to about ``parts`` chunks of ``text`` as ``(headers, body, tail)``.
+
+    ``headers`` are the header lines of the sections ``body`` is inside of,
+    and ``tail`` is the text of the closing and header lines between ``body``
+    and the next chunk.
+    """
+    root = _sections(text) if parts > 1 else None
+    if root is None:
+        return [((), text, "")]
+    target = len(text) / parts
+    units = []
+    _units(text, root, (), target, units)
+    chunks = []
+    for headers, start, end in units:
+        if chunks and chunks[-1][0] == headers and end - chunks[-1][1] <= target:
+            chunks[-1][2] = end
+        else:
+            chunks.append([headers, start, end])
+    if chunks[0][1] > 0:
+        # Headers before the first chunk go in the tail of an empty one.
+        chunks.insert(0, [(), 0, 0])
+    starts = [start for _, start, _ in chunks[1:]] + [len(text)]
+    return [
+        (headers, text[start:end], text[end:next_start])
+        for (headers, start, end), next_start in zip(chunks, starts)
+    ]
+
+
+def _path_keys(path):
+    return tuple(next(iter(p.items())) for p in path)
+
+
+def _parse_chunk(chunk):
+    """Worker side: parse one chunk from ``split_sections``.
+
+    Returns the marshalled tree, the parser path before and after the chunk,
+    whether the chunk has a value ``update_tree`` might have stored
+    differently had the section not been empty, and the keys only used for
+    named sections such as ``rule 10 {``. Returns ``None`` if the body leaves
+    the sections it is in.
+    """
+    headers, body, tail = chunk
+    config = {}
+    path = []
+    for event in iter_events(headers):
+        apply_event(config, path, event)
+    depth = len(path)
+    start_path = _path_keys(path)
+    node = config
+    for key, _ in start_path:
+        node = node[key]
+    section_key = start_path[-1][0] if start_path else None
+    depends = False
+    named = set()
+    plain = set()
+    for event in iter_events(body.split("\n")):
+        if len(path) == depth and event.key is not None:
+            (named if event.kind == NAMED_SECTION else plain).add(event.key)
+        if len(path) == depth and event.kind == VALUE and not depends:
+            depends = (
+                section_key is None
+                or event.key == section_key
+                or len(node) > 1
+                and event.key == next(iter(node))
+                and not isinstance(node[event.key], dict)
+            )
+        apply_event(config, path, event)
+        if len(path) < depth:
+            return None
+    if len(path) != depth:
+        return None
+    # The tail only moves the path to where the next chunk starts; the
+    # sections it opens are created by that chunk's headers.
+    scratch = {}
+    for event in iter_events(tail.split("\n")):
+        apply_event(scratch, path, event)
+    containers = tuple(named - plain)
+    return marshal.dumps(config), start_path, _path_keys(path), depends, containers
+
+
+def _merge(results):
+    config = {}
+    expected_path = ()
+    # ids of dicts that only hold named sections, like the one under "rule"
+    containers = set()
+    for result in results:
+        if result is None:
+            return None
+        data, start_path, end_path, depends, chunk_containers = result
+        # Each chunk was parsed from the path its headers give; that has to
+        # be where parse_conf would have been after the previous chunk.
+        if start_path != expected_path:
+            return None
+        expected_path = end_path
+        tree = marshal.loads(data)
+        t = config
+        for key, _ in start_path:
+            tree = tree[key]
+            child = t.get(key)
+            if child is None:
+                child = t[key] = {}
+            elif not isinstance(child, dict):
+                return None
+            t = child
+        # update_tree stores a value by comparing it with the section's first
+        # key and name; such a chunk only matches if it started the section.
+        if depends and t:
+            return None
+        for key, value in tree.items():
+            if key not in t:
+                t[key] = value
+            elif key in chunk_containers and id(t[key]) in containers:
+                # Named sections from both chunks, e.g. "rule 10" and
+                # "rule 9000", share one dict under "rule".
+                existing = t[key]
+                for name, section in value.items():
+                    if name in existing:
+                        return None
+                    existing[name] = section
+            else:
+                return None
+        for key in chunk_containers:
+            containers.add(id(t[key]))
+    return config
+
+
+def parse_conf_parallel(s, workers=None, executor=None):
+    """Parse ``s`` like ``parse_conf``, splitting it across worker processes.
+
+    ``executor`` may be an existing ``ProcessPoolExecutor`` to reuse;
+    otherwise one with ``workers`` processes is started for this call.
+    """
+    s = u(s)
+    workers = workers or os.cpu_count() or 1
+    chunks = split_sections(s, workers * CHUNKS_PER_WORKER)
+    if len(chunks) < 2:
+        return parse_conf(s)
+    try:
+        if executor is not None:
+            tree = _merge(executor.map(_parse_chunk, chunks))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+                tree = _merge(pool.map(_parse_chunk, chunks))
+    except Exception:
+        tree = None
+    if tree is None:
+        return parse_conf(s)
+    return tree
+
+
+def parse_conf_auto(s, threshold=PARALLEL_MIN_BYTES, workers=None):
+    """Parse ``s`` in parallel if it is at least ``threshold`` long and CPUs allow."""
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and s and len(s) >= threshold:
+        return parse_conf_parallel(s, workers=workers)
+    return parse_conf(s)
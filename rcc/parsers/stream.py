@@ -0,0 +1,48 @@
+"""Streaming entry point for parsing configs line by line.
+
+``iter_events`` turns an open file, a tar member stream or any other iterable
+of lines into a stream of ``Event`` tuples; ``parse_stream`` builds a tree
+from such a stream without first reading the whole config into one string.
+"""
+
+from rcc.parsers.temp_parser import (  # noqa: F401
+    FLAG,
+    LEAVE,
+    NAMED_SECTION,
+    SECTION,
+    VALUE,
+    Event,
+    ParserException,
+    build_tree,
+    iter_events,
+)
+from rcc.parsers.index import IndexBuilder
+from rcc.parsers.tree import build_compact_tree
+
+
+def parse_events(events, compact=False):
+    if compact:
+        return build_compact_tree(events)
+    return build_tree(events)
+
+
+def parse_stream(lines, compact=False):
+    """Parse an open file or iterable of lines into a dict or ``ConfigNode`` tree."""
+    return parse_events(iter_events(lines), compact=compact)
+
+
+def parse_indexed(lines, compact=False):
+    """Parse into a ``(tree, ConfigIndex)`` pair in a single pass over ``lines``."""
+    builder = IndexBuilder()
+
+    def events():
+        for event in iter_events(lines):
+            builder.feed(event)
+            yield event
+
+    return parse_events(events(), compact=compact), builder.index
+
+
+def parse_file(filepath, compact=False):
+    with open(filepath, "r") as f:
+        return parse_stream(f, compact=compact)
@@ -1,6 +1,7 @@
 """https://github.com/hedin/vyatta-conf-parser"""
 import re
 import sys
+from collections import namedtuple
 
 if sys.version < "3":
 
@@ -25,58 +26,105 @@ rx_value = re.compile(r'^([\w\-]+) "?([^"]+)?"?$', re.UNICODE)
 rx_flag = re.compile(r"^([\w\-]+)$", re.UNICODE)
 # Matches comments
 rx_comment = re.compile(r"^(\/\*).*(\*\/)", re.UNICODE)
+# Classifies a line and captures its groups in one pass. The alternatives are
+# tried in the same order as the individual patterns above, so the first one
+# to match wins exactly as it does with sequential `match` calls.
+rx_line = re.compile(
+    r"^(?:"
+    r"(?P<section>([\w\-]+) \{)"
+    r"|(?P<named_section>([\w\-]+) ([\w\-\"\./@:]+) \{)"
+    r'|(?P<value>([\w\-]+) "?([^"]+)?"?)'
+    r"|(?P<flag>[\w\-]+)"
+    r"|(?P<close>\})"
+    r")$"
+    r"|^(?P<comment>\/\*.*\*\/)",
+    re.UNICODE,
+)
+
+
+SECTION = "section"
+NAMED_SECTION = "named_section"
+VALUE = "value"
+FLAG = "flag"
+LEAVE = "leave"
+
+# A parsed line: ``kind`` is one of the constants above. ``key`` and ``value``
+# are the section name and None, the section and its name, the key and value,
+# or the flag twice; both are None for LEAVE.
+Event = namedtuple("Event", "kind key value line_num")
 
 
 class ParserException(Exception):
     pass
 
 
+def tokenize(line):
+    """Classify a stripped line, returning ``(val_type, key, value)``.
+
+    ``val_type`` is one of ``section``, ``named_section``, ``value``, ``flag``,
+    ``comment`` or ``close``, or ``None`` when the line is not valid syntax.
+    """
+    m = rx_line.match(line)
+    if m is None:
+        return None, None, None
+    val_type = m.lastgroup
+    if val_type == "section":
+        return val_type, m.group(2), None
+    if val_type == "named_section":
+        return val_type, m.group(4), m.group(5)
+    if val_type == "value":
+        return val_type, m.group(7), m.group(8)
+    if val_type == "flag":
+        return val_type, line, line
+    return val_type, None, None
+
+
+def _first_key(d):
+    return next(iter(d))
+
+
 def update_tree(config, path, val, val_type=None):
     t = config
 
     for item in path:
-        if list(item.keys())[0] not in t:
-            try:
-                t[list(item.keys())[0]] = {}
-            except TypeError:
+        key = _first_key(item)
+        if key not in t:
+            if not isinstance(t, dict):
                 break
+            t[key] = {}
 
-        t = t.get(list(item.keys())[0])
+        t = t.get(key)
 
     if val_type == "flag":
         t.update(val)
 
     elif val_type == "value":
+        key, value = _first_key(val.items())
         if t and isinstance(t, dict):
-            if list(t.keys())[0] == list(val.keys())[0]:
-                try:
-                    t.update(
-                        {
-                            list(t.keys())[0]: dict(
-                                [(k, {}) for k in list(t.values()) + list(val.values())]
-                            )
-                        }
-                    )
-                except TypeError:
-                    if isinstance(t[list(t.keys())[0]], unicode):
-                        t[list(t.keys())[0]] = {t[list(t.keys())[0]]: {}}
-                    t[list(t.keys())[0]].update({list(val.values())[0]: {}})
-            elif list(val.keys())[0] == list(path[-1].keys())[0]:
-                t.update({list(val.values())[0]: {}})
-            elif list(val.keys())[0] in list(t.keys()):
-                try:
-                    t.update(
-                        {
-                            list(val.keys())[0]: {
-                                t[list(val.keys())[0]]: {},
-                                list(val.values())[0]: {},
-                            }
-                        }
-                    )
-                except TypeError:
-                    t[list(val.keys())[0]].update({list(val.values())[0]: {}})
+            first = _first_key(t)
+            if first == key:
+                current = t[first]
+                # A first key seen for the second time collects every value
+                # of the section into its set, as long as they are all plain
+                # values; otherwise the new value joins the existing set.
+                if not isinstance(current, dict) and not any(
+                    isinstance(v, dict) for v in t.values()
+                ):
+                    t[first] = {k: {} for k in list(t.values()) + [value]}
+                else:
+                    if isinstance(current, unicode):
+                        t[first] = {current: {}}
+                    t[first][value] = {}
+            elif key == _first_key(path[-1]):
+                t[value] = {}
+            elif key in t:
+                current = t[key]
+                if isinstance(current, dict):
+                    current[value] = {}
+                else:
+                    t[key] = {current: {}, value: {}}
             else:
-                t.update(val)
+                t[key] = value
         else:
             t.update(val)
 
@@ -89,6 +137,77 @@ def update_tree(config, path, val, val_type=None):
     return config
 
 
+def _parse_error(line_num, line):
+    return ParserException(
+        "Parse error in\n {line_num}: {line}\n".format(line_num=line_num, line=line)
+    )
+
+
+def line_event(line, line_num):
+    """Return the ``Event`` for a stripped, non-empty line, or ``None`` for comments."""
+    val_type, key, value = tokenize(line)
+    if val_type == "comment":
+        return None
+    if val_type == "close":
+        return Event(LEAVE, None, None, line_num)
+    if val_type is None:
+        raise _parse_error(line_num, line)
+    return Event(val_type, key, value, line_num)
+
+
+def iter_events(lines):
+    """Yield an ``Event`` for every section, value, flag and closing brace.
+
+    ``lines`` can be an open file (text or binary) or any iterable of lines,
+    so a config never needs to be held in memory as a whole.
+    """
+    for n, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if line:
+            event = line_event(line, n)
+            if event is not None:
+                yield event
+
+
+def apply_event(config, path, event):
+    """Apply ``event`` to the dict tree ``config`` at the position ``path``."""
+    val_type, key, value, line_num = event
+
+    if val_type == SECTION:
+        path.append({key: val_type})
+        update_tree(config, path, {key: {}}, val_type=val_type)
+
+    elif val_type == NAMED_SECTION:
+        if not any(key in p for p in path):
+            path.append({key: val_type})
+        path.append({value: val_type})
+        update_tree(config, path, {key: {value: {}}}, val_type=val_type)
+
+    elif val_type == VALUE or val_type == FLAG:
+        update_tree(config, path, {key: value}, val_type=val_type)
+
+    elif val_type == LEAVE and path:
+        last = path.pop()
+        if path and _first_key(last.values()) == NAMED_SECTION:
+            path.pop()
+
+    else:
+        raise _parse_error(line_num, "}")
+
+    return config, path
+
+
+def build_tree(events):
+    """Build the dict tree for a sequence of events, e.g. from ``iter_events``."""
+    config = {}
+    path = []
+    for event in events:
+        apply_event(config, path, event)
+    return config
+
+
 def parse_node(config, line, line_num, path=None):
     if not path:
         path = []
@@ -97,57 +216,13 @@ def parse_node(config, line, line_num, path=None):
     if not line:
         return config, path
 
-    if rx_section.match(line):
-        val_type = "section"
-        section = rx_section.match(line).groups()[0]
-        path.append({section: val_type})
-        if path:
-            update_tree(config, path, {section: {}}, val_type=val_type)
-
-    elif rx_dict.match(line):
-        val_type = "named_section"
-        section, name = rx_dict.match(line).groups()
-        if section not in [list(p.keys())[0] for p in path]:
-            path.append({section: val_type})
-        path.append({name: val_type})
-        update_tree(config, path, {section: {name: {}}}, val_type=val_type)
-
-    elif rx_value.match(line):
-        key, value = rx_value.match(line).groups()
-        update_tree(config, path, {key: value}, val_type="value")
-
-    elif rx_flag.match(line):
-        flag = rx_flag.match(line).group()
-        update_tree(config, path, {flag: flag}, val_type="flag")
-
-    elif rx_comment.match(line):
-        pass
-
-    elif line == "}" and path:
-        path_types = [list(p.values())[0] for p in path]
-        path.pop()
-        if len(path_types) > 1 and path_types[-2:] == ["section", "named_section"]:
-            path.pop()
-        elif len(path_types) > 1 and path_types[-2:] == [
-            "named_section",
-            "named_section",
-        ]:
-            path.pop()
-
-    else:
-        raise ParserException(
-            "Parse error in\n {line_num}: {line}\n".format(line_num=line_num, line=line)
-        )
-
-    return config, path
+    event = line_event(line, line_num)
+    if event is None:
+        return config, path
+    return apply_event(config, path, event)
 
 
 def parse_conf(s):
     if s:
-        s = u(s).split("\n")
-        c = {}
-        headers = []
-        for n, line in enumerate(s, start=1):
-            c, headers = parse_node(c, line, n, headers)
-        return c
+        return build_tree(iter_events(u(s).split("\n")))
     raise ParserException("Empty config passed")
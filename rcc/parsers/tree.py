@@ -0,0 +1,279 @@
+"""Compact representation of a parsed config.
+
+``parse_conf`` builds nested dicts, which is convenient but costly when many
+device configs are kept in memory: every section is a dict, every repeated
+value (``address 10.0.0.1``) gets its own empty dict, and every key is a fresh
+string. ``parse_conf_compact`` builds the same tree out of ``ConfigNode``
+objects instead. Each node stores its children in one flat ``[key, value, ...]``
+list, keys are interned, and empty leaves share a single marker.
+``ConfigNode.to_dict`` returns exactly what ``parse_conf`` would have returned.
+"""
+
+import sys
+from collections.abc import Mapping
+
+from rcc.parsers.temp_parser import (
+    FLAG,
+    LEAVE,
+    NAMED_SECTION,
+    SECTION,
+    VALUE,
+    ParserException,
+    iter_events,
+    u,
+)
+
+# Nodes with more children than this get a dict for O(1) key lookups.
+LOOKUP_THRESHOLD = 8
+
+
+class _Empty:
+    """Marker for an empty leaf, i.e. ``{}`` in the dict representation."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "EMPTY"
+
+
+EMPTY = _Empty()
+
+
+def _hashable(value):
+    return value is not EMPTY and not isinstance(value, ConfigNode)
+
+
+class ConfigNode(Mapping):
+    __slots__ = ("_items", "_lookup")
+
+    def __init__(self, items=None):
+        self._items = items if items is not None else []
+        self._lookup = None
+        if len(self._items) > 2 * LOOKUP_THRESHOLD:
+            self._build_lookup()
+
+    def _build_lookup(self):
+        self._lookup = {key: i for i, key in enumerate(self._items[::2])}
+
+    def _find(self, key):
+        """Return the position of ``key`` in ``_items`` or -1."""
+        if self._lookup is not None:
+            pos = self._lookup.get(key)
+            return -1 if pos is None else 2 * pos
+        items = self._items
+        i = 0
+        try:
+            while True:
+                i = items.index(key, i)
+                if not i & 1:
+                    return i
+                i += 1
+        except ValueError:
+            return -1
+
+    def _get(self, key, default=None):
+        i = self._find(key)
+        return default if i < 0 else self._items[i + 1]
+
+    def _set(self, key, value):
+        i = self._find(key)
+        if i < 0:
+            items = self._items
+            items.append(key)
+            items.append(value)
+            if self._lookup is not None:
+                self._lookup[key] = len(items) // 2 - 1
+            elif len(items) > 2 * LOOKUP_THRESHOLD:
+                self._build_lookup()
+        else:
+            self._items[i + 1] = value
+
+    def _first_key(self):
+        return self._items[0]
+
+    def __getitem__(self, key):
+        value = self._get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        if value is EMPTY:
+            return ConfigNode()
+        return value
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __iter__(self):
+        return iter(self._items[::2])
+
+    def __len__(self):
+        return len(self._items) // 2
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.to_dict())
+
+    @classmethod
+    def from_dict(cls, tree):
+        """Build a ``ConfigNode`` tree from a ``parse_conf`` dict."""
+        items = []
+        for key, value in tree.items():
+            items.append(sys.intern(key))
+            if isinstance(value, dict):
+                value = cls.from_dict(value) if value else EMPTY
+            items.append(value)
+        return cls(items)
+
+    def to_dict(self):
+        """Return the nested dict ``parse_conf`` builds for the same config."""
+        items = self._items
+        result = {}
+        for i in range(0, len(items), 2):
+            value = items[i + 1]
+            if value is EMPTY:
+                value = {}
+            elif isinstance(value, ConfigNode):
+                value = value.to_dict()
+            result[items[i]] = value
+        return result
+
+
+class CompactTreeBuilder:
+    """Builds a ``ConfigNode`` tree with the same shape ``update_tree`` gives.
+
+    The current position is tracked as a stack of ``(name, val_type)`` tuples.
+    """
+
+    def __init__(self):
+        self.root = ConfigNode()
+        self.path = []
+
+    def _walk(self, line_num):
+        """Return the node at the current path, or ``None`` if a value is in the way.
+
+        Like ``update_tree``, a path that runs into a plain value stops there
+        rather than failing, which only matters if something is added below it.
+        """
+        t = self.root
+        path = self.path
+        for i, (name, _) in enumerate(path):
+            child = t._get(name, EMPTY)
+            if child is EMPTY:
+                child = ConfigNode()
+                t._set(name, child)
+            elif not isinstance(child, ConfigNode):
+                if i + 1 < len(path) and (child is None or path[i + 1][0] in child):
+                    self._error(line_num, "cannot descend into value of " + name)
+                return None
+            t = child
+        return t
+
+    def _error(self, line_num, message):
+        raise ParserException(
+            "Parse error in\n {line_num}: {line}\n".format(
+                line_num=line_num, line=message
+            )
+        )
+
+    def _walk_to_node(self, line_num):
+        t = self._walk(line_num)
+        if t is None:
+            self._error(line_num, "cannot add to a plain value")
+        return t
+
+    def _add_leaf(self, t, key, leaf):
+        """Add ``leaf`` as an empty child of ``t[key]``, like ``t[key].update``."""
+        current = t._get(key)
+        if isinstance(current, ConfigNode):
+            current._set(leaf, EMPTY)
+        else:
+            t._set(key, ConfigNode([leaf, EMPTY]))
+
+    def feed(self, event):
+        kind, key, value, line_num = event
+        if key is not None:
+            key = sys.intern(key)
+        if kind == SECTION:
+            self.section(key, line_num)
+        elif kind == NAMED_SECTION:
+            self.named_section(key, value, line_num)
+        elif kind == VALUE:
+            self.value(key, value, line_num)
+        elif kind == FLAG:
+            self.flag(key, line_num)
+        elif kind == LEAVE:
+            self.leave(line_num)
+
+    def section(self, key, line_num):
+        self.path.append((key, "section"))
+        self._walk(line_num)
+
+    def named_section(self, key, name, line_num):
+        if not any(key == p for p, _ in self.path):
+            self.path.append((key, "named_section"))
+        self.path.append((name, "named_section"))
+        self._walk(line_num)
+
+    def flag(self, key, line_num):
+        self._walk_to_node(line_num)._set(key, key)
+
+    def value(self, key, value, line_num):
+        t = self._walk_to_node(line_num)
+        if not len(t):
+            t._set(key, value)
+        elif t._first_key() == key:
+            values = t._items[1::2]
+            if all(_hashable(v) for v in values):
+                items = []
+                seen = set()
+                for v in values + [value]:
+                    if v not in seen:
+                        seen.add(v)
+                        items.append(v)
+                        items.append(EMPTY)
+                t._set(key, ConfigNode(items))
+            else:
+                current = t._get(key)
+                if isinstance(current, str):
+                    t._set(key, ConfigNode([current, EMPTY]))
+                elif current is None:
+                    self._error(line_num, "cannot extend empty value of " + key)
+                self._add_leaf(t, key, value)
+        elif key == self.path[-1][0]:
+            t._set(value, EMPTY)
+        elif key in t:
+            current = t._get(key)
+            if _hashable(current):
+                items = [current, EMPTY]
+                if value != current:
+                    items += [value, EMPTY]
+                t._set(key, ConfigNode(items))
+            else:
+                self._add_leaf(t, key, value)
+        else:
+            t._set(key, value)
+
+    def leave(self, line_num):
+        path = self.path
+        if not path:
+            self._error(line_num, "}")
+        last_types = tuple(t for _, t in path[-2:])
+        path.pop()
+        if last_types in (
+            ("section", "named_section"),
+            ("named_section", "named_section"),
+        ):
+            path.pop()
+
+
+def build_compact_tree(events):
+    """Build a ``ConfigNode`` tree from events, e.g. from ``iter_events``."""
+    builder = CompactTreeBuilder()
+    for event in events:
+        builder.feed(event)
+    return builder.root
+
+
+def parse_conf_compact(s):
+    """Parse ``s`` into a ``ConfigNode`` tree; see ``parse_conf``."""
+    if not s:
+        raise ParserException("Empty config passed")
+    return build_compact_tree(iter_events(u(s).split("\n")))
@@ -0,0 +1,341 @@
+"""Local history of router backups, stored once per distinct piece of content.
+
+Each backup archive is split into its tar members, and members larger than
+``CHUNK_SIZE`` into fixed-size chunks. Every chunk is stored once under its
+SHA-256 as a zlib-compressed object, so a run that only changed
+``config.boot`` adds that one member plus a manifest. The manifest is a
+small JSON file listing the members' tar headers and the chunks that make
+up each one, and ``rebuild`` writes the archive back from it.
+
+Layout under the store directory::
+
+    objects/ab/cdef...          zlib-compressed chunks, named by SHA-256
+    manifests/<device>/<id>.json
+
+``prune`` drops manifests a ``Retention`` policy does not keep, and ``gc``
+removes the objects no manifest refers to any more.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tarfile
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from rcc.file_manager import atomic_write, open_source
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+COMPRESS_LEVEL = 6
+MANIFEST_VERSION = 1
+# Objects younger than this are never collected: an ``add`` running at the
+# same time may have stored them without having written its manifest yet.
+GC_GRACE_SECONDS = 3600
+
+rx_device = re.compile(r"^[\w.-]+$")
+
+# Tar header fields kept in the manifest; sizes come from the chunks.
+MEMBER_FIELDS = (
+    "name",
+    "mode",
+    "uid",
+    "gid",
+    "mtime",
+    "linkname",
+    "uname",
+    "gname",
+    "devmajor",
+    "devminor",
+)
+
+Retention = namedtuple("Retention", "keep_last keep_daily keep_weekly keep_monthly")
+# namedtuple only takes ``defaults`` from Python 3.7 on.
+Retention.__new__.__defaults__ = (10, 7, 4, 12)
+Retention.__doc__ = """How many backups of a device ``prune`` keeps.
+
+The ``keep_last`` newest are kept, then the newest backup of each of the
+``keep_daily`` most recent days, ``keep_weekly`` ISO weeks and
+``keep_monthly`` months that have backups.
+"""
+
+
+def default_store_dir():
+    return os.environ.get("RCC_BACKUP_STORE") or os.path.join(
+        os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"),
+        "rcc",
+        "backups",
+    )
+
+
+def kept(manifests, retention):
+    """Return the ids of ``manifests`` that ``retention`` keeps."""
+    manifests = sorted(manifests, key=lambda m: m["created"], reverse=True)
+    keep = {m["id"] for m in manifests[: retention.keep_last]}
+    periods = (
+        (retention.keep_daily, "%Y-%m-%d"),
+        (retention.keep_weekly, "%G-W%V"),
+        (retention.keep_monthly, "%Y-%m"),
+    )
+    for count, fmt in periods:
+        seen = set()
+        for m in manifests:
+            if len(seen) >= count:
+                break
+            period = datetime.fromtimestamp(m["created"], timezone.utc).strftime(fmt)
+            if period not in seen:
+                seen.add(period)
+                keep.add(m["id"])
+    return keep
+
+
+class BackupStore:
+    def __init__(self, directory=None, chunk_size=CHUNK_SIZE):
+        self.directory = directory or default_store_dir()
+        self.chunk_size = chunk_size
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], digest[2:])
+
+    def _device_dir(self, device_id):
+        device_id = str(device_id)
+        if not rx_device.match(device_id):
+            raise ValueError(f"Invalid device id: {device_id!r}")
+        return os.path.join(self.directory, "manifests", device_id)
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as f:
+            f.write(data)
+
+    def _put_object(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            # Refreshed so that gc's grace period covers it until the
+            # manifest that uses it is written.
+            os.utime(path)
+        else:
+            self._write_atomic(path, zlib.compress(data, COMPRESS_LEVEL))
+        return digest
+
+    def _get_object(self, digest):
+        with open(self._object_path(digest), "rb") as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Object {digest} is corrupt")
+        return data
+
+    def add(self, device_id, archive, label=None, created=None):
+        """Store the tar archive ``archive`` as a backup of ``device_id``.
+
+        Returns the id of the new backup.
+
+        ``archive`` is a path, the archive as bytes, or a binary stream. It is
+        read once, in order, a chunk at a time.
+        """
+        device_dir = self._device_dir(device_id)
+        created = time.time() if created is None else created
+        if isinstance(archive, (str, os.PathLike)):
+            with open(archive, "rb") as f:
+                members = self._add_members(f)
+        else:
+            members = self._add_members(archive)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "device": str(device_id),
+            "created": created,
+            "label": label,
+            "members": members,
+        }
+        body = json.dumps(manifest, sort_keys=True).encode("utf-8")
+        stamp = datetime.fromtimestamp(created, timezone.utc).strftime("%Y%m%dT%H%M%S")
+        backup_id = f"{stamp}-{hashlib.sha256(body).hexdigest()[:12]}"
+        manifest["id"] = backup_id
+        self._write_atomic(
+            os.path.join(device_dir, backup_id + ".json"),
+            json.dumps(manifest, sort_keys=True).encode("utf-8"),
+        )
+        logger.debug(
+            f"Stored backup {backup_id} of {device_id} ({len(members)} members)"
+        )
+        return backup_id
+
+    def _add_members(self, source):
+        members = []
+        with open_source(source) as tar:
+            for info in tar:
+                member = {field: getattr(info, field) for field in MEMBER_FIELDS}
+                member["type"] = info.type.decode("ascii")
+                if info.pax_headers:
+                    member["pax_headers"] = info.pax_headers
+                chunks = []
+                if info.isfile():
+                    f = tar.extractfile(info)
+                    while True:
+                        data = f.read(self.chunk_size)
+                        if not data:
+                            break
+                        chunks.append(self._put_object(data))
+                member["size"] = info.size if info.isfile() else 0
+                member["chunks"] = chunks
+                members.append(member)
+        return members
+
+    def manifests(self, device_id=None):
+        """Return the manifests of ``device_id``, or of every device, oldest first."""
+        root = os.path.join(self.directory, "manifests")
+        if device_id is not None:
+            devices = [os.path.basename(self._device_dir(device_id))]
+        else:
+            try:
+                devices = sorted(os.listdir(root))
+            except FileNotFoundError:
+                devices = []
+        result = []
+        for device in devices:
+            try:
+                names = os.listdir(os.path.join(root, device))
+            except FileNotFoundError:
+                continue
+            for name in names:
+                if name.endswith(".json"):
+                    with open(os.path.join(root, device, name), "rb") as f:
+                        result.append(json.load(f))
+        result.sort(key=lambda m: (m["created"], m["id"]))
+        return result
+
+    def manifest(self, device_id, backup_id):
+        path = os.path.join(
+            self._device_dir(device_id), os.path.basename(backup_id) + ".json"
+        )
+        try:
+            with open(path, "rb") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(f"No backup {backup_id} of {device_id}") from None
+
+    def rebuild(self, device_id, backup_id, dest=None, compresslevel=COMPRESS_LEVEL):
+        """Write backup ``backup_id`` of ``device_id`` back out as a ``.tar.gz``.
+
+        The members and their headers are those of the stored archive. Returns
+        the archive as bytes, or writes it to the binary stream ``dest``.
+        """
+        manifest = self.manifest(device_id, backup_id)
+        pax = any("pax_headers" in member for member in manifest["members"])
+        out = io.BytesIO() if dest is None else dest
+        with gzip.GzipFile(
+            fileobj=out, mode="wb", compresslevel=compresslevel, mtime=0
+        ) as gz:
+            with tarfile.open(
+                fileobj=gz,
+                mode="w|",
+                format=tarfile.PAX_FORMAT if pax else tarfile.GNU_FORMAT,
+            ) as tar:
+                for member in manifest["members"]:
+                    info = tarfile.TarInfo(member["name"])
+                    for field in MEMBER_FIELDS:
+                        setattr(info, field, member[field])
+                    info.type = member["type"].encode("ascii")
+                    info.size = member["size"]
+                    info.pax_headers = member.get("pax_headers", {})
+                    if member["chunks"]:
+                        tar.addfile(
+                            info,
+                            io.BufferedReader(_ChunkReader(self, member["chunks"])),
+                        )
+                    else:
+                        tar.addfile(info)
+        return out.getvalue() if dest is None else dest
+
+    def remove(self, device_id, backup_id):
+        os.remove(
+            os.path.join(
+                self._device_dir(device_id), os.path.basename(backup_id) + ".json"
+            )
+        )
+
+    def prune(self, retention=Retention(), device_id=None):
+        """Remove the manifests ``retention`` does not keep; return their ids.
+
+        The policy applies to each device separately. Run ``gc`` afterwards
+        to free the objects only they used.
+        """
+        by_device = {}
+        for m in self.manifests(device_id):
+            by_device.setdefault(m["device"], []).append(m)
+        removed = []
+        for device, manifests in by_device.items():
+            keep = kept(manifests, retention)
+            for m in manifests:
+                if m["id"] not in keep:
+                    self.remove(device, m["id"])
+                    removed.append(m["id"])
+        return removed
+
+    def gc(self, grace=GC_GRACE_SECONDS):
+        """Remove objects no manifest refers to; return ``(objects, bytes)`` freed."""
+        referenced = set()
+        for m in self.manifests():
+            for member in m["members"]:
+                referenced.update(member["chunks"])
+        cutoff = time.time() - grace
+        count = freed = 0
+        root = os.path.join(self.directory, "objects")
+        for prefix in _listdir(root):
+            for name in _listdir(os.path.join(root, prefix)):
+                path = os.path.join(root, prefix, name)
+                if prefix + name in referenced or name.endswith(".tmp"):
+                    continue
+                st = os.stat(path)
+                if st.st_mtime > cutoff:
+                    continue
+                os.remove(path)
+                count += 1
+                freed += st.st_size
+        return count, freed
+
+    def disk_usage(self):
+        """Bytes used by objects and manifests."""
+        total = 0
+        for directory, _, names in os.walk(self.directory):
+            for name in names:
+                total += os.path.getsize(os.path.join(directory, name))
+        return total
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except FileNotFoundError:
+        return []
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read a member back from its chunks, loading one object at a time."""
+
+    def __init__(self, store, chunks):
+        self.store = store
+        self.chunks = iter(chunks)
+        self.buffer = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer:
+            digest = next(self.chunks, None)
+            if digest is None:
+                return 0
+            self.buffer = memoryview(self.store._get_object(digest))
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
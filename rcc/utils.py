@@ -27,8 +27,11 @@ def signal_timeout(time_sec):
 
 def do_until(func, timeout, interval, *args, **kwargs):
     timeout_raised = True
+    # The alarm can be lost if a library catches the TimeoutError it raises
+    # as a socket timeout, so the loop checks the time as well.
+    deadline = time.monotonic() + timeout
     with signal_timeout(timeout):
-        while True:
+        while time.monotonic() < deadline:
             try:
                 func(*args, **kwargs)
                 time.sleep(interval)
@@ -13,6 +13,8 @@ with open('HISTORY.rst') as history_file:
 
 requirements = ['Click>=6.0', 'requests', 'certifi']
 
+extras_requirements = {'async': ['aiohttp>=3.8']}
+
 setup_requirements = ['pytest-runner', ]
 
 test_requirements = ['pytest', ]
@@ -40,6 +42,7 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the asyncio clients in `rcc.api`."""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from rcc.api.ip_address.aio import AsyncPublicIPAddress  # noqa: E402
+from rcc.api.unms.aio import AsyncUNMSClient  # noqa: E402
+from rcc.exceptions import HTTPException, UNMSHTTPException  # noqa: E402
+
+BACKUP = bytes(range(256)) * 1024
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, body, status=200, headers=()):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _authorized(self):
+        if self.headers.get("x-auth-token") == "token":
+            return True
+        self._reply({"error": "unauthorized"}, 401)
+        return False
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/ip":
+            self.server.ip_lookups += 1
+            self._reply(b"203.0.113.7", headers=[("Content-Type", "text/plain")])
+        elif not self._authorized():
+            return
+        elif path.endswith("/backups/2"):
+            self._reply(BACKUP)
+        elif path.startswith("/devices/") and path.count("/") == 2:
+            self._reply({"id": path.rsplit("/", 1)[1]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path == "/user/login":
+            self.server.logins.append(body)
+            self._reply({}, headers=[("x-auth-token", "token")])
+        elif not self._authorized():
+            return
+        elif self.path.endswith("/backups"):
+            self._reply({"id": "created-" + self.path.split("/")[2]})
+        else:
+            self._reply({"result": True})
+
+    def do_PUT(self):
+        if self._authorized():
+            self.server.uploads.append((dict(self.headers), self._read_body()))
+            self._reply({"id": "uploaded"})
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+@pytest.fixture
+def server():
+    httpd = CountingServer(("127.0.0.1", 0), Handler)
+    httpd.logins = []
+    httpd.uploads = []
+    httpd.ip_lookups = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_gather_devices(server, base_url):
+    device_ids = [str(i) for i in range(20)]
+
+    async def main():
+        async with AsyncUNMSClient(base_url, "user", "password", limit=4) as client:
+            backup_ids = await asyncio.gather(
+                *(client.create_backup(d) for d in device_ids)
+            )
+            backups = await asyncio.gather(
+                *(client.get_backup(d, 2) for d in device_ids)
+            )
+            devices = await asyncio.gather(*(client.get_device(d) for d in device_ids))
+            return client, backup_ids, backups, devices
+
+    client, backup_ids, backups, devices = run(main())
+    assert backup_ids == [f"created-{d}" for d in device_ids]
+    assert backups == [BACKUP] * len(device_ids)
+    assert [device.json() for device in devices] == [{"id": d} for d in device_ids]
+    # One login for all the concurrent requests, and a pool of at most 4 connections.
+    assert len(server.logins) == 1
+    assert server.connections <= 4
+    stats = client.metrics.get("POST", "/devices/{device_id}/backups")
+    assert stats.requests == len(device_ids)
+    assert client.metrics.get(
+        "GET", "/devices/{device_id}/backups/{backup_id}"
+    ).bytes_in == (len(BACKUP) * len(device_ids))
+
+
+def test_shared_session(server, base_url):
+    async def main():
+        async with aiohttp.ClientSession() as session:
+            unms = AsyncUNMSClient(base_url, "user", "password", session=session)
+            ip = AsyncPublicIPAddress(base_url, "/ip", session=session)
+            results = await asyncio.gather(
+                unms.reboot_device(1),
+                unms.apply_backup(1, 2),
+                ip.get_public_ip_address(),
+                ip.get_public_ip_address(),
+            )
+            await unms.close()
+            # The session belongs to the caller, so it stays open.
+            assert not session.closed
+            assert await ip.get_public_ip_address() == "203.0.113.7"
+            return results
+
+    assert run(main()) == [
+        {"result": True},
+        {"result": True},
+        "203.0.113.7",
+        "203.0.113.7",
+    ]
+    # The last call was served from the cache.
+    assert server.ip_lookups <= 2
+
+
+def test_get_backup_to_file_and_consumer(server, base_url, tmp_path):
+    path = tmp_path / "backup.tar.gz"
+    chunks = []
+
+    async def consumer(chunk):
+        chunks.append(chunk)
+
+    async def main():
+        async with AsyncUNMSClient(base_url, "user", "password") as client:
+            assert await client.get_backup(1, 2, filepath=str(path)) == str(path)
+            assert (
+                await client.get_backup(1, 2, consumer=consumer, chunk_size=4096)
+                is None
+            )
+            with pytest.raises(HTTPException):
+                await client.get_backup(1, 3, filepath=str(tmp_path / "missing"))
+
+    run(main())
+    assert path.read_bytes() == BACKUP
+    assert b"".join(chunks) == BACKUP
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_upload_backup(server, base_url, tmp_path):
+    path = tmp_path / "backup.tar.gz"
+    path.write_bytes(BACKUP)
+
+    async def main():
+        async with AsyncUNMSClient(base_url, "user", "password") as client:
+            return await asyncio.gather(
+                client.upload_backup(1, str(path)), client.upload_backup(2, BACKUP)
+            )
+
+    assert run(main()) == ["uploaded", "uploaded"]
+    for headers, body in server.uploads:
+        assert headers["Content-Type"].startswith("multipart/form-data")
+        assert BACKUP in body
+    assert b'filename="backup.tar.gz"' in server.uploads[0][1]
+
+
+def test_login_failure(server, base_url):
+    async def main():
+        async with AsyncUNMSClient(
+            base_url, "user", "password", login_endpoint="/nope"
+        ) as client:
+            await client.create_backup(1)
+
+    with pytest.raises(UNMSHTTPException):
+        run(main())
+
+
+def test_connection_error():
+    async def main():
+        async with AsyncPublicIPAddress(
+            "http://127.0.0.1:9", "/ip", timeout=1
+        ) as client:
+            await client.get_public_ip_address()
+        return client
+
+    with pytest.raises(HTTPException):
+        run(main())
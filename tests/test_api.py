@@ -0,0 +1,653 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `rcc.api`."""
+
+import datetime
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from rcc.api import download
+from rcc.api.cache import ResponseCache, cache_key
+from rcc.api.http import describe_body, log_response
+from rcc.api.metrics import EndpointStats, Metrics
+from rcc.api.multipart import MultipartEncoder
+from rcc.api.retry import RetryPolicy, replayable, retry_after
+from rcc.api.unms.client import UNMSClient
+from rcc.exceptions import HTTPException
+from rcc.utils import check_unms, do_until
+
+BACKUP = bytes(range(256)) * 1024
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """Serve the backup, with ranges unless disabled, dropping the
+        connection halfway through while ``server.drops`` is positive."""
+        if self.path == "/devices/1":
+            self.server.gets.append(dict(self.headers))
+            etag = 'W/"device-1"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            body = json.dumps({"id": 1}).encode()
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path == "/flaky":
+            # Answer with the queued statuses first, each after the queued delay.
+            time.sleep(self.server.delays.pop(0) if self.server.delays else 0)
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+            return
+        if self.path.split("?")[0] != "/devices/1/backups/2":
+            self.send_error(404)
+            return
+        self.server.gets.append(dict(self.headers))
+        if self.server.resets:
+            # Hang up without an answer.
+            self.server.resets -= 1
+            self.close_connection = True
+            return
+        if self.server.statuses:
+            self.send_error(self.server.statuses.pop(0))
+            return
+        backup = self.server.backup
+        start, end, status = 0, len(backup) - 1, 200
+        requested = self.headers.get("Range")
+        if (
+            requested
+            and self.server.ranges
+            and self.headers.get("If-Range") in (None, self.server.etag)
+        ):
+            first, last = requested.partition("=")[2].split("-")
+            if int(first) >= len(backup):
+                self.send_error(416)
+                return
+            start, end, status = int(first), min(int(last or end), end), 206
+        stop = end + 1
+        body = backup[start:stop]
+        if status == 206:
+            body += b"\xff" * self.server.overshoot
+        self.send_response(status)
+        self.send_header("ETag", self.server.etag)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(backup)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.server.drops > 0 and len(body) > 1:
+            self.server.drops -= 1
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        if "Content-Length" in self.headers:
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+        else:
+            body = b""
+            while True:
+                size = int(self.rfile.readline(), 16)
+                body += self.rfile.read(size + 2)[:size]
+                if not size:
+                    break
+        self.server.uploads.append((dict(self.headers), body))
+        payload = json.dumps({"id": "uploaded"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+@pytest.fixture
+def server():
+    httpd = CountingServer(("127.0.0.1", 0), Handler)
+    httpd.uploads = []
+    httpd.gets = []
+    httpd.backup = BACKUP
+    httpd.etag = '"v1"'
+    httpd.ranges = True
+    httpd.drops = 0
+    httpd.statuses = []
+    httpd.resets = 0
+    httpd.overshoot = 0
+    httpd.delays = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def client(server):
+    client = UNMSClient(f"http://127.0.0.1:{server.server_port}", "user", "password")
+    client.token = "token"
+    client.expire_time = datetime.datetime.now() + datetime.timedelta(hours=1)
+    return client
+
+
+def requests_body(files, boundary, data=None):
+    request = requests.Request(
+        "PUT", "http://localhost/", files=files, data=data
+    ).prepare()
+    old = request.headers["Content-Type"].split("boundary=")[1]
+    return request.body.replace(old.encode(), boundary.encode())
+
+
+@pytest.mark.parametrize(
+    "files, data",
+    [
+        ({"file": ("backup.tar.gz", BACKUP)}, {}),
+        ({"file": ("backup.tar.gz", BACKUP, "application/gzip")}, {"note": "text"}),
+    ],
+)
+def test_multipart_encoder(files, data):
+    encoder = MultipartEncoder({**data, **files}, chunk_size=1000)
+    body = b"".join(encoder)
+    assert body == requests_body(files, encoder.boundary, data)
+    assert encoder.len == len(body)
+    assert encoder.content_type == f"multipart/form-data; boundary={encoder.boundary}"
+
+    encoder = MultipartEncoder({"file": ("backup.tar.gz", io.BytesIO(BACKUP))}, "b")
+    assert encoder.read(10) + encoder.read() == requests_body(
+        {"file": ("backup.tar.gz", BACKUP)}, "b"
+    )
+    assert encoder.read() == b""
+
+
+def test_get_backup(client, tmp_path):
+    assert client.get_backup(1, 2, chunk_size=1000) == BACKUP
+
+    path = tmp_path / "backup.tar.gz"
+    assert client.get_backup(1, 2, filepath=path) == path
+    assert path.read_bytes() == BACKUP
+
+    chunks = []
+    assert client.get_backup(1, 2, consumer=chunks.append, chunk_size=4096) is None
+    assert b"".join(chunks) == BACKUP
+    assert max(map(len, chunks)) <= 4096
+
+    with pytest.raises(HTTPException):
+        client.get_backup(1, 3)
+
+
+def test_get_backup_resume(client, server, tmp_path):
+    path = tmp_path / "backup.tar.gz"
+    server.drops = 2
+    assert client.get_backup(1, 2, filepath=path) == path
+    assert path.read_bytes() == BACKUP
+    assert os.listdir(tmp_path) == ["backup.tar.gz"]
+    offset = len(BACKUP) // 2
+    assert [(get.get("Range"), get.get("If-Range")) for get in server.gets] == [
+        (None, None),
+        (f"bytes={offset}-", '"v1"'),
+        (f"bytes={offset + (len(BACKUP) - offset) // 2}-", '"v1"'),
+    ]
+
+    server.drops = 10
+    with pytest.raises(HTTPException):
+        client.get_backup(1, 2, filepath=path)
+    assert os.path.exists(f"{path}.part")
+    # A later call picks up the part left behind.
+    server.drops = 0
+    server.gets.clear()
+    assert client.get_backup(1, 2, filepath=path) == path
+    assert path.read_bytes() == BACKUP
+    assert server.gets[0]["Range"] != "bytes=0-"
+
+
+def test_get_backup_changed(client, server, tmp_path):
+    path = tmp_path / "backup.tar.gz"
+    (tmp_path / "backup.tar.gz.part").write_bytes(b"x" * 1000)
+    (tmp_path / "backup.tar.gz.part.json").write_text(
+        json.dumps({"etag": '"v0"', "last_modified": None, "length": len(BACKUP)})
+    )
+    assert client.get_backup(1, 2, filepath=path) == path
+    assert path.read_bytes() == BACKUP
+    assert server.gets[0]["If-Range"] == '"v0"'
+
+    # A server that ignores ranges sends the whole backup again.
+    server.ranges = False
+    server.drops = 1
+    assert client.get_backup(1, 2, filepath=path) == path
+    assert path.read_bytes() == BACKUP
+
+
+def test_get_backup_parallel(client, server, tmp_path, monkeypatch):
+    monkeypatch.setattr(download, "PARALLEL_MIN_BYTES", 1)
+    path = tmp_path / "backup.tar.gz"
+    server.drops = 1
+    assert client.get_backup(1, 2, filepath=path, parts=4) == path
+    assert path.read_bytes() == BACKUP
+    ranges = sorted(get["Range"] for get in server.gets)
+    assert len(ranges) == 6
+    assert (
+        "bytes=0-0" in ranges
+        and f"bytes={len(BACKUP) * 3 // 4}-{len(BACKUP) - 1}" in ranges
+    )
+
+    # Without range support it falls back to one request.
+    server.ranges = False
+    assert client.get_backup(1, 2, filepath=path, parts=4) == path
+    assert path.read_bytes() == BACKUP
+
+
+def test_fetch_range_overshoot(client, server, tmp_path):
+    # The server sends more than the requested range; only the range is written.
+    server.overshoot = 4096
+    path = tmp_path / "backup.tar.gz"
+    path.write_bytes(bytes(len(BACKUP)))
+    state = {"etag": server.etag, "last_modified": None, "length": len(BACKUP)}
+    download._fetch_range(
+        client, "/devices/1/backups/2", None, str(path), 1000, 2999, state, 1024, 1
+    )
+    data = path.read_bytes()
+    assert data[1000:3000] == BACKUP[1000:3000]
+    assert not any(data[:1000]) and not any(data[3000:])
+
+
+def test_connection_reuse(client, server):
+    for _ in range(3):
+        assert client.get_backup(1, 2) == BACKUP
+    thread = threading.Thread(target=client.get_backup, args=(1, 2))
+    thread.start()
+    thread.join()
+    # Sessions are per thread, but they share one connection pool.
+    assert server.connections == 1
+
+    client.close()
+    assert client.get_backup(1, 2) == BACKUP
+    assert server.connections == 2
+
+
+def test_upload_backup(client, server, tmp_path):
+    path = tmp_path / "backup.tar.gz"
+    path.write_bytes(BACKUP)
+    assert client.upload_backup(1, str(path)) == "uploaded"
+
+    class Unsized(io.RawIOBase):
+        """A stream without a known size, sent with chunked encoding."""
+
+        def __init__(self, data):
+            self.data = io.BytesIO(data)
+
+        def readable(self):
+            return True
+
+        def readinto(self, b):
+            return self.data.readinto(b)
+
+        def seekable(self):
+            return False
+
+    assert (
+        client.upload_backup(1, Unsized(BACKUP), filename="backup.tar.gz") == "uploaded"
+    )
+    assert client.upload_backup(1, BACKUP, filename="backup.tar.gz") == "uploaded"
+
+    for headers, body in server.uploads:
+        boundary = headers["Content-Type"].split("boundary=")[1]
+        assert body == requests_body({"file": ("backup.tar.gz", BACKUP)}, boundary)
+    assert "Content-Length" in server.uploads[0][0]
+    assert server.uploads[1][0]["Transfer-Encoding"] == "chunked"
+
+
+def make_response(content, content_type):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    response.headers["Content-Type"] = content_type
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+def test_describe_body():
+    assert describe_body(make_response(b'{"id": 1}', "application/json")) == '{"id": 1}'
+    assert (
+        describe_body(
+            make_response("é".encode() * 10, "text/plain; charset=utf-8"), limit=4
+        )
+        == "éé... <20 bytes>"
+    )
+    assert (
+        describe_body(make_response(BACKUP, "application/gzip"))
+        == f"<{len(BACKUP)} bytes of application/gzip>"
+    )
+    assert (
+        describe_body(make_response(BACKUP, ""))
+        == f"<{len(BACKUP)} bytes of unknown type>"
+    )
+    response = make_response(None, "application/octet-stream")
+    response.headers["Content-Length"] = "12"
+    assert (
+        describe_body(response, streamed=True)
+        == "<streamed, 12 bytes of application/octet-stream>"
+    )
+
+
+def test_log_response_disabled(caplog):
+    class Unreadable(requests.Response):
+        @property
+        def content(self):
+            raise AssertionError("body read with DEBUG off")
+
+    response = Unreadable()
+    response.status_code = 200
+    with caplog.at_level(logging.INFO, logger="rcc.api.http"):
+        log_response(response, "http://localhost/")
+    with caplog.at_level(logging.DEBUG, logger="rcc.api.http"):
+        log_response(make_response(b"ok", "text/plain"), "http://localhost/")
+    assert caplog.records[-1].getMessage().endswith("Content:\nok")
+
+
+def test_metrics(client, server, tmp_path):
+    client.get_backup(1, 2)
+    client.get_backup(1, 2, filepath=tmp_path / "backup.tar.gz")
+    with pytest.raises(HTTPException):
+        client.get_backup(1, 3)
+    client.upload_backup(1, BACKUP)
+    assert (
+        client.endpoint_template("/devices/1/backups/2/apply")
+        == "/devices/{device_id}/backups/{backup_id}/apply"
+    )
+    assert client.endpoint_template("/unknown") == "/unknown"
+
+    stats = client.metrics.get("GET", "/devices/{device_id}/backups/{backup_id}")
+    assert stats.requests == 3
+    assert stats.statuses == {200: 2, 404: 1}
+    assert stats.errors == {"HTTPError": 1}
+    assert stats.bytes_in >= 2 * len(BACKUP)
+    assert stats.latency.count == 3 and stats.latency.quantile(0.5) > 0
+    stats = client.metrics.get("PUT", "/devices/{device_id}/backups")
+    assert stats.bytes_out > len(BACKUP) and stats.bytes_in > 0
+
+    text = client.metrics.to_prometheus()
+    labels = (
+        'client="UNMSClient",method="GET",'
+        'endpoint="/devices/{device_id}/backups/{backup_id}"'
+    )
+    assert f"rcc_http_requests_total{{{labels}}} 3" in text
+    assert f'rcc_http_responses_total{{{labels},status="404"}} 1' in text
+    assert f'rcc_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert "# TYPE rcc_http_request_duration_seconds histogram" in text
+
+    path = str(tmp_path / "metrics.json")
+    client.metrics.write(path)
+    with open(path) as f:
+        endpoints = json.load(f)["endpoints"]
+    assert [(e["method"], e["requests"]) for e in endpoints] == [("GET", 3), ("PUT", 1)]
+    client.metrics.write(str(tmp_path / "rcc.prom"))
+    assert (tmp_path / "rcc.prom").read_text() == text
+
+
+def test_metrics_summed_over_clients():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.record("A", "GET", "/x", 0.05, status=200, bytes_in=10)
+    metrics.record("B", "GET", "/x", 2.0, error="Timeout")
+    stats = metrics.get("GET", "/x")
+    assert (stats.requests, stats.bytes_in, dict(stats.errors)) == (
+        2,
+        10,
+        {"Timeout": 1},
+    )
+    assert stats.latency.cumulative() == [(0.1, 1), (1.0, 1), (float("inf"), 2)]
+    assert metrics.get("GET", "/x", client="A").requests == 1
+    assert metrics.get("GET", "/y").requests == 0
+
+
+def test_response_cache():
+    now = [0.0]
+    cache = ResponseCache(max_entries=2, default_ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=5, etag='"b"')
+    assert cache.get("a") == 1  # now the most recently used
+    cache.set("c", 3)
+    assert "b" not in cache and len(cache) == 2
+
+    now[0] = 10
+    assert cache.get("a") is None and cache.get("c") is None
+    assert cache.entry("a").value == 1
+    assert cache.refresh("a", ttl=1, etag='"a"').validators() == {
+        "If-None-Match": '"a"'
+    }
+    assert cache.get("a") == 1
+    cache.clean()
+    assert len(cache) == 1
+    assert cache.pop("a") == 1
+    with pytest.raises(KeyError):
+        cache.pop("a")
+
+
+def test_response_cache_validation():
+    def response(status, etag=None):
+        response = requests.Response()
+        response.status_code = status
+        if etag:
+            response.headers["ETag"] = etag
+        return response
+
+    now = [0.0]
+    cache = ResponseCache(clock=lambda: now[0])
+    key = cache_key("/devices/1", {"b": 2, "a": 1})
+    assert key == cache_key("/devices/1", {"a": 1, "b": 2})
+    assert cache.lookup(key) == (None, None)
+
+    first = response(200, '"v1"')
+    assert cache.update(key, first, ttl=5) is first
+    assert cache.lookup(key) == (first, None)
+
+    now[0] = 5
+    assert cache.lookup(key) == (None, {"If-None-Match": '"v1"'})
+    assert cache.update(key, response(304), ttl=5) is first
+    assert cache.lookup(key) == (first, None)
+
+    error = response(500)
+    assert cache.update(cache_key("/devices/2"), error) is error
+    assert cache.lookup(cache_key("/devices/2")) == (None, None)
+
+
+def test_get_cached(client, server):
+    assert client.get_device(1).json() == {"id": 1}
+    assert client.get_device(1).json() == {"id": 1}
+    # get_device has a TTL of 0, so every call revalidates
+    assert [get.get("If-None-Match") for get in server.gets] == [None, 'W/"device-1"']
+    assert client.metrics.get("GET", "/devices/{device_id}").statuses == {
+        200: 1,
+        304: 1,
+    }
+
+    client.cache_ttls["/devices/{device_id}"] = 60
+    client.get_device(1)
+    client.get_device(1)
+    assert len(server.gets) == 3
+
+    client.set_cache("key", "value")
+    assert client.get_cache("key") == "value"
+    client.clean_cache("key")
+    assert client.get_cache("key") is None
+
+
+def test_retry_policy():
+    now = [0.0]
+    policy = RetryPolicy(
+        attempts=3,
+        backoff=1,
+        max_backoff=3,
+        deadline=10,
+        clock=lambda: now[0],
+        rng=random.Random(0),
+    )
+    assert all(
+        0 <= policy.backoff_delay(retry) <= min(3, 2**retry) for retry in range(6)
+    )
+    error = requests.exceptions.ConnectionError()
+    assert policy.next_delay("GET", 0, 0.0, error=error) is not None
+    assert policy.next_delay("POST", 0, 0.0, error=error) is None
+    assert policy.next_delay("GET", 0, 0.0, error=ValueError()) is None
+    assert policy.next_delay("GET", 2, 0.0, error=error) is None
+    now[0] = 10.5
+    assert policy.next_delay("GET", 0, 0.0, error=error) is None
+
+    response = make_response(b"", "text/plain")
+    response.status_code = 503
+    response.headers["Retry-After"] = "7"
+    assert retry_after(response) == 7
+    now[0] = 0
+    assert policy.next_delay("GET", 0, 0.0, response=response) == 7
+    now[0] = 5
+    assert policy.next_delay("GET", 0, 0.0, response=response) is None
+    policy.time_left = lambda: 5.0
+    now[0] = 0
+    assert policy.next_delay("GET", 0, 0.0, response=response) is None
+    policy.time_left = lambda: None
+    response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:10 GMT"
+    assert retry_after(response, now=1445412480) == 10
+
+    assert replayable({"json": {}}) and replayable({"data": b"body"})
+    assert not replayable({"data": io.BytesIO(b"body")})
+    assert not replayable({"data": MultipartEncoder({"file": ("a", b"b")})})
+
+
+def test_retry(client, server):
+    sleeps = []
+    client.retry = RetryPolicy(attempts=3, sleep=sleeps.append, rng=random.Random(0))
+    server.statuses = [503, 429]
+    assert client.get_data("/flaky").status_code == 200
+    assert len(sleeps) == 2 and sleeps[1] >= 1  # Retry-After: 1
+    stats = client.metrics.get("GET", "/flaky")
+    assert (stats.retries, dict(stats.statuses)) == (2, {200: 1, 429: 1, 503: 1})
+
+    # Once the attempts are used up, the last response is returned.
+    server.statuses = [500] * 3
+    assert client.get_data("/flaky").status_code == 500
+    assert client.metrics.get("GET", "/flaky").retries == 4
+
+    client.close()
+    client.base_url = "http://127.0.0.1:9"
+    del sleeps[:]
+    with pytest.raises(HTTPException):
+        client.get_data("/flaky")
+    assert len(sleeps) == 2
+
+
+def test_retry_stream(client, server, tmp_path):
+    sleeps = []
+    client.retry = RetryPolicy(attempts=3, sleep=sleeps.append, rng=random.Random(0))
+    server.statuses = [503]
+    server.resets = 1
+    assert client.get_backup(1, 2) == BACKUP
+    assert len(sleeps) == 2
+    stats = client.metrics.get("GET", "/devices/{device_id}/backups/{backup_id}")
+    assert stats.retries == 2
+    assert dict(stats.statuses) == {200: 1, 503: 1}
+    assert stats.errors == {"ConnectionError": 1}
+
+    server.statuses = [503]
+    path = client.get_backup(1, 2, filepath=str(tmp_path / "backup.tar.gz"))
+    with open(path, "rb") as f:
+        assert f.read() == BACKUP
+
+    # Once the attempts are used up, the error status is raised as before.
+    server.statuses = [503] * 3
+    with pytest.raises(HTTPException):
+        client.get_backup(1, 2)
+    assert len(sleeps) == 5
+
+
+def test_retry_poll_timeout(client):
+    client.retry = RetryPolicy(backoff=0.5, rng=random.Random(0))
+    client.base_url = "http://127.0.0.1:9"
+    start = time.monotonic()
+    assert do_until(check_unms, 1, 0.1, client, 1)
+    assert time.monotonic() - start < 3
+
+    # An alarm during a backoff sleep is passed on, not wrapped.
+    def alarm(delay):
+        raise TimeoutError
+
+    client.retry.sleep = alarm
+    client.retry.time_left = lambda: None
+    with pytest.raises(TimeoutError):
+        client.get_data("/devices/1")
+
+
+def test_retry_download(client, server, tmp_path):
+    # The download's resumes follow the client's policy instead of adding to it.
+    sleeps = []
+    client.retry = RetryPolicy(attempts=3, sleep=sleeps.append, rng=random.Random(0))
+    path = tmp_path / "backup.tar.gz"
+    server.resets = 10
+    with pytest.raises(HTTPException):
+        client.get_backup(1, 2, filepath=path)
+    assert len(server.gets) == 3 and len(sleeps) == 2
+
+    server.resets = 0
+    server.drops = 1
+    server.statuses = [503]
+    # With a policy, ``attempts`` no longer limits the resumes.
+    assert client.download_file("/devices/1/backups/2", path, attempts=1) == path
+    assert path.read_bytes() == BACKUP
+    assert len(sleeps) == 4
+
+
+def test_hedge_delay():
+    policy = RetryPolicy(hedge=True, hedge_min_samples=20)
+    stats = EndpointStats()
+    for i in range(100):
+        stats.latency.observe(0.1 + 0.0015 * i)
+    # Within the (0.1, 0.25] bucket, not its upper bound.
+    assert policy.hedge_delay("GET", stats) == pytest.approx(0.2424, abs=1e-3)
+    assert policy.hedge_delay("POST", stats) is None
+    stats.latency.observe(500)
+    assert stats.latency.quantile(1.0) == float("inf")
+
+
+def test_hedged_get(client, server):
+    client.retry = RetryPolicy(attempts=1, hedge=True, hedge_min_samples=20)
+    server.delays = [2.0]
+    assert client.get_data("/flaky").status_code == 200  # too few samples to hedge
+    assert client.metrics.get("GET", "/flaky").hedges == 0
+
+    for _ in range(20):
+        client.metrics.record("UNMSClient", "GET", "/flaky", 0.01, status=200)
+    server.delays = [2.0]
+    start = time.perf_counter()
+    assert client.get_data("/flaky").status_code == 200
+    assert time.perf_counter() - start < 1.0
+    assert client.metrics.get("GET", "/flaky").hedges == 1
+    client.close()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `benchmarks.suite`."""
+
+import json
+
+from benchmarks import suite
+
+
+def test_suite_smoke(tmp_path):
+    output = tmp_path / "results.json"
+    suite.main(["--sizes", "small", "--repeat", "1", "--output", str(output)])
+    report = json.loads(output.read_text())
+    names = [r["benchmark"] for r in report["results"]]
+    assert names == [
+        "parse_conf",
+        "parse_conf_compact",
+        "boot_load",
+        "find_netflow_server",
+        "set_netflow_server",
+        "dump",
+    ]
+    assert all(r["size"] == "small" and r["seconds"] >= 0 for r in report["results"])
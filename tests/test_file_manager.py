@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `rcc.file_manager`."""
+
+import gzip
+import io
+import os
+import tarfile
+
+import pytest
+
+from rcc.file_manager import (
+    FileManager,
+    ParallelGzipWriter,
+    atomic_write,
+    read_member,
+    replace_member,
+)
+from rcc.parsers.boot import BootParser
+
+CONFIG = b"""system {
+    flow-accounting {
+        netflow {
+            server 192.0.2.10 {
+                port 2055
+            }
+        }
+    }
+}
+"""
+
+
+def make_backup(members):
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w:gz") as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 1234567890
+            info.mode = 0o640
+            tar.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+@pytest.fixture
+def backup():
+    return make_backup(
+        [
+            ("config/config.boot", CONFIG),
+            ("config/auth/ca.crt", b"certificate"),
+            ("config/user-data/big.bin", bytes(range(256)) * 64),
+        ]
+    )
+
+
+def read_members(data):
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        return [(info.name, info.mode, tar.extractfile(info).read()) for info in tar]
+
+
+def test_read_member(backup):
+    assert read_member(backup, "config/config.boot") == CONFIG
+    assert read_member(io.BytesIO(backup), "./config/auth/ca.crt") == b"certificate"
+    with pytest.raises(KeyError):
+        read_member(backup, "config/missing")
+
+
+def test_replace_member(backup):
+    parser = BootParser.from_data(read_member(backup, "config/config.boot"))
+    parser.set_netflow_server("203.0.113.200")
+    new_config = parser.raw_data.encode("utf-8")
+
+    result = replace_member(io.BytesIO(backup), "config/config.boot", new_config)
+    original = read_members(backup)
+    assert (
+        read_members(result)
+        == [(original[0][0], original[0][1], new_config)] + original[1:]
+    )
+
+    out = io.BytesIO()
+    assert replace_member(backup, "config/config.boot", new_config, dest=out) is out
+    assert read_members(out.getvalue()) == read_members(result)
+    with pytest.raises(KeyError):
+        replace_member(backup, "config/missing", b"")
+
+
+def test_parallel_gzip_writer():
+    data = bytes(range(256)) * 5000 + os.urandom(100000)
+    out = io.BytesIO()
+    with ParallelGzipWriter(out, compresslevel=6, block_size=65536, threads=3) as gz:
+        for start in range(0, len(data), 10000):
+            gz.write(data[start:][:10000])
+    assert not out.closed
+    assert gzip.decompress(out.getvalue()) == data
+    # one gzip member per block
+    assert out.getvalue().count(b"\x1f\x8b\x08") >= -(-len(data) // 65536)
+
+    out = io.BytesIO()
+    ParallelGzipWriter(out).close()
+    assert gzip.decompress(out.getvalue()) == b""
+
+
+def test_parallel_tar(backup, tmp_path):
+    result = replace_member(
+        backup, "config/config.boot", b"new", threads=2, block_size=4096
+    )
+    assert read_members(result)[0][2] == b"new"
+    assert read_members(result)[1:] == read_members(backup)[1:]
+
+    manager = FileManager(str(tmp_path / "backup.tar.gz"), str(tmp_path / "src"))
+    (tmp_path / "src" / "config").mkdir(parents=True)
+    (tmp_path / "src" / "config" / "config.boot").write_bytes(CONFIG)
+    manager.tar(str(tmp_path / "backup.tar.gz"), "config", compresslevel=1, threads=2)
+    assert (
+        read_member((tmp_path / "backup.tar.gz").read_bytes(), "config/config.boot")
+        == CONFIG
+    )
+    assert not (tmp_path / "src").exists()
+
+
+def test_atomic_write(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_text("old")
+    with atomic_write(str(path), "w", permissions=0o644) as f:
+        f.write("new")
+        assert path.read_text() == "old"
+    assert path.read_text() == "new"
+    assert path.stat().st_mode & 0o777 == 0o644
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path)) as f:
+            f.write(b"partial")
+            raise RuntimeError
+    assert path.read_text() == "new"
+    assert os.listdir(tmp_path) == ["out.txt"]
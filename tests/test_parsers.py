@@ -0,0 +1,598 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `rcc.parsers`."""
+
+import io
+import os
+import tarfile
+
+import pytest
+
+from rcc.parsers.temp_parser import ParserException, parse_conf, tokenize
+from rcc.parsers.boot import BootParser
+from rcc.parsers.bulk import parse_many
+from rcc.parsers.cache import ParseCache
+from rcc.parsers.diff import ADDED, CHANGED, REMOVED, Change, diff, hash_tree
+from rcc.parsers.index import ConfigIndex, compile_query, scan_spans
+from rcc.parsers.parallel import parse_conf_parallel, split_sections
+from rcc.parsers.stream import Event, iter_events, parse_indexed, parse_stream
+from rcc.parsers.tree import parse_conf_compact
+
+CONFIG = """firewall {
+    all-ping enable
+    group {
+        address-group BLOCKED {
+            description "Blocked hosts"
+            address 10.0.0.1
+            address 10.0.0.2
+            address 10.0.0.3
+        }
+    }
+}
+interfaces {
+    ethernet eth0 {
+        address dhcp
+        description ""
+        disable
+    }
+    loopback lo
+}
+system {
+    flow-accounting {
+        netflow {
+            server 192.0.2.10 {
+                port 2055
+            }
+            version 9
+        }
+    }
+    name-server 1.1.1.1
+    name-server 8.8.8.8
+}
+/* Warning: Do not remove the following line. */
+"""
+
+TREE = {
+    "firewall": {
+        "all-ping": "enable",
+        "group": {
+            "address-group": {
+                "BLOCKED": {
+                    "description": "Blocked hosts",
+                    "address": {"10.0.0.1": {}, "10.0.0.2": {}, "10.0.0.3": {}},
+                }
+            }
+        },
+    },
+    "interfaces": {
+        "ethernet": {
+            "eth0": {"address": "dhcp", "description": None, "disable": "disable"}
+        },
+        "loopback": "lo",
+    },
+    "system": {
+        "flow-accounting": {
+            "netflow": {"server": {"192.0.2.10": {"port": "2055"}}, "version": "9"}
+        },
+        "name-server": {"1.1.1.1": {}, "8.8.8.8": {}},
+    },
+}
+
+
+@pytest.mark.parametrize(
+    "line,expected",
+    [
+        ("interfaces {", ("section", "interfaces", None)),
+        ("ethernet eth0 {", ("named_section", "ethernet", "eth0")),
+        ('description "a b"', ("value", "description", "a b")),
+        ('description ""', ("value", "description", None)),
+        ("disable", ("flag", "disable", "disable")),
+        ("/* comment */", ("comment", None, None)),
+        ("}", ("close", None, None)),
+        ("{ nope", (None, None, None)),
+    ],
+)
+def test_tokenize(line, expected):
+    assert tokenize(line) == expected
+
+
+def test_parse_conf():
+    assert parse_conf(CONFIG) == TREE
+
+
+def test_parse_conf_errors():
+    with pytest.raises(ParserException):
+        parse_conf("")
+    with pytest.raises(ParserException):
+        parse_conf("}\n")
+
+
+# Configs with the trees the original parser produced for them, before
+# update_tree and the event pipeline were rewritten.
+PARSE_CASES = [
+    (
+        """/* EdgeOS config */
+system {
+    host-name "edge router"
+    login {
+        user admin {
+            authentication {
+                encrypted-password "$6$abc/def.ghi"
+                plaintext-password ""
+            }
+            level admin
+        }
+    }
+    /* inline comment */
+    time-zone UTC
+}
+/* === vyatta-config-version: "config-management@1" === */
+""",
+        {
+            "system": {
+                "host-name": "edge router",
+                "login": {
+                    "user": {
+                        "admin": {
+                            "authentication": {
+                                "encrypted-password": "$6$abc/def.ghi",
+                                "plaintext-password": None,
+                            },
+                            "level": "admin",
+                        }
+                    }
+                },
+                "time-zone": "UTC",
+            }
+        },
+    ),
+    (
+        """interfaces {
+    ethernet eth0 {
+        disable
+        duplex auto
+        node {}
+    }
+    ethernet eth1 {
+    }
+    loopback lo {
+    }
+}
+service {
+    gui {
+        http-port 80
+    }
+    ssh {
+    }
+}
+""",
+        {
+            "interfaces": {
+                "ethernet": {
+                    "eth0": {"disable": "disable", "duplex": "auto", "node": "{}"},
+                    "eth1": {},
+                },
+                "loopback": {"lo": {}},
+            },
+            "service": {"gui": {"http-port": "80"}, "ssh": {}},
+        },
+    ),
+    (
+        """firewall {
+    name WAN_IN {
+        default-action drop
+        rule 10 {
+            action accept
+            state {
+                established enable
+                related enable
+            }
+        }
+        rule 20 {
+            action drop
+            log enable
+        }
+    }
+    name WAN_LOCAL {
+        default-action drop
+    }
+}
+vpn {
+    ipsec {
+        site-to-site {
+            peer 203.0.113.1 {
+                tunnel 1 {
+                    local {
+                        prefix 10.0.0.0/24
+                    }
+                }
+            }
+        }
+    }
+}
+""",
+        {
+            "firewall": {
+                "name": {
+                    "WAN_IN": {
+                        "default-action": "drop",
+                        "rule": {
+                            "10": {
+                                "action": "accept",
+                                "state": {"established": "enable", "related": "enable"},
+                            },
+                            "20": {"action": "drop", "log": "enable"},
+                        },
+                    },
+                    "WAN_LOCAL": {"default-action": "drop"},
+                }
+            },
+            "vpn": {
+                "ipsec": {
+                    "site-to-site": {
+                        "peer": {
+                            "203.0.113.1": {
+                                "tunnel": {"1": {"local": {"prefix": "10.0.0.0/24"}}}
+                            }
+                        }
+                    }
+                }
+            },
+        },
+    ),
+    (
+        """system {
+    name-server 1.1.1.1
+    name-server 8.8.8.8
+    name-server 9.9.9.9
+    ntp {
+        server 0.pool.ntp.org {
+        }
+        server 1.pool.ntp.org {
+        }
+    }
+}
+service {
+    dhcp-server {
+        option a
+        lease 86400
+        option b
+    }
+    dns {
+        forwarding {
+            cache-size 150
+            listen-on eth1
+            listen-on eth2
+        }
+    }
+}
+""",
+        {
+            "system": {
+                "name-server": {"1.1.1.1": {}, "8.8.8.8": {}, "9.9.9.9": {}},
+                "ntp": {"server": {"0.pool.ntp.org": {}, "1.pool.ntp.org": {}}},
+            },
+            "service": {
+                # A repeated first key collects every value of the section.
+                "dhcp-server": {
+                    "option": {"a": {}, "86400": {}, "b": {}},
+                    "lease": "86400",
+                },
+                "dns": {
+                    "forwarding": {
+                        "cache-size": "150",
+                        "listen-on": {"eth1": {}, "eth2": {}},
+                    }
+                },
+            },
+        },
+    ),
+]
+
+
+@pytest.mark.parametrize("config,tree", PARSE_CASES)
+def test_parse_conf_cases(config, tree):
+    assert parse_conf(config) == tree
+    assert parse_stream(io.StringIO(config)) == tree
+
+
+def test_iter_events_stream():
+    events = [tuple(e) for e in iter_events(PARSE_CASES[0][0].split("\n"))]
+    assert events == [
+        ("section", "system", None, 2),
+        ("value", "host-name", "edge router", 3),
+        ("section", "login", None, 4),
+        ("named_section", "user", "admin", 5),
+        ("section", "authentication", None, 6),
+        ("value", "encrypted-password", "$6$abc/def.ghi", 7),
+        ("value", "plaintext-password", None, 8),
+        ("leave", None, None, 9),
+        ("value", "level", "admin", 10),
+        ("leave", None, None, 11),
+        ("leave", None, None, 12),
+        ("value", "time-zone", "UTC", 14),
+        ("leave", None, None, 15),
+    ]
+
+
+def test_parse_conf_compact():
+    tree = parse_conf_compact(CONFIG)
+    assert tree.to_dict() == TREE
+    assert tree == TREE
+    assert tree["system"]["name-server"]["8.8.8.8"] == {}
+
+
+def test_iter_events():
+    events = list(iter_events(io.BytesIO(b"interfaces {\n    loopback lo\n}\n")))
+    assert events == [
+        Event("section", "interfaces", None, 1),
+        Event("value", "loopback", "lo", 2),
+        Event("leave", None, None, 3),
+    ]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_parse_stream(compact):
+    assert parse_stream(io.StringIO(CONFIG), compact=compact) == TREE
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "config.boot"
+    path.write_text(CONFIG)
+    return str(path)
+
+
+def test_boot_parser_lazy(config_file):
+    parser = BootParser(config_file)
+    assert parser._conf_obj is None
+    assert parser.find_netflow_server() == "192.0.2.10"
+    assert parser._conf_obj is None
+    assert parser.conf_obj == TREE
+    parser.set_netflow_server("192.0.2.20")
+    assert parser._conf_obj is None
+    assert parser.raw_data == CONFIG.replace("192.0.2.10", "192.0.2.20")
+    assert parser.find_netflow_server() == "192.0.2.20"
+
+
+def test_boot_parser_eager(config_file):
+    parser = BootParser(config_file, lazy=False)
+    assert parser._conf_obj == TREE
+    # Edits are not parsed until conf_obj is read again.
+    parser.set("system host-name", "gw")
+    parser.set_netflow_server("192.0.2.20")
+    assert parser._conf_obj is None
+    assert parser.conf_obj["system"]["host-name"] == "gw"
+    assert BootParser.from_data(CONFIG, lazy=False)._conf_obj == TREE
+
+
+@pytest.mark.parametrize("first", ["conf_obj", "index"])
+def test_boot_parser_single_pass(config_file, monkeypatch, first):
+    from rcc.parsers import boot
+
+    def fail(*args, **kwargs):
+        raise AssertionError("parsed twice")
+
+    parser = BootParser(config_file)
+    getattr(parser, first)
+    monkeypatch.setattr(boot, "parse_conf", fail)
+    monkeypatch.setattr(ConfigIndex, "from_string", fail)
+    assert parser.conf_obj == TREE
+    assert parser.index.get("system flow-accounting netflow server") == "192.0.2.10"
+    # Edited text is parsed again on its own; the index is kept up to date.
+    parser.set("system host-name", "gw")
+    monkeypatch.undo()
+    assert parser.conf_obj["system"]["host-name"] == "gw"
+
+
+def test_config_index():
+    tree, index = parse_indexed(io.StringIO(CONFIG))
+    assert tree == TREE
+    assert index.get("system > flow-accounting > netflow > server") == "192.0.2.10"
+    assert index.entry("system flow-accounting netflow server").line_num == 23
+    assert index.sections[("system", "flow-accounting", "netflow")].end_line == 27
+    assert index.get_all(("system", "name-server")) == ["1.1.1.1", "8.8.8.8"]
+    assert "interfaces ethernet eth0" in index
+    assert index.get("system host-name") is None
+
+
+def test_query():
+    index = ConfigIndex.from_string(CONFIG)
+    query = compile_query("firewall group address-group * address")
+    assert query.values(index) == ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    assert compile_query("interfaces ethernet eth* disable").first(index) == "disable"
+    assert list(index.query("firewall name * rule * action")) == []
+
+
+@pytest.mark.parametrize(
+    "path,values",
+    [
+        ("system flow-accounting netflow server", ["192.0.2.10"]),
+        ("system name-server", ["1.1.1.1", "8.8.8.8"]),
+        ("firewall group address-group BLOCKED description", ["Blocked hosts"]),
+        ("interfaces ethernet eth0 disable", ["disable"]),
+        ("interfaces loopback", ["lo"]),
+        ("system flow-accounting netflow server 192.0.2.10 port", ["2055"]),
+        ("system host-name", []),
+    ],
+)
+def test_scan_spans(path, values):
+    assert [CONFIG[a:b] for a, b in scan_spans(CONFIG, path)] == values
+    data = CONFIG.encode()
+    assert [data[a:b] for a, b in scan_spans(data, path)] == [
+        v.encode() for v in values
+    ]
+
+
+def test_boot_parser_edits(config_file):
+    parser = BootParser(config_file)
+    parser.set("system flow-accounting netflow server", "192.0.2.20")
+    parser.set("firewall group address-group BLOCKED description", "Bad hosts")
+    parser.delete("firewall group address-group BLOCKED address")
+    parser.add("firewall group address-group BLOCKED address", "10.0.0.9")
+    parser.add("system name-server", "9.9.9.9")
+    parser.delete("interfaces ethernet eth0 disable")
+    parser.set("system host-name", "gw")
+    expected = (
+        CONFIG.replace("192.0.2.10", "192.0.2.20")
+        .replace("Blocked hosts", "Bad hosts")
+        .replace("address 10.0.0.1\n", "address 10.0.0.9\n")
+        .replace("            address 10.0.0.2\n            address 10.0.0.3\n", "")
+        .replace("8.8.8.8\n", "8.8.8.8\n    name-server 9.9.9.9\n    host-name gw\n")
+        .replace("        disable\n", "")
+    )
+    assert parser.raw_data == expected
+    assert (
+        parser.index.get("system flow-accounting netflow server 192.0.2.20 port")
+        == "2055"
+    )
+    assert parser.conf_obj == parse_conf(expected)
+    parser.dump()
+    with open(config_file) as f:
+        assert f.read() == expected
+    with pytest.raises(KeyError):
+        parser.delete("system host-name missing")
+
+
+def test_boot_parser_repeated_adds(config_file):
+    # Added entries have no line number yet, so equal ones must stay distinct.
+    parser = BootParser(config_file)
+    parser.add("system host-name", "gw")
+    parser.add("system host-name", "gw")
+    parser.set("system host-name", "gw1")
+    parser.set("system host-name", "gw2")
+    expected = CONFIG.replace("8.8.8.8\n", "8.8.8.8\n    host-name gw2\n")
+    assert parser.raw_data == expected
+    assert parser.index.get_all("system host-name") == ["gw2"]
+    assert parser.conf_obj == parse_conf(expected)
+
+    parser = BootParser(config_file)
+    parser.add("system host-name", "gw")
+    parser.add("system host-name", "gw")
+    parser.delete("system host-name")
+    assert parser.raw_data == CONFIG
+    assert "system host-name" not in parser.index
+
+
+def test_diff():
+    old = parse_conf(CONFIG)
+    new = parse_conf(
+        CONFIG.replace("192.0.2.10", "192.0.2.20")
+        .replace("    loopback lo\n", "")
+        .replace("address 10.0.0.3", "address 10.0.0.4")
+        .replace("8.8.8.8\n", "8.8.8.8\n    time-zone UTC\n")
+    )
+    server = ("system", "flow-accounting", "netflow", "server")
+    members = ("firewall", "group", "address-group", "BLOCKED", "address")
+    assert diff(old, old) == []
+    assert diff(old, parse_conf_compact(CONFIG)) == []
+    assert sorted(diff(old, new)) == sorted(
+        [
+            Change(REMOVED, members + ("10.0.0.3",), {}, None),
+            Change(ADDED, members + ("10.0.0.4",), None, {}),
+            Change(REMOVED, server + ("192.0.2.10",), {"port": "2055"}, None),
+            Change(ADDED, server + ("192.0.2.20",), None, {"port": "2055"}),
+            Change(REMOVED, ("interfaces", "loopback"), "lo", None),
+            Change(ADDED, ("system", "time-zone"), None, "UTC"),
+        ]
+    )
+    assert diff(hash_tree({"a": "1"}), {"a": {"1": {}}}) == [
+        Change(CHANGED, ("a",), "1", {"1": {}})
+    ]
+    assert (
+        hash_tree({"a": "1", "b": {}}).digest == hash_tree({"b": {}, "a": "1"}).digest
+    )
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_parse_cache(tmp_path, config_file, compact):
+    cache = ParseCache(str(tmp_path / "cache"))
+    assert BootParser(config_file, compact=compact, cache=cache).conf_obj == TREE
+    (entry,) = (tmp_path / "cache").iterdir()
+    assert cache.get(CONFIG) == TREE
+    assert BootParser(config_file, compact=compact, cache=cache).conf_obj == TREE
+
+    entry.write_bytes(entry.read_bytes()[:-10])
+    assert cache.get(CONFIG) is None
+    assert not entry.exists()
+    assert BootParser(config_file, compact=compact, cache=cache).conf_obj == TREE
+
+    cache.max_bytes = 0
+    cache.put("other", {})
+    assert list((tmp_path / "cache").iterdir()) == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_many(tmp_path, config_file, workers):
+    backup = str(tmp_path / "backup.tar.gz")
+    with tarfile.open(backup, "w:gz") as tar:
+        tar.add(config_file, arcname="config/config.boot")
+    broken = tmp_path / "broken.boot"
+    broken.write_text("}\n")
+    sources = [config_file, backup, str(broken), str(tmp_path / "missing")]
+    results = list(parse_many(sources, workers=workers))
+    assert [r.source for r in results] == sources
+    assert [r.tree for r in results] == [TREE, TREE, None, None]
+    assert results[0].error is None
+    assert results[2].error.startswith("ParserException")
+    assert results[3].error.startswith("FileNotFoundError")
+
+
+def test_parse_conf_parallel():
+    assert len(split_sections(CONFIG, 4)) > 2
+    assert parse_conf_parallel(CONFIG, workers=2) == TREE
+    # Values before the first section depend on the whole text; parsed serially.
+    assert parse_conf_parallel("loopback lo\n" + CONFIG, workers=2) == parse_conf(
+        "loopback lo\n" + CONFIG
+    )
+    with pytest.raises(ParserException):
+        parse_conf_parallel(CONFIG + "}\n", workers=2)
+
+
+def test_boot_parser_workers(config_file, monkeypatch):
+    from rcc.parsers import boot
+
+    calls = []
+
+    def parse_conf_auto(s, workers=None):
+        calls.append(workers)
+        return parse_conf(s)
+
+    monkeypatch.setattr(boot, "parse_conf_auto", parse_conf_auto)
+    # Parallel parsing is opt-in, whatever the size of the config.
+    assert BootParser(config_file, lazy=False).conf_obj == TREE
+    assert calls == []
+    assert BootParser(config_file, lazy=False, workers=2).conf_obj == TREE
+    assert calls == [2]
+
+
+@pytest.mark.parametrize(
+    "ip_address, in_place",
+    [("192.0.2.99", True), ("10.0.0.1", False), ("203.0.113.254", False)],
+)
+def test_boot_parser_mmap(config_file, ip_address, in_place):
+    parser = BootParser(config_file, use_mmap=True)
+    assert parser.find_netflow_server() == "192.0.2.10"
+    parser.set_netflow_server(ip_address)
+    assert parser.find_netflow_server() == ip_address
+    inode = os.stat(config_file).st_ino
+    parser.dump()
+    assert (os.stat(config_file).st_ino == inode) == in_place
+    with open(config_file) as f:
+        text = f.read()
+    assert text == CONFIG.replace("192.0.2.10", ip_address)
+    assert BootParser(config_file).find_netflow_server() == ip_address
+    assert parser.find_netflow_server() == ip_address
+    parser.close()
+    assert parser.conf_obj == parse_conf(text)
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_boot_parser_invalid_netflow_server(config_file, use_mmap):
+    parser = BootParser(config_file, use_mmap=use_mmap)
+    with pytest.raises(ValueError):
+        parser.set_netflow_server('192.0.2.1"')
+    assert parser.find_netflow_server() == "192.0.2.10"
+    with pytest.raises(ValueError):
+        BootParser(config_file, lazy=False, use_mmap=True)
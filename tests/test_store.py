@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `rcc.store`."""
+
+import io
+import os
+import random
+import tarfile
+
+import pytest
+
+from rcc.store import BackupStore, Retention, kept
+
+DAY = 24 * 3600
+BIG = random.Random(0).randbytes(25600)
+
+
+def make_backup(config, big=BIG):
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w:gz") as tar:
+        info = tarfile.TarInfo("config")
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+        tar.addfile(info)
+        for name, data in (
+            ("config/config.boot", config),
+            ("config/user-data/big.bin", big),
+        ):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 1234567890
+            info.mode = 0o640
+            info.uname = "root"
+            tar.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+def read_members(data):
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        return [
+            (
+                info.name,
+                info.type,
+                info.mode,
+                info.mtime,
+                info.uname,
+                tar.extractfile(info).read() if info.isfile() else None,
+            )
+            for info in tar
+        ]
+
+
+def count_objects(store):
+    return sum(
+        len(files) for _, _, files in os.walk(os.path.join(store.directory, "objects"))
+    )
+
+
+def test_add_and_rebuild(tmp_path):
+    store = BackupStore(str(tmp_path), chunk_size=4096)
+    first = make_backup(b"netflow 192.0.2.1\n")
+    first_id = store.add("device1", first, label="downloaded", created=1000)
+    objects = count_objects(store)
+    # big.bin is 25600 bytes, so 7 chunks, plus config.boot
+    assert objects == 8
+
+    second = make_backup(b"netflow 192.0.2.2\n")
+    second_id = store.add("device1", io.BytesIO(second), created=2000)
+    assert count_objects(store) == objects + 1
+
+    assert read_members(store.rebuild("device1", first_id)) == read_members(first)
+    out = io.BytesIO()
+    assert store.rebuild("device1", second_id, dest=out) is out
+    assert read_members(out.getvalue()) == read_members(second)
+
+    assert [m["id"] for m in store.manifests("device1")] == [first_id, second_id]
+    assert store.manifest("device1", first_id)["label"] == "downloaded"
+    with pytest.raises(KeyError):
+        store.manifest("device1", "missing")
+    with pytest.raises(ValueError):
+        store.add("../device", first)
+
+
+def test_prune_and_gc(tmp_path):
+    store = BackupStore(str(tmp_path), chunk_size=4096)
+    ids = [
+        store.add("device1", make_backup(f"run {n}\n".encode()), created=n * DAY)
+        for n in range(6)
+    ]
+    store.add("device2", make_backup(b"other\n"), created=0)
+
+    removed = store.prune(
+        Retention(keep_last=1, keep_daily=2, keep_weekly=0, keep_monthly=0), "device1"
+    )
+    # the newest, and the newest of each of the last two days
+    assert sorted(removed) == sorted(ids[:4])
+    assert [m["id"] for m in store.manifests("device1")] == ids[4:]
+    assert len(store.manifests()) == 3
+
+    before = count_objects(store)
+    assert store.gc() == (0, 0)  # still within the grace period
+    count, freed = store.gc(grace=0)
+    assert count == 4 and freed > 0
+    assert count_objects(store) == before - 4
+    for backup_id in ids[4:]:
+        assert read_members(store.rebuild("device1", backup_id))[1][
+            5
+        ] == b"run %d\n" % ids.index(backup_id)
+
+
+def test_kept():
+    manifests = [{"id": n, "created": n * DAY} for n in range(60)]
+    assert kept(
+        manifests, Retention(keep_last=3, keep_daily=0, keep_weekly=0, keep_monthly=0)
+    ) == {57, 58, 59}
+    # 1970-01-01 is a Thursday; days 58 and 59 are the last of February and 1 March
+    assert kept(
+        manifests, Retention(keep_last=0, keep_daily=0, keep_weekly=0, keep_monthly=2)
+    ) == {58, 59}
+    assert kept(
+        manifests, Retention(keep_last=0, keep_daily=0, keep_weekly=3, keep_monthly=0)
+    ) == {45, 52, 59}
+    assert kept(
+        manifests, Retention(keep_last=2, keep_daily=3, keep_weekly=0, keep_monthly=0)
+    ) == {57, 58, 59}